@@ -12,6 +12,9 @@ from app.extensions import engine, Base, UPLOAD_FOLDER, DEFAULT_MODEL_PWD
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 整段 DDL / 函数体原样交给驱动：不带参数执行，其中的 % 不会被 psycopg2 当成占位符
+_RAW_DDL = {"no_parameters": True}
+
 
 def _ensure_file_vector_index() -> None:
     """保证 files 向量索引统一为余弦距离算子（vector_cosine_ops）。"""
@@ -77,6 +80,163 @@ def _ensure_file_content_hash_column() -> None:
         logger.warning(f"Warning: Could not ensure files.content_hash column: {e}")
 
 
+def _ensure_file_path_index() -> None:
+    """旧数据秒传共享 file_path，删除时仍需按路径查引用；存储巡检按字节序归并。为其补索引。"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(
+                text("CREATE INDEX IF NOT EXISTS idx_files_file_path ON files (file_path)")
+            )
+            conn.execute(
+                text('CREATE INDEX IF NOT EXISTS idx_files_file_path_c ON files (file_path COLLATE "C")')
+            )
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure files.file_path index: {e}")
+
+
+def _ensure_blob_reap_index() -> None:
+    """批量删除把归零的 blob 留给后台回收；为零引用行补部分索引。"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs (content_hash) "
+                "WHERE ref_count <= 0"
+            ))
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure blobs reap index: {e}")
+
+
+def _ensure_listing_indexes() -> None:
+    """目录游标分页按 (parent_id, 排序键, id) 走索引；老库补建。"""
+    statements = (
+        "CREATE INDEX IF NOT EXISTS idx_folder_parent_name_id ON folder (parent_id, name, id)",
+        "CREATE INDEX IF NOT EXISTS idx_files_parent_name_id ON files (parent_id, name, id)",
+        "CREATE INDEX IF NOT EXISTS idx_files_parent_created_id ON files "
+        "(parent_id, COALESCE(created_at, '1970-01-01 00:00:00'::timestamp), id)",
+        "CREATE INDEX IF NOT EXISTS idx_files_parent_size_id ON files "
+        "(parent_id, COALESCE(file_size, -1), id)",
+    )
+    try:
+        with engine.connect() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure listing indexes: {e}")
+
+
+def _ensure_name_trigram_indexes() -> None:
+    """文件 / 文件夹名模糊搜索走 pg_trgm GIN 索引（ILIKE 子串与相似度算子都能用）。"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_files_name_trgm ON files USING gin (name gin_trgm_ops)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_folder_name_trgm ON folder USING gin (name gin_trgm_ops)"
+            ))
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure name trigram indexes: {e}")
+
+
+def _ensure_search_fulltext() -> None:
+    """文件名 + 描述全文检索：安装中文二元组分词函数、生成列与 GIN 索引（老库加列时整表回填一次）。"""
+    from app.services import fulltext_service
+
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql(fulltext_service.SCHEMA_SQL, execution_options=_RAW_DDL)
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure full-text search column: {e}")
+
+
+def _ensure_user_storage_stats() -> None:
+    """安装存储计数触发器；计数表为空时（首次部署 / 升级）做一次全量对账。"""
+    from app.extensions import SessionLocal
+    from app.services import storage_stats_service
+
+    try:
+        with engine.connect() as conn:
+            # 先判空再装触发器，免得装好后的第一笔写入让空表看起来已初始化
+            initialized = conn.execute(
+                text("SELECT 1 FROM user_storage_stats LIMIT 1")
+            ).scalar()
+            conn.exec_driver_sql(storage_stats_service.TRIGGER_FUNCTIONS_SQL, execution_options=_RAW_DDL)
+            conn.exec_driver_sql(storage_stats_service.TRIGGERS_SQL, execution_options=_RAW_DDL)
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure user storage stats triggers: {e}")
+        return
+
+    if initialized:
+        return
+    session = SessionLocal()
+    try:
+        storage_stats_service.reconcile(session)
+    except Exception as e:
+        logger.warning(f"Warning: Could not backfill user storage stats: {e}")
+    finally:
+        session.close()
+
+
+def _ensure_folder_paths() -> None:
+    """补物化路径列与索引、安装维护触发器，并回填缺失的路径（升级 / 首次部署）。"""
+    from app.services import folder_service
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "ALTER TABLE folder ADD COLUMN IF NOT EXISTS path TEXT, "
+                'ADD COLUMN IF NOT EXISTS path_ids TEXT COLLATE "C"'
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_folder_path_ids ON folder (path_ids)"
+            ))
+            # 触发器体里有字面量 %（LIKE 前缀、RAISE 占位），不能交给驱动做参数替换
+            conn.exec_driver_sql(folder_service.PATH_TRIGGER_SQL, execution_options=_RAW_DDL)
+            missing = conn.execute(
+                text("SELECT 1 FROM folder WHERE path_ids IS NULL LIMIT 1")
+            ).scalar()
+            if missing:
+                conn.execute(text(folder_service.PATH_BACKFILL_SQL))
+            conn.commit()
+    except Exception as e:
+        # 目录删除 / 移动 / 子树查询都依赖 path_ids 与触发器，缺了只会静默出错，直接中止启动
+        logger.error(f"Could not ensure folder materialized paths: {e}")
+        raise
+
+
+def _ensure_folder_stats() -> None:
+    """安装文件夹汇总触发器；汇总表为空时（首次部署 / 升级）做一次全量重算。依赖物化路径。"""
+    from app.extensions import SessionLocal
+    from app.services import folder_stats_service
+
+    try:
+        with engine.connect() as conn:
+            initialized = conn.execute(text("SELECT 1 FROM folder_stats LIMIT 1")).scalar()
+            conn.exec_driver_sql(folder_stats_service.TRIGGER_FUNCTIONS_SQL, execution_options=_RAW_DDL)
+            conn.exec_driver_sql(folder_stats_service.TRIGGERS_SQL, execution_options=_RAW_DDL)
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Warning: Could not ensure folder stats triggers: {e}")
+        return
+
+    if initialized:
+        return
+    session = SessionLocal()
+    try:
+        folder_stats_service.reconcile(session)
+    except Exception as e:
+        logger.warning(f"Warning: Could not backfill folder stats: {e}")
+    finally:
+        session.close()
+
+
 def _ensure_mcp_token_value_column() -> None:
     """保证 mcp_tokens.token_value 存在，便于前端复制与工作区注入。"""
     try:
@@ -105,8 +265,11 @@ def initialize_application():
     # 导入模型以注册到 Base.metadata
     from app.models import (
         User,
+        UserStorageStats,
+        Blob,
         File,
         Folder,
+        FolderStats,
         SysDict,
         Share,
         Inbox,
@@ -156,7 +319,15 @@ def initialize_application():
     # 自动创建所有表，并做轻量 schema 对齐
     Base.metadata.create_all(bind=engine)
     _ensure_file_content_hash_column()
+    _ensure_file_path_index()
+    _ensure_listing_indexes()
+    _ensure_name_trigram_indexes()
+    _ensure_search_fulltext()
+    _ensure_blob_reap_index()
     _ensure_mcp_token_value_column()
+    _ensure_user_storage_stats()
+    _ensure_folder_paths()
+    _ensure_folder_stats()
 
     # 向量索引与检索距离度量保持一致
     _ensure_file_vector_index()
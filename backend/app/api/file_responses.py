@@ -0,0 +1,276 @@
+"""文件下载响应：条件请求（ETag / Last-Modified → 304）与 Range（206，含多段）。
+缩略图与打包下载的响应也在这里组装。
+
+本地驱动的整文件下载仍走 FileResponse（sendfile）；部分内容与非本地驱动按块流式输出。
+对象存储可预签名时直接 307 到存储端，Range / 条件请求由存储端处理。
+"""
+
+import uuid
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, cast
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+
+from app.exceptions import ResourceNotFoundError
+from app.infra.storage import ObjectStat, storage
+from app.models.file import File
+from app.services import derivative_cache
+from app.services.archive_service import ArchiveEntry, stream_zip
+
+# 超过此段数视为滥用（多段请求可被用来放大响应），按整文件返回
+MAX_RANGES = 16
+CACHE_CONTROL = "private, no-cache"
+# 缩略图按内容哈希生成，同一文件 id 的内容不会变，可长期缓存
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True, slots=True)
+class ByteRange:
+    start: int
+    end: int  # 闭区间
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _etag_for(file_obj: File, stat: ObjectStat) -> str:
+    """内容哈希即强 ETag；旧数据无哈希时退回基于大小与修改时间的弱 ETag。"""
+    content_hash = cast(str | None, file_obj.content_hash)
+    if content_hash:
+        return f'"{content_hash}"'
+    return f'W/"{stat.size:x}-{int(stat.mtime):x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 采用弱比较：忽略 W/ 前缀。"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    # HTTP 日期精度为秒
+    return int(mtime) <= since.timestamp()
+
+
+def _is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        return _not_modified_since(if_modified_since, mtime)
+    return False
+
+
+def _if_range_allows(request: Request, etag: str, mtime: float) -> bool:
+    """If-Range 不匹配时忽略 Range、返回整文件；ETag 须强比较。"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return not etag.startswith("W/") and if_range == etag
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range_header(header: str, size: int) -> list[ByteRange] | None:
+    """解析 ``bytes=`` Range；语法不认识或段数过多返回 None（按整文件处理）。
+
+    返回按起点排序、重叠/相邻段已合并的列表；全部段不可满足时抛 RangeNotSatisfiable。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges: list[ByteRange] = []
+    for part in parts:
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        if not first:
+            # 后缀形式 -N：最后 N 字节
+            if not last.isdigit():
+                return None
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append(ByteRange(max(0, size - suffix), size - 1))
+            continue
+        if not first.isdigit() or (last and not last.isdigit()):
+            return None
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = min(int(last), size - 1) if last else size - 1
+        ranges.append(ByteRange(start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort(key=lambda r: r.start)
+    merged = [ranges[0]]
+    for current in ranges[1:]:
+        last_range = merged[-1]
+        if current.start <= last_range.end + 1:
+            merged[-1] = ByteRange(last_range.start, max(last_range.end, current.end))
+        else:
+            merged.append(current)
+    return merged
+
+
+def _content_disposition(filename: str | None, inline: bool) -> dict[str, str]:
+    if not filename:
+        return {}
+    disposition = "inline" if inline else "attachment"
+    return {"Content-Disposition": f"{disposition}; filename*=utf-8''{quote(filename)}"}
+
+
+def _multipart_body(
+        key: str, ranges: list[ByteRange], size: int, media_type: str, boundary: str
+) -> tuple[Iterator[bytes], int]:
+    """multipart/byteranges 响应体及其精确长度（先算长度，才能给出 Content-Length）。"""
+    heads = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {r.start}-{r.end}/{size}\r\n\r\n"
+        ).encode()
+        for r in ranges
+    ]
+    tail = f"--{boundary}--\r\n".encode()
+    total = sum(len(h) + r.length + 2 for h, r in zip(heads, ranges)) + len(tail)
+
+    def body() -> Iterator[bytes]:
+        for head, byte_range in zip(heads, ranges):
+            yield head
+            yield from storage.open_range(key, byte_range.start, byte_range.length)
+            yield b"\r\n"
+        yield tail
+
+    return body(), total
+
+
+def stored_file_response(file_obj: File, request: Request, inline: bool = False) -> Response:
+    """按请求头返回 200 / 206 / 304 / 416；对象存储可预签名时 307 直连。"""
+    key = cast(str, file_obj.file_path)
+    filename = cast(str | None, file_obj.name)
+    media_type = cast(str | None, file_obj.mime_type) or "application/octet-stream"
+
+    local_path = storage.local_file(key)
+    if not local_path:
+        url = storage.presign(key, filename=filename, content_type=media_type, inline=inline)
+        if url:
+            return RedirectResponse(url, status_code=307)
+
+    stat = storage.stat(key)
+    if stat is None:
+        raise ResourceNotFoundError("File not found on server")
+
+    etag = _etag_for(file_obj, stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": CACHE_CONTROL,
+    }
+
+    if _is_not_modified(request, etag, stat.mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header and _if_range_allows(request, etag, stat.mtime):
+        try:
+            ranges = parse_range_header(range_header, stat.size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{stat.size}"
+            return Response(status_code=416, headers=headers)
+
+    headers.update(_content_disposition(filename, inline))
+
+    if not ranges:
+        if local_path:
+            return FileResponse(
+                local_path,
+                media_type=media_type,
+                headers=headers,
+            )
+        headers["Content-Length"] = str(stat.size)
+        return StreamingResponse(storage.open_range(key), media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        byte_range = ranges[0]
+        headers["Content-Range"] = f"bytes {byte_range.start}-{byte_range.end}/{stat.size}"
+        headers["Content-Length"] = str(byte_range.length)
+        return StreamingResponse(
+            storage.open_range(key, byte_range.start, byte_range.length),
+            status_code=206,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    boundary = uuid.uuid4().hex
+    body, total = _multipart_body(key, ranges, stat.size, media_type, boundary)
+    headers["Content-Length"] = str(total)
+    return StreamingResponse(
+        body,
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
+
+
+def thumbnail_response(file_obj: File, request: Request) -> Response:
+    """返回预览缩略图；尚未生成（或文本类无缩略图）时 404，前端退回图标。"""
+    content_hash = cast(str | None, file_obj.content_hash)
+    if not content_hash:
+        raise ResourceNotFoundError("Thumbnail not available")
+    key = derivative_cache.thumbnail_key(content_hash)
+    stat = storage.stat(key)
+    if stat is None:
+        raise ResourceNotFoundError("Thumbnail not available")
+
+    etag = f'"{content_hash}-thumb"'
+    headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+    if _is_not_modified(request, etag, stat.mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = derivative_cache.THUMBNAIL_MEDIA_TYPE
+    local_path = storage.local_file(key)
+    if local_path:
+        return FileResponse(local_path, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(stat.size)
+    return StreamingResponse(storage.open_range(key), media_type=media_type, headers=headers)
+
+
+def archive_response(filename: str, entries: list[ArchiveEntry]) -> StreamingResponse:
+    """打包下载：长度未知，分块传输；不支持 Range / 条件请求。"""
+    headers = {"Cache-Control": "no-store"}
+    headers.update(_content_disposition(filename, inline=False))
+    return StreamingResponse(stream_zip(entries), media_type="application/zip", headers=headers)
@@ -3,6 +3,8 @@
 注意：``GET /files/{id}`` 必须注册在所有具体路径之后，避免 ``{id}`` 吞掉 list/search 等。
 """
 
+import tempfile
+from contextlib import ExitStack
 from typing import cast
 
 from fastapi import (
@@ -17,22 +19,33 @@ from fastapi import (
     status,
 )
 from fastapi import UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
+from app.api.file_responses import (
+    archive_response,
+    stored_file_response,
+    thumbnail_response,
+)
 from app.api.schemas.file import (
     BatchDeleteRequest,
+    BatchMoveRequest,
+    FilePreflightBatchRequest,
     FilePreflightRequest,
     FileUpdateRequest,
     MultipartCompleteRequest,
     MultipartInitRequest,
     RetryEmbeddingRequest,
 )
-from app.exceptions import DomainError
+from app.exceptions import DomainError, PayloadTooLargeError
 from app.extensions import get_db
-from app.infra.upload_adapter import Base64UploadAdapter, FastAPIUploadAdapter
-from app.services import file_service
+from app.infra.upload_adapter import (
+    Base64UploadAdapter,
+    FastAPIUploadAdapter,
+    iter_json_string_field,
+)
+from app.services import archive_service, file_service
 
 router = APIRouter(tags=["file"])
 
@@ -104,6 +117,21 @@ def preflight_file_upload(
         ) from exc
 
 
+@router.post("/files/preflight/batch")
+def batch_preflight_file_upload(
+        payload: FilePreflightBatchRequest,
+        current_user=Depends(get_current_user),
+        session: Session = Depends(get_db),
+):
+    """批量预检：一次查询解析全部哈希，命中项在同一事务内秒传。"""
+    items = file_service.batch_preflight_file_uploads(
+        session,
+        current_user.id,
+        [item.model_dump(exclude_none=True) for item in payload.items],
+    )
+    return {"items": items}
+
+
 @router.post("/files/multipart/init")
 def init_multipart_upload(
         payload: MultipartInitRequest,
@@ -201,9 +229,20 @@ def list_files(
         name: str | None = Query(default=None, max_length=255),
         sort_by: str = Query(default="created_at", min_length=1, max_length=50),
         order: str = Query(default="desc", pattern="^(asc|desc)$"),
+        cursor: str | None = Query(default=None, max_length=1024),
+        with_total: bool = Query(default=False),
         session: Session = Depends(get_db),
 ):
-    """目录浏览：文件与子文件夹分页列表。"""
+    """目录浏览：文件与子文件夹分页列表。
+
+    传 ``cursor``（首页传空串）走游标分页，按返回的 ``next_cursor`` 翻页，忽略 page；
+    不传则保持页码分页。
+    """
+    if cursor is not None:
+        return file_service.get_files_and_folders_by_cursor(
+            session, current_user.id, parent_id, cursor, page_size, name, sort_by, order,
+            with_total=with_total,
+        )
     return file_service.get_files_and_folders(
         session, current_user.id, parent_id, page, page_size, name, sort_by, order
     )
@@ -215,10 +254,10 @@ async def search_files(
         q: str = Query(default="", max_length=255),
         page: int = Query(default=1, ge=1),
         page_size: int = Query(default=10, ge=1, le=100),
-        type: str = Query(default="fuzzy", pattern="^(fuzzy|semantic)$"),
+        type: str = Query(default="fuzzy", pattern="^(fuzzy|semantic|vector|fulltext|hybrid)$"),
         session: Session = Depends(get_db),
 ):
-    """文件名模糊或语义检索；空查询直接返回空页避免全表扫描。"""
+    """文件名模糊 / 语义（vector，旧名 semantic）/ 描述全文 / 全文与语义混合检索；空查询直接返回空页避免全表扫描。"""
     if not q:
         return {"items": [], "total": 0, "page": page, "page_size": page_size}
     return await file_service.search_files(session, current_user.id, q, page, page_size, type)
@@ -249,23 +288,63 @@ def delete_file(
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+@router.get("/files/archive")
+def download_files_archive(
+        ids: list[int] = Query(...),
+        current_user=Depends(get_current_user),
+        session: Session = Depends(get_db),
+):
+    """多选文件打包为 ZIP 流式下载（逐个鉴权）。"""
+    entries = archive_service.collect_file_entries(
+        session, current_user.id, current_user.role, ids
+    )
+    return archive_response("files.zip", entries)
+
+
 @router.get("/files/{id}/download")
 def download_file(
         id: int,
+        request: Request,
         current_user=Depends(get_current_user),
         session: Session = Depends(get_db),
 ):
-    """鉴权后以附件形式下载原始文件。"""
+    """鉴权后以附件形式下载原始文件；支持 Range 续传与 ETag 条件请求。"""
     file_obj = file_service.get_downloadable_file(
         session, current_user.id, current_user.role, id
     )
-    abs_path = file_obj.get_abs_path()
+    return stored_file_response(file_obj, request)
+
 
-    return FileResponse(
-        abs_path,
-        filename=cast(str | None, file_obj.name),
-        media_type=cast(str | None, file_obj.mime_type),
+@router.get("/files/{id}/thumbnail")
+def get_file_thumbnail(
+        id: int,
+        request: Request,
+        current_user=Depends(get_current_user),
+        session: Session = Depends(get_db),
+):
+    """预览缩略图（WebP），由索引 Worker 生成；可长期缓存。"""
+    file_obj = file_service.get_authorized_file(
+        session, current_user.id, current_user.role, id
     )
+    return thumbnail_response(file_obj, request)
+
+
+async def _spool_request_body(request: Request, max_bytes: int):
+    """把请求体边收边写入临时文件（小体积留在内存），超过 max_bytes 立即中止。"""
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise PayloadTooLargeError("Avatar exceeds size limit")
+    spool = tempfile.SpooledTemporaryFile(max_size=file_service.COPY_BUFFER_SIZE)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise PayloadTooLargeError("Avatar exceeds size limit")
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    return spool
 
 
 @router.post("/files/upload/avatar/{id}")
@@ -277,35 +356,42 @@ async def upload_avatar(
         current_user=Depends(get_current_user),
         session: Session = Depends(get_db),
 ):
-    """上传用户头像；兼容 multipart 文件、form base64 与 JSON body。"""
+    """上传用户头像；兼容 multipart 文件、form base64 与 JSON body。
+
+    Base64 边解码边写盘；JSON body 先流式暂存，再只取 avatar 字段，不整体解析。
+    """
     adapter = None
-    if avatar is not None:
-        if not avatar.filename:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="No avatar file"
-            )
-        adapter = FastAPIUploadAdapter(avatar)
-    else:
-        avatar_text = (avatar_base64 or "").strip()
-        if not avatar_text and request.headers.get("content-type", "").startswith(
-                "application/json"
-        ):
-            try:
-                payload = await request.json()
-                if isinstance(payload, dict):
-                    avatar_text = str(payload.get("avatar") or "").strip()
-            except Exception:
-                avatar_text = ""
-
-        if not avatar_text:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="No avatar data"
-            )
-        adapter = Base64UploadAdapter(avatar_text)
-
-    result = file_service.upload_avatar_for_user(
-        session, current_user.id, current_user.role, id, adapter
-    )
+    with ExitStack() as stack:
+        if avatar is not None:
+            if not avatar.filename:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="No avatar file"
+                )
+            adapter = FastAPIUploadAdapter(avatar)
+        else:
+            avatar_text = (avatar_base64 or "").strip()
+            if avatar_text:
+                adapter = Base64UploadAdapter(
+                    avatar_text, max_bytes=file_service.MAX_AVATAR_SIZE
+                )
+            elif request.headers.get("content-type", "").startswith("application/json"):
+                # Base64 膨胀 4/3，另留 data URI 头与 JSON 外壳的余量
+                body = stack.enter_context(await _spool_request_body(
+                    request, file_service.MAX_AVATAR_SIZE * 4 // 3 + 64 * 1024
+                ))
+                adapter = Base64UploadAdapter(
+                    lambda: iter_json_string_field(body, "avatar"),
+                    max_bytes=file_service.MAX_AVATAR_SIZE,
+                )
+
+            if adapter is None or not adapter.has_data:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="No avatar data"
+                )
+
+        result = file_service.upload_avatar_for_user(
+            session, current_user.id, current_user.role, id, adapter
+        )
     # 兼容旧前端字段名 avatar
     if result.get("avatar_url") and "avatar" not in result:
         result["avatar"] = result["avatar_url"]
@@ -324,6 +410,20 @@ def batch_delete_files(
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+@router.post("/files/batch-move")
+def batch_move_files(
+        payload: BatchMoveRequest,
+        current_user=Depends(get_current_user),
+        session: Session = Depends(get_db),
+):
+    """批量移动 / 重命名文件与文件夹；整批校验通过才生效。"""
+    items = [item.model_dump() for item in payload.items]
+    updated = file_service.batch_move_items(
+        session, current_user.id, current_user.role, items, payload.parent_id
+    )
+    return {"updated": updated}
+
+
 @router.post("/files/retry_embedding")
 def retry_embedding(
         payload: RetryEmbeddingRequest,
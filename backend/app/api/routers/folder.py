@@ -5,9 +5,10 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
+from app.api.file_responses import archive_response
 from app.api.schemas.folder import FolderCreateRequest, FolderUpdateRequest
 from app.extensions import get_db
-from app.services import folder_service
+from app.services import archive_service, folder_service
 
 router = APIRouter(tags=["folder"])
 
@@ -62,6 +63,19 @@ def get_root_folder_id(
     }
 
 
+@router.get("/folder/{id}/archive")
+def download_folder_archive(
+    id: int,
+    current_user=Depends(get_current_user),
+    session: Session = Depends(get_db),
+):
+    """整个文件夹子树打包为 ZIP 流式下载，不生成临时文件。"""
+    filename, entries = archive_service.collect_folder_entries(
+        session, current_user.id, current_user.role, id
+    )
+    return archive_response(filename, entries)
+
+
 @router.get("/folder/{id}")
 def get_folder(
     id: int,
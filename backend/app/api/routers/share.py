@@ -1,10 +1,11 @@
 """分享路由：创建/取消分享与匿名 token 访问。业务在 share_service。"""
 
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
+from app.api.file_responses import stored_file_response
 from app.api.schemas.share import ShareCreateRequest
 from app.extensions import get_db
 from app.services import share_service
@@ -46,14 +47,7 @@ def cancel_share(
 
 
 @router.get("/share/{token}")
-def access_share(token: str, session: Session = Depends(get_db)):
-    """匿名凭 token 内联预览/下载文件；过期或无效由 service 抛错。"""
+def access_share(token: str, request: Request, session: Session = Depends(get_db)):
+    """匿名凭 token 内联预览/下载文件；过期或无效由 service 抛错。支持 Range 与条件请求。"""
     file = share_service.resolve_shared_file(session, token)
-    abs_path = file.get_abs_path()
-
-    return FileResponse(
-        abs_path,
-        filename=file.name,
-        media_type=file.mime_type,
-        content_disposition_type="inline",
-    )
+    return stored_file_response(file, request, inline=True)
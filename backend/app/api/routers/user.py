@@ -1,13 +1,18 @@
-"""用户路由：资料 CRUD 与改密。业务在 user_service。"""
+"""用户路由：资料 CRUD、改密与存储用量 / 配额。业务在 user_service / storage_stats_service。"""
 
 from fastapi import APIRouter, Depends, Response, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
-from app.api.dependencies import get_current_user
-from app.api.schemas.user import UserCreateRequest, UserPasswordUpdateRequest, UserUpdateRequest
+from app.api.dependencies import get_current_user, require_admin
+from app.api.schemas.user import (
+    UserCreateRequest,
+    UserPasswordUpdateRequest,
+    UserQuotaUpdateRequest,
+    UserUpdateRequest,
+)
 from app.extensions import get_db
-from app.services import user_service
+from app.services import storage_stats_service, user_service
 
 router = APIRouter(tags=["user"])
 
@@ -65,6 +70,28 @@ def update_user_password(
     return {"message": "Password updated successfully"}
 
 
+@router.get("/users/{id}/storage")
+def get_user_storage(
+    id: int,
+    current_user=Depends(get_current_user),
+    session: Session = Depends(get_db),
+):
+    """存储用量与配额；读计数表，不扫描文件。"""
+    user_service.ensure_user_access(current_user.id, current_user.role, id)
+    return storage_stats_service.get_stats(session, id)
+
+
+@router.put("/users/{id}/quota")
+def update_user_quota(
+    id: int,
+    payload: UserQuotaUpdateRequest,
+    _admin=Depends(require_admin),
+    session: Session = Depends(get_db),
+):
+    """设置用户存储配额；仅管理员。"""
+    return storage_stats_service.set_quota(session, id, payload.quota_bytes)
+
+
 @router.delete("/users/{id}")
 def delete_user(
     id: int,
@@ -5,6 +5,7 @@ from app.api.schemas.chat import ChatRequest
 from app.api.schemas.file import (
     BatchDeleteItem,
     BatchDeleteRequest,
+    FilePreflightBatchRequest,
     FilePreflightRequest,
     FileUpdateRequest,
     MultipartCompleteRequest,
@@ -17,15 +18,17 @@ from app.api.schemas.sys_dict import SysDictPayload
 from app.api.schemas.user import (
     UserCreateRequest,
     UserPasswordUpdateRequest,
+    UserQuotaUpdateRequest,
     UserUpdateRequest,
 )
 from app.api.schemas.workspace import WorkspaceCreateRequest
 
 __all__ = [
-    "BatchDeleteItem", "BatchDeleteRequest", "ChatRequest", "FilePreflightRequest",
+    "BatchDeleteItem", "BatchDeleteRequest", "ChatRequest", "FilePreflightBatchRequest",
+    "FilePreflightRequest",
     "FileUpdateRequest", "FolderCreateRequest", "FolderUpdateRequest", "LoginRequest",
     "MultipartCompleteRequest", "MultipartInitRequest",
     "RegisterRequest", "RetryEmbeddingRequest", "ShareCreateRequest", "SysDictPayload",
-    "UserCreateRequest", "UserPasswordUpdateRequest", "UserUpdateRequest",
+    "UserCreateRequest", "UserPasswordUpdateRequest", "UserQuotaUpdateRequest", "UserUpdateRequest",
     "WorkspaceCreateRequest",
 ]
@@ -1,4 +1,4 @@
-"""文件相关请求体：更新、批量删除、分片上传与预检。"""
+"""文件相关请求体：更新、批量删除 / 移动、分片上传与预检。"""
 
 from pydantic import BaseModel, Field
 
@@ -24,6 +24,21 @@ class BatchDeleteRequest(BaseModel):
     items: list[BatchDeleteItem] = Field(default_factory=list, min_length=1)
 
 
+class BatchMoveItem(BaseModel):
+    """批量移动中的单项；name 非空时同时重命名。"""
+
+    id: int = Field(ge=1)
+    is_folder: bool = False
+    name: str | None = Field(default=None, min_length=1, max_length=255)
+
+
+class BatchMoveRequest(BaseModel):
+    """把多项移到同一目标文件夹；parent_id 为空时只按各项 name 重命名。"""
+
+    parent_id: int | None = Field(default=None, ge=1)
+    items: list[BatchMoveItem] = Field(min_length=1, max_length=1000)
+
+
 class RetryEmbeddingRequest(BaseModel):
     """单文件重新入队索引。"""
 
@@ -31,7 +46,7 @@ class RetryEmbeddingRequest(BaseModel):
 
 
 class MultipartInitRequest(BaseModel):
-    """分片上传初始化；content_hash 用于秒传判断。"""
+    """分片上传初始化；content_hash 用于秒传判断，mode 选择分片落盘方式。"""
 
     filename: str = Field(min_length=1, max_length=255)
     total_size: int = Field(gt=0)
@@ -40,6 +55,8 @@ class MultipartInitRequest(BaseModel):
     mime_type: str | None = Field(default=None, max_length=255)
     content_hash: str | None = Field(default=None, min_length=64, max_length=64)
     upload_id: str | None = Field(default=None, max_length=128)
+    # offset：分片按偏移直接写入预分配文件，可并行上传且完成时无需合并
+    mode: str | None = Field(default=None, pattern="^(chunked|offset)$")
 
 
 class MultipartCompleteRequest(BaseModel):
@@ -56,3 +73,9 @@ class FilePreflightRequest(BaseModel):
     parent_id: int | None = Field(default=None, ge=1)
     mime_type: str | None = Field(default=None, max_length=255)
     content_hash: str = Field(min_length=64, max_length=64)
+
+
+class FilePreflightBatchRequest(BaseModel):
+    """批量预检；结果按 items 顺序逐项返回。"""
+
+    items: list[FilePreflightRequest] = Field(min_length=1, max_length=1000)
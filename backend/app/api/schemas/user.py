@@ -24,3 +24,9 @@ class UserPasswordUpdateRequest(BaseModel):
 
     old_password: str = Field(min_length=1, max_length=128)
     new_password: str = Field(min_length=1, max_length=128)
+
+
+class UserQuotaUpdateRequest(BaseModel):
+    """管理员设置存储配额（字节）；null 恢复全局默认，0 表示不限。"""
+
+    quota_bytes: int | None = Field(default=None, ge=0)
@@ -7,18 +7,193 @@
     @cache_put  — 始终执行函数并回写缓存（Spring @CachePut）
 
 读/写失败只记日志，不阻断业务；None 默认不缓存，避免穿透。
+
+按代数失效：键里嵌入一个计数器的当前值（``read_generations``），变更时只需
+``bump_generations`` 把计数器 +1，旧键不再被命中、由 TTL 自然过期，无需 SCAN 删除。
+
+二级缓存：``@cacheable(local_ttl=...)`` 的前缀在 Redis 前再加一层进程内 LRU（L1），
+命中时不走网络、不做 json.loads。各处失效（evict / cache_evict / cache_put）除删 Redis 外
+还经 ``cache:invalidate`` 频道广播，各进程的订阅线程据此删掉本地副本；订阅未就绪或断线时
+L1 整体停用并清空，最坏情况下本地副本也只会旧到 local_ttl。
 """
 
 import asyncio
 import functools
 import json
 import logging
-from typing import Any, Callable, Optional
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
 
 from app.extensions import redis_client
 
 logger = logging.getLogger(__name__)
 
+L1_ENABLED = os.getenv("CACHE_L1_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+INVALIDATION_CHANNEL = "cache:invalidate"
+_RESUBSCRIBE_DELAY_SECONDS = 1.0
+_MISS = object()
+
+
+# ---------------------------------------------------------------------------
+# L1 进程内缓存与跨进程失效
+# ---------------------------------------------------------------------------
+
+class _LocalCache:
+    """单个前缀的进程内 LRU：条目按 local_ttl 过期，超出容量淘汰最久未用的。"""
+
+    def __init__(self, prefix: str, ttl: float, max_entries: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return _MISS
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[cache_key]
+                return _MISS
+            self._entries.move_to_end(cache_key)
+            return value
+
+    def put(self, cache_key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, cache_key: str) -> None:
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def owns_key(self, cache_key: str) -> bool:
+        return cache_key == self.prefix or cache_key.startswith(f"{self.prefix}:")
+
+    def overlaps_pattern(self, prefix: str) -> bool:
+        """``prefix:*`` 的批量删除是否可能涉及本前缀的键。"""
+        return (
+            prefix == self.prefix
+            or self.prefix.startswith(f"{prefix}:")
+            or prefix.startswith(f"{self.prefix}:")
+        )
+
+
+_local_caches: list[_LocalCache] = []
+_subscriber_lock = threading.Lock()
+_subscriber_pid: int | None = None
+_subscriber_ready = threading.Event()
+# fork 出的子进程继承同一 uuid，再拼上 pid 区分
+_INSTANCE_ID = uuid.uuid4().hex
+
+
+def _origin() -> str:
+    return f"{_INSTANCE_ID}:{os.getpid()}"
+
+
+def _register_local_cache(prefix: str, ttl: float, max_entries: int) -> _LocalCache | None:
+    if not L1_ENABLED or ttl <= 0 or max_entries <= 0:
+        return None
+    local = _LocalCache(prefix, ttl, max_entries)
+    _local_caches.append(local)
+    return local
+
+
+def _clear_local_caches() -> None:
+    for local in _local_caches:
+        local.clear()
+
+
+def _apply_invalidation(message: dict) -> None:
+    cache_key = message.get("key")
+    pattern_prefix = message.get("prefix")
+    for local in _local_caches:
+        if cache_key is not None and local.owns_key(cache_key):
+            local.delete(cache_key)
+        elif pattern_prefix is not None and local.overlaps_pattern(pattern_prefix):
+            local.clear()
+
+
+def _listen_invalidations() -> None:
+    """订阅失效频道；确认订阅后才启用 L1，断线期间 L1 停用，重连后先清空再启用。"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                if message["type"] == "subscribe":
+                    # 订阅生效前广播的失效可能已漏掉：清空后再开始服务
+                    _clear_local_caches()
+                    _subscriber_ready.set()
+                elif message["type"] == "message":
+                    try:
+                        payload = json.loads(message["data"])
+                        # 本进程发出的失效已在发布前应用；再应用一次会删掉其后刚回填的新值
+                        if payload.get("origin") != _origin():
+                            _apply_invalidation(payload)
+                    except (AttributeError, TypeError, ValueError) as e:
+                        logger.warning(f"[cache] bad invalidation message {message['data']!r}: {e}")
+        except Exception as e:
+            logger.warning(f"[cache] invalidation subscriber error, L1 disabled until resubscribed: {e}")
+        finally:
+            _subscriber_ready.clear()
+            _clear_local_caches()
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        time.sleep(_RESUBSCRIBE_DELAY_SECONDS)
+
+
+def _local_ready() -> bool:
+    """按需启动订阅线程（fork 出的子进程各自重启一份）；订阅确认前不使用 L1。"""
+    global _subscriber_pid
+    pid = os.getpid()
+    if _subscriber_pid != pid:
+        with _subscriber_lock:
+            if _subscriber_pid != pid:
+                _subscriber_ready.clear()
+                _clear_local_caches()
+                threading.Thread(
+                    target=_listen_invalidations, name="cache-invalidation", daemon=True
+                ).start()
+                _subscriber_pid = pid
+    return _subscriber_ready.is_set()
+
+
+def _broadcast_invalidation(*, cache_key: str | None = None, prefix: str | None = None) -> None:
+    """先删本进程的 L1 副本，再广播给其它进程；没有前缀启用 L1 时什么都不做。"""
+    message = {"key": cache_key} if cache_key is not None else {"prefix": prefix}
+    if cache_key is not None:
+        affected = any(local.owns_key(cache_key) for local in _local_caches)
+    else:
+        affected = any(local.overlaps_pattern(prefix) for local in _local_caches)
+    if not affected:
+        return
+    _apply_invalidation(message)
+    try:
+        redis_client.publish(
+            INVALIDATION_CHANNEL,
+            json.dumps({**message, "origin": _origin()}, ensure_ascii=False),
+        )
+    except Exception as e:
+        logger.warning(f"[cache] publish invalidation error {message}: {e}")
+
 
 # ---------------------------------------------------------------------------
 # 缓存键构造
@@ -55,6 +230,8 @@ def cacheable(
         expire: int = 3600,
         cache_none: bool = False,
         key: Optional[Callable] = None,
+        local_ttl: float = 0,
+        local_max_entries: int = 1024,
 ):
     """先查 Redis，未命中再执行函数并写入。
 
@@ -62,51 +239,61 @@ def cacheable(
     :param expire: TTL 秒，默认 3600
     :param cache_none: False 时不缓存 None（对应 unless="#result == null"）
     :param key: 可选 ``(*args, **kwargs) -> Any`` 生成键后缀
+    :param local_ttl: 大于 0 时在 Redis 前加进程内 L1，条目最多保留的秒数；
+        L1 命中返回共享对象，调用方须按只读使用
+    :param local_max_entries: L1 容量上限，超出按 LRU 淘汰
     """
+    local = _register_local_cache(prefix, local_ttl, local_max_entries)
+
+    def _read(cache_key: str) -> Any:
+        use_local = local is not None and _local_ready()
+        if use_local:
+            value = local.get(cache_key)
+            if value is not _MISS:
+                return value
+        try:
+            cached = redis_client.get(cache_key)
+            if cached is not None:
+                value = json.loads(cached)
+                if use_local:
+                    local.put(cache_key, value)
+                return value
+        except Exception as e:
+            logger.warning(f"[cache] read error {cache_key}: {e}")
+        return _MISS
+
+    def _write(cache_key: str, result: Any) -> None:
+        if result is None and not cache_none:
+            return
+        try:
+            payload = json.dumps(result, ensure_ascii=False, default=str)
+            redis_client.setex(cache_key, expire, payload)
+        except Exception as e:
+            logger.warning(f"[cache] write error {cache_key}: {e}")
+            return
+        if local is not None and _local_ready():
+            # 存反序列化后的副本：与 Redis 命中时的形态一致，也不与调用方共享可变对象
+            local.put(cache_key, json.loads(payload))
 
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
             cache_key = _build_cache_key(prefix, args, kwargs, key)
-            try:
-                cached = redis_client.get(cache_key)
-                if cached is not None:
-                    return json.loads(cached)
-            except Exception as e:
-                logger.warning(f"[cache] read error {cache_key}: {e}")
-
+            cached = _read(cache_key)
+            if cached is not _MISS:
+                return cached
             result = func(*args, **kwargs)
-
-            if result is not None or cache_none:
-                try:
-                    redis_client.setex(
-                        cache_key, expire,
-                        json.dumps(result, ensure_ascii=False, default=str),
-                    )
-                except Exception as e:
-                    logger.warning(f"[cache] write error {cache_key}: {e}")
+            _write(cache_key, result)
             return result
 
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
             cache_key = _build_cache_key(prefix, args, kwargs, key)
-            try:
-                cached = redis_client.get(cache_key)
-                if cached is not None:
-                    return json.loads(cached)
-            except Exception as e:
-                logger.warning(f"[cache] read error {cache_key}: {e}")
-
+            cached = _read(cache_key)
+            if cached is not _MISS:
+                return cached
             result = await func(*args, **kwargs)
-
-            if result is not None or cache_none:
-                try:
-                    redis_client.setex(
-                        cache_key, expire,
-                        json.dumps(result, ensure_ascii=False, default=str),
-                    )
-                except Exception as e:
-                    logger.warning(f"[cache] write error {cache_key}: {e}")
+            _write(cache_key, result)
             return result
 
         chosen = async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
@@ -136,14 +323,15 @@ def cache_evict(
 
     def decorator(func: Callable) -> Callable:
         def _do_evict(args, kwargs):
+            if all_entries:
+                _evict_pattern(prefix)
+                return
+            cache_key = _build_cache_key(prefix, args, kwargs, key)
             try:
-                if all_entries:
-                    _evict_pattern(prefix)
-                else:
-                    cache_key = _build_cache_key(prefix, args, kwargs, key)
-                    redis_client.delete(cache_key)
+                redis_client.delete(cache_key)
             except Exception as e:
                 logger.warning(f"[cache] evict error {prefix}: {e}")
+            _broadcast_invalidation(cache_key=cache_key)
 
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
@@ -210,6 +398,8 @@ def _put_result(prefix, args, kwargs, key, result, expire, cache_none):
         )
     except Exception as e:
         logger.warning(f"[cache] put error {cache_key}: {e}")
+    # 其它进程的 L1 副本已过时，下次读回源到 Redis
+    _broadcast_invalidation(cache_key=cache_key)
 
 
 # ---------------------------------------------------------------------------
@@ -226,6 +416,7 @@ def evict_cache(prefix: str, *key_parts: Any) -> None:
         redis_client.delete(cache_key)
     except Exception as e:
         logger.warning(f"[cache] manual evict error {cache_key}: {e}")
+    _broadcast_invalidation(cache_key=cache_key)
 
 
 def _evict_pattern(prefix: str) -> int:
@@ -239,8 +430,40 @@ def _evict_pattern(prefix: str) -> int:
     except Exception as e:
         logger.warning(f"[cache] pattern evict error {prefix}: {e}")
         return 0
+    finally:
+        # Redis 删完再通知：其它进程据此回源时读到的已是新状态
+        _broadcast_invalidation(prefix=prefix)
 
 
 def evict_cache_pattern(prefix: str) -> int:
     """手动按前缀批量失效，返回删除键数。"""
     return _evict_pattern(prefix)
+
+
+# ---------------------------------------------------------------------------
+# 代数失效
+# ---------------------------------------------------------------------------
+
+def read_generations(*gen_keys: str) -> list[int] | None:
+    """一次 MGET 读出各代数（不存在为 0）；Redis 不可用时返回 None，调用方应跳过缓存。"""
+    try:
+        values = redis_client.mget(*gen_keys)
+    except Exception as e:
+        logger.warning(f"[cache] read generation error {gen_keys}: {e}")
+        return None
+    return [int(value or 0) for value in values]
+
+
+def bump_generations(gen_keys: Iterable[str], expire: int) -> None:
+    """各代数原子 +1 并续期；``expire`` 须长于挂在代数下的缓存 TTL，过期归零后才不会撞上旧键。"""
+    gen_keys = set(gen_keys)
+    if not gen_keys:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for gen_key in gen_keys:
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, expire)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"[cache] bump generation error {sorted(gen_keys)}: {e}")
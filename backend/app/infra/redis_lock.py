@@ -0,0 +1,41 @@
+"""Redis 分布式锁：SET NX EX 抢锁，比对 token 后释放。
+
+用于后台任务在多 worker 间互斥；锁带 TTL，持有者崩溃后自动失效。
+"""
+
+import uuid
+
+from app.extensions import redis_client
+
+# 仅持有者可释放，避免锁过期后误删别人的锁
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 仅持有者可续期
+_EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def acquire(key: str, ttl_seconds: int) -> str | None:
+    """抢锁成功返回 token，否则 None。"""
+    token = uuid.uuid4().hex
+    if redis_client.set(key, token, nx=True, ex=ttl_seconds):
+        return token
+    return None
+
+
+def extend(key: str, token: str, ttl_seconds: int) -> bool:
+    """续期；锁已易主或过期返回 False，调用方应停止工作。"""
+    return bool(redis_client.eval(_EXTEND_SCRIPT, 1, key, token, ttl_seconds))
+
+
+def release(key: str, token: str) -> None:
+    redis_client.eval(_RELEASE_SCRIPT, 1, key, token)
@@ -0,0 +1,360 @@
+"""存储驱动：本地文件系统与 S3 兼容对象存储（MinIO 等），按 STORAGE_BACKEND 选择。
+
+key 即 files.file_path（相对存储根，如 ``blobs/ab/cd/<sha256>``）；业务层不再自行拼
+UPLOAD_FOLDER。上传临时文件与分片暂存仍在本地 UPLOAD_FOLDER 下，登记时经
+``put_file`` 交给驱动。
+
+S3 驱动按需导入 boto3，仅 STORAGE_BACKEND=s3 时需要安装。
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, BinaryIO, ContextManager, Iterator
+
+from app.extensions import UPLOAD_FOLDER
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").strip().lower()
+READ_CHUNK_SIZE = 1024 * 1024
+PRESIGN_EXPIRE_SECONDS = int(os.getenv("STORAGE_PRESIGN_EXPIRE_SECONDS", "300"))
+
+
+@dataclass(frozen=True, slots=True)
+class ObjectStat:
+    size: int
+    mtime: float
+
+
+class StorageDriver:
+    """驱动接口；子类实现全部方法。"""
+
+    def stat(self, key: str) -> ObjectStat | None:
+        """对象不存在返回 None。"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def open_range(self, key: str, start: int = 0, length: int | None = None) -> Iterator[bytes]:
+        """按块读取 [start, start+length)；length 为 None 时读到末尾。"""
+        raise NotImplementedError
+
+    def write(self, key: str, stream: BinaryIO) -> None:
+        """把可读流写为对象；写完才对读者可见。"""
+        raise NotImplementedError
+
+    def put_file(self, key: str, source_path: str) -> None:
+        """把本地临时文件登记为对象，source_path 随后不再可用。"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """删除对象；不存在时静默。"""
+        raise NotImplementedError
+
+    def move(self, src_key: str, dst_key: str) -> None:
+        """把对象改挂到新 key（覆盖已有对象）。"""
+        raise NotImplementedError
+
+    def iter_keys(self, start_after: str = "", skip_prefixes: tuple[str, ...] = ()) -> Iterator[str]:
+        """按字节序逐个列出大于 start_after 的 key，跳过 skip_prefixes 下的对象。"""
+        raise NotImplementedError
+
+    def presign(
+            self,
+            key: str,
+            filename: str | None = None,
+            content_type: str | None = None,
+            inline: bool = False,
+            expires: int = PRESIGN_EXPIRE_SECONDS,
+    ) -> str | None:
+        """返回可直连下载的临时 URL；驱动无此能力时返回 None，由 API 自行输出。"""
+        return None
+
+    def local_file(self, key: str) -> str | None:
+        """对象本身就是本地文件时返回其路径（可走 sendfile），否则 None。"""
+        return None
+
+    def local_path(self, key: str, suffix: str = "") -> ContextManager[str]:
+        """上下文管理器：给只能处理本地路径的解析器（LibreOffice / cv2 等）一个带 suffix 的本地路径。"""
+        raise NotImplementedError
+
+
+class LocalStorageDriver(StorageDriver):
+    """对象即 root 下的普通文件；多节点部署需共享挂载。"""
+
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def stat(self, key: str) -> ObjectStat | None:
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return ObjectStat(size=st.st_size, mtime=st.st_mtime)
+
+    def open_range(self, key: str, start: int = 0, length: int | None = None) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def write(self, key: str, stream: BinaryIO) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(stream, f, length=READ_CHUNK_SIZE)
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, key: str, source_path: str) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source_path, target)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, src_key: str, dst_key: str) -> None:
+        target = self._path(dst_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self._path(src_key), target)
+
+    def iter_keys(self, start_after: str = "", skip_prefixes: tuple[str, ...] = ()) -> Iterator[str]:
+        # 目录名带 "/" 参与排序，与 S3 / Postgres COLLATE "C" 的整 key 字节序一致
+        def walk(dir_path: str, rel_prefix: str) -> Iterator[str]:
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = [
+                        (rel_prefix + e.name + ("/" if e.is_dir(follow_symlinks=False) else ""), e)
+                        for e in it
+                    ]
+            except FileNotFoundError:
+                return
+            entries.sort(key=lambda item: item[0])
+            for key, entry in entries:
+                if key.startswith(skip_prefixes):
+                    continue
+                if key.endswith("/"):
+                    # 整棵子树都排在 start_after 之前则不必下探
+                    if key < start_after and not start_after.startswith(key):
+                        continue
+                    yield from walk(entry.path, key)
+                elif key > start_after:
+                    yield key
+
+        yield from walk(self.root, "")
+
+    def local_file(self, key: str) -> str | None:
+        return self._path(key)
+
+    @contextmanager
+    def local_path(self, key: str, suffix: str = "") -> Iterator[str]:
+        path = self._path(key)
+        if not suffix or path.lower().endswith(suffix.lower()):
+            yield path
+            return
+        # 只换扩展名，软链即可，无需拷贝
+        with tempfile.TemporaryDirectory() as tmpdir:
+            link_path = os.path.join(tmpdir, f"source{suffix}")
+            os.symlink(path, link_path)
+            yield link_path
+
+
+class S3StorageDriver(StorageDriver):
+    """S3 兼容对象存储；MinIO 需配置 S3_ENDPOINT_URL 并使用 path-style 寻址。
+
+    预签名 URL 交给浏览器直连，签名里的 host 必须是浏览器可达的地址：
+    ``public_endpoint_url`` 为空而 ``endpoint_url`` 是自定义（多为内网）地址时不预签名，
+    由 API 回源输出；两者都为空（AWS 默认端点）时直接用同一客户端签名。
+    """
+
+    def __init__(
+            self,
+            bucket: str,
+            endpoint_url: str | None = None,
+            access_key: str | None = None,
+            secret_key: str | None = None,
+            region: str | None = None,
+            prefix: str = "",
+            public_endpoint_url: str | None = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client_kwargs = {
+            "endpoint_url": endpoint_url or None,
+            "aws_access_key_id": access_key or None,
+            "aws_secret_access_key": secret_key or None,
+            "region_name": region or None,
+        }
+        self._public_endpoint_url = public_endpoint_url or None
+        self._client = None
+        self._presign_client = None
+        self._client_lock = threading.Lock()
+
+    def _new_client(self, endpoint_url: str | None) -> Any:
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            config=Config(s3={"addressing_style": "path"}),
+            **{**self._client_kwargs, "endpoint_url": endpoint_url},
+        )
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._new_client(self._client_kwargs["endpoint_url"])
+        return self._client
+
+    @property
+    def presign_client(self) -> Any | None:
+        """签发浏览器直连 URL 的客户端；没有浏览器可达的端点时为 None。"""
+        if self._public_endpoint_url is None:
+            return None if self._client_kwargs["endpoint_url"] else self.client
+        if self._presign_client is None:
+            with self._client_lock:
+                if self._presign_client is None:
+                    # 签名只在本地计算，不会连接该端点
+                    self._presign_client = self._new_client(self._public_endpoint_url)
+        return self._presign_client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def stat(self, key: str) -> ObjectStat | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectStat(
+            size=int(head["ContentLength"]),
+            mtime=head["LastModified"].timestamp(),
+        )
+
+    def open_range(self, key: str, start: int = 0, length: int | None = None) -> Iterator[bytes]:
+        if length == 0:
+            return
+        params: dict[str, Any] = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or length is not None:
+            end = "" if length is None else str(start + length - 1)
+            params["Range"] = f"bytes={start}-{end}"
+        body = self.client.get_object(**params)["Body"]
+        try:
+            yield from body.iter_chunks(READ_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def write(self, key: str, stream: BinaryIO) -> None:
+        # upload_fileobj 超过阈值自动走分段上传，不会整块读入内存
+        self.client.upload_fileobj(stream, self.bucket, self._key(key))
+
+    def put_file(self, key: str, source_path: str) -> None:
+        self.client.upload_file(source_path, self.bucket, self._key(key))
+        os.remove(source_path)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def move(self, src_key: str, dst_key: str) -> None:
+        # S3 无 rename；托管 copy 对大对象自动分段复制
+        self.client.copy(
+            {"Bucket": self.bucket, "Key": self._key(src_key)}, self.bucket, self._key(dst_key)
+        )
+        self.delete(src_key)
+
+    def iter_keys(self, start_after: str = "", skip_prefixes: tuple[str, ...] = ()) -> Iterator[str]:
+        root = f"{self.prefix}/" if self.prefix else ""
+        params: dict[str, Any] = {"Bucket": self.bucket, "Prefix": root}
+        if start_after:
+            params["StartAfter"] = root + start_after
+        for page in self.client.get_paginator("list_objects_v2").paginate(**params):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(root):]
+                if key and not key.startswith(skip_prefixes):
+                    yield key
+
+    def presign(
+            self,
+            key: str,
+            filename: str | None = None,
+            content_type: str | None = None,
+            inline: bool = False,
+            expires: int = PRESIGN_EXPIRE_SECONDS,
+    ) -> str | None:
+        from urllib.parse import quote
+
+        client = self.presign_client
+        if client is None:
+            return None
+        params: dict[str, Any] = {"Bucket": self.bucket, "Key": self._key(key)}
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            params["ResponseContentDisposition"] = (
+                f"{disposition}; filename*=UTF-8''{quote(filename)}"
+            )
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expires
+        )
+
+    @contextmanager
+    def local_path(self, key: str, suffix: str = "") -> Iterator[str]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, f"source{suffix}")
+            self.client.download_file(self.bucket, self._key(key), path)
+            yield path
+
+
+def _build_driver() -> StorageDriver:
+    if STORAGE_BACKEND == "s3":
+        bucket = os.getenv("S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("S3_BUCKET is required when STORAGE_BACKEND=s3")
+        return S3StorageDriver(
+            bucket=bucket,
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            access_key=os.getenv("S3_ACCESS_KEY"),
+            secret_key=os.getenv("S3_SECRET_KEY"),
+            region=os.getenv("S3_REGION"),
+            prefix=os.getenv("S3_PREFIX", ""),
+            public_endpoint_url=os.getenv("S3_PUBLIC_ENDPOINT_URL"),
+        )
+    if STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unsupported STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return LocalStorageDriver(UPLOAD_FOLDER)
+
+
+storage = _build_driver()
@@ -1,16 +1,173 @@
 """上传适配层：把 FastAPI UploadFile / Base64 统一成 service 期望的 save(path) 接口。
 
 历史 service 按 Werkzeug FileStorage 风格编写；适配器避免改动业务层签名。
+``save`` 在写盘的同一遍里算出 SHA-256、字节数并嗅探 MIME，service 无需回读文件。
 """
 
-import base64
+import binascii
+import hashlib
 import mimetypes
+import os
 import re
-import shutil
 import uuid
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
 
 from fastapi import UploadFile
 
+from app.exceptions import BusinessRuleError, PayloadTooLargeError
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 魔数签名：(偏移, 前缀, MIME)。zip 容器（docx/xlsx 等）无法仅凭魔数区分，交给扩展名判断
+_MAGIC_SIGNATURES: tuple[tuple[int, bytes, str], ...] = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"\x1a\x45\xdf\xa3", "video/x-matroska"),
+)
+# ISO-BMFF（ftyp box）按 major brand 区分图片/音视频
+_FTYP_BRANDS: dict[bytes, str] = {
+    b"qt  ": "video/quicktime",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"mif1": "image/heif",
+    b"avif": "image/avif",
+    b"M4A ": "audio/mp4",
+}
+SNIFF_BYTES = 16
+# data URI 头（data:<mime>;base64,）只在开头这一段里找
+_DATA_URI_HEAD_BYTES = 256
+_BASE64_WHITESPACE = b" \t\r\n\f\v"
+_JSON_STRING_SPECIAL = re.compile(rb'["\\]')
+_JSON_SIMPLE_ESCAPES = {
+    b'"': b'"', b"\\": b"\\", b"/": b"/",
+    b"b": b"\b", b"f": b"\f", b"n": b"\n", b"r": b"\r", b"t": b"\t",
+}
+
+
+def sniff_mime_type(head: bytes) -> str | None:
+    """按文件头魔数判断 MIME；未命中返回 None，由调用方回退到扩展名。"""
+    if head[:4] == b"RIFF" and len(head) >= 12:
+        riff_type = head[8:12]
+        if riff_type == b"WEBP":
+            return "image/webp"
+        if riff_type == b"WAVE":
+            return "audio/wav"
+        if riff_type == b"AVI ":
+            return "video/x-msvideo"
+        return None
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+    for offset, prefix, mime_type in _MAGIC_SIGNATURES:
+        if head[offset:offset + len(prefix)] == prefix:
+            return mime_type
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class SavedUpload:
+    """一次 save 的落盘结果：写入过程中顺带得到的内容摘要。"""
+
+    size: int
+    content_hash: str
+    mime_type: str | None
+
+
+class HashingSink:
+    """写入目标文件的同时累计 SHA-256 与字节数，并用首块数据嗅探 MIME。
+
+    传入 ``digest`` 时在其上续算（分片上传按序拼接整文件摘要）；
+    ``max_bytes`` 在写入越界前即抛错，目标区域之外的数据不会被改写。
+    """
+
+    def __init__(self, target: Any, digest: Any = None, max_bytes: int | None = None):
+        self._target = target
+        self._digest = digest if digest is not None else hashlib.sha256()
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._head = b""
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        if self._max_bytes is not None and self._size + len(data) > self._max_bytes:
+            raise PayloadTooLargeError("Upload exceeds size limit")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        self._digest.update(data)
+        self._target.write(data)
+        self._size += len(data)
+
+    def result(self) -> SavedUpload:
+        return SavedUpload(
+            size=self._size,
+            content_hash=self._digest.hexdigest(),
+            mime_type=sniff_mime_type(self._head),
+        )
+
+
+class OffsetWriter:
+    """把顺序 write 映射为从固定偏移开始的 pwrite，供并行分片直接写入预分配文件。"""
+
+    def __init__(self, fd: int, offset: int):
+        self._fd = fd
+        self._offset = offset
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self._fd, view, self._offset)
+            self._offset += written
+            view = view[written:]
+
+
+def update_digest_from_file(
+        digest: Any, path: str, offset: int = 0, length: int | None = None
+) -> None:
+    """把磁盘文件 [offset, offset+length) 的内容续算进已有摘要对象。"""
+    with open(path, "rb") as file_obj:
+        file_obj.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = COPY_BUFFER_SIZE if remaining is None else min(COPY_BUFFER_SIZE, remaining)
+            chunk = file_obj.read(size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+def copy_stream(
+        source: BinaryIO, target: Any, digest: Any = None, max_bytes: int | None = None
+) -> SavedUpload:
+    """把可读流写入任意带 write 的目标，单遍完成写入与摘要计算。"""
+    sink = HashingSink(target, digest, max_bytes)
+    while True:
+        chunk = source.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        sink.write(chunk)
+    return sink.result()
+
+
+def copy_to_path(source: BinaryIO, destination: str, digest: Any = None) -> SavedUpload:
+    """把可读流复制到 destination，单遍完成写盘与摘要计算。"""
+    with open(destination, "wb") as target:
+        return copy_stream(source, target, digest)
+
 
 class FastAPIUploadAdapter:
     """包装 UploadFile，提供 ``filename`` / ``mimetype`` / ``save``。"""
@@ -20,31 +177,87 @@ class FastAPIUploadAdapter:
         self.filename = upload_file.filename or ""
         self.mimetype = upload_file.content_type
 
-    def save(self, destination: str) -> None:
+    def save(self, destination: str, digest: Any = None) -> SavedUpload:
         # 允许同一请求内多次 save，故先 seek 到起点
         self._upload_file.file.seek(0)
-        with open(destination, "wb") as target:
-            shutil.copyfileobj(self._upload_file.file, target)
+        return copy_to_path(self._upload_file.file, destination, digest)
+
+    def write_to(
+            self, target: Any, digest: Any = None, max_bytes: int | None = None
+    ) -> SavedUpload:
+        """写入已打开的目标（如 OffsetWriter），超过 max_bytes 立即中止。"""
+        self._upload_file.file.seek(0)
+        return copy_stream(self._upload_file.file, target, digest, max_bytes)
+
+
+class Base64StreamDecoder:
+    """增量 Base64 解码：逐块喂入文本，按 4 字符一组解码后立即写入 sink。
+
+    内存里只留不足一组的尾巴；空白字符忽略，padding 之后再有数据视为非法。
+    配合 ``HashingSink(max_bytes=...)`` 可在解码途中就截断超限上传。
+    """
+
+    def __init__(self, sink: Any):
+        self._sink = sink
+        self._pending = b""
+        self._finished = False
+
+    def feed(self, text: bytes) -> None:
+        text = text.translate(None, _BASE64_WHITESPACE)
+        if not text:
+            return
+        data = self._pending + text
+        cut = len(data) - len(data) % 4
+        self._pending = data[cut:]
+        if cut:
+            self._decode(data[:cut])
+
+    def close(self) -> None:
+        if self._pending:
+            # 容忍省略 padding 的输入
+            self._decode(self._pending + b"=" * (-len(self._pending) % 4))
+            self._pending = b""
+
+    def _decode(self, block: bytes) -> None:
+        if self._finished:
+            raise BusinessRuleError("Invalid base64 data")
+        try:
+            decoded = binascii.a2b_base64(block, strict_mode=True)
+        except binascii.Error:
+            raise BusinessRuleError("Invalid base64 data")
+        self._finished = block.endswith(b"=")
+        self._sink.write(decoded)
 
 
 class Base64UploadAdapter:
-    """解析 data URI 或裸 Base64，补全扩展名后写入磁盘。"""
+    """解析 data URI 或裸 Base64，补全扩展名后边解码边写盘。
+
+    ``source`` 为字符串，或每次调用都从头产出 Base64 文本块的可调用对象（如
+    ``iter_json_string_field`` 从暂存的请求体里流式取字段），整段文本无需进内存。
+    ``max_bytes`` 限制解码后的字节数，解码途中超限即中止。
+    """
 
-    def __init__(self, base64_str: str, filename: str = None):
-        self._base64_str = base64_str
+    def __init__(
+            self,
+            source: str | Callable[[], Iterable[bytes]],
+            filename: str = None,
+            max_bytes: int | None = None,
+    ):
+        self._source = source
+        self._max_bytes = max_bytes
         self.filename = filename
         self.mimetype = "application/octet-stream"
-        self._data = None
 
-        # 支持 data:image/png;base64,xxxx 形式
-        if "," in base64_str:
-            header, data = base64_str.split(",", 1)
-            self._data = data
-            match = re.match(r"data:([^;]+);base64", header)
+        # 支持 data:image/png;base64,xxxx 形式；头部很短，只看开头一段
+        head = self._read_head()
+        self._data_offset = 0
+        if b"," in head:
+            header, head = head.split(b",", 1)
+            self._data_offset = len(header) + 1
+            match = re.match(rb"\s*data:([^;]+);base64", header)
             if match:
-                self.mimetype = match.group(1)
-        else:
-            self._data = base64_str
+                self.mimetype = match.group(1).decode("ascii", errors="replace")
+        self.has_data = bool(head.strip())
 
         # 无文件名时按 MIME 猜扩展名，避免落盘无后缀
         if not self.filename:
@@ -63,11 +276,159 @@ class Base64UploadAdapter:
             ext = mimetypes.guess_extension(self.mimetype) or ".bin"
             self.filename = f"{self.filename}{ext}"
 
-    def save(self, destination: str) -> None:
-        file_data = base64.b64decode(self._data)
+    def _iter_source(self) -> Iterator[bytes]:
+        if isinstance(self._source, str):
+            for i in range(0, len(self._source), COPY_BUFFER_SIZE):
+                chunk = self._source[i:i + COPY_BUFFER_SIZE]
+                try:
+                    yield chunk.encode("ascii")
+                except UnicodeEncodeError:
+                    raise BusinessRuleError("Invalid base64 data")
+        else:
+            yield from self._source()
+
+    def _read_head(self) -> bytes:
+        head = b""
+        for chunk in self._iter_source():
+            head += chunk
+            if len(head) >= _DATA_URI_HEAD_BYTES:
+                break
+        return head[:_DATA_URI_HEAD_BYTES]
+
+    def _iter_data(self) -> Iterator[bytes]:
+        """跳过 data URI 头部后的 Base64 文本块。"""
+        skip = self._data_offset
+        for chunk in self._iter_source():
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk[skip:], 0
+            yield chunk
+
+    def save(self, destination: str, digest: Any = None) -> SavedUpload:
         with open(destination, "wb") as f:
-            f.write(file_data)
+            return self.write_to(f, digest, self._max_bytes)
+
+    def write_to(
+            self, target: Any, digest: Any = None, max_bytes: int | None = None
+    ) -> SavedUpload:
+        sink = HashingSink(target, digest, max_bytes)
+        decoder = Base64StreamDecoder(sink)
+        for chunk in self._iter_data():
+            decoder.feed(chunk)
+        decoder.close()
+        return sink.result()
 
     @property
     def content_type(self):
         return self.mimetype
+
+
+class _JsonByteStream:
+    """JSON 请求体的按块读取游标；只实现取顶层字段所需的最小词法。"""
+
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self._buf = b""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        if self._pos < len(self._buf):
+            return True
+        self._buf = self._source.read(COPY_BUFFER_SIZE)
+        self._pos = 0
+        return bool(self._buf)
+
+    def next_byte(self) -> bytes:
+        if not self._fill():
+            raise BusinessRuleError("Invalid JSON body")
+        byte = self._buf[self._pos:self._pos + 1]
+        self._pos += 1
+        return byte
+
+    def next_token(self) -> bytes:
+        """跳过空白，返回下一个有效字节。"""
+        while True:
+            byte = self.next_byte()
+            if byte not in b" \t\r\n":
+                return byte
+
+    def iter_string(self) -> Iterator[bytes]:
+        """开引号之后调用：成段产出反转义后的内容，直到闭引号。"""
+        while True:
+            if not self._fill():
+                raise BusinessRuleError("Invalid JSON body")
+            match = _JSON_STRING_SPECIAL.search(self._buf, self._pos)
+            end = match.start() if match else len(self._buf)
+            if end > self._pos:
+                yield self._buf[self._pos:end]
+            self._pos = end
+            if not match:
+                continue
+            self._pos += 1
+            if match.group() == b'"':
+                return
+            escape = self.next_byte()
+            if escape == b"u":
+                code = b"".join(self.next_byte() for _ in range(4))
+                try:
+                    yield chr(int(code, 16)).encode("utf-8", errors="replace")
+                except ValueError:
+                    raise BusinessRuleError("Invalid JSON body")
+            elif escape in _JSON_SIMPLE_ESCAPES:
+                yield _JSON_SIMPLE_ESCAPES[escape]
+            else:
+                raise BusinessRuleError("Invalid JSON body")
+
+    def skip_value(self, first: bytes) -> None:
+        if first == b'"':
+            for _ in self.iter_string():
+                pass
+            return
+        if first in (b"{", b"["):
+            depth = 1
+            while depth:
+                byte = self.next_byte()
+                if byte == b'"':
+                    for _ in self.iter_string():
+                        pass
+                elif byte in (b"{", b"["):
+                    depth += 1
+                elif byte in (b"}", b"]"):
+                    depth -= 1
+            return
+        # 数字 / true / false / null：读到分隔符为止
+        while self._fill():
+            if self._buf[self._pos:self._pos + 1] in (b",", b"}", b" ", b"\t", b"\r", b"\n"):
+                return
+            self._pos += 1
+
+
+def iter_json_string_field(source: BinaryIO, field: str) -> Iterator[bytes]:
+    """从 JSON 对象流中取顶层字符串字段 ``field``，分块产出其内容（已反转义）。
+
+    其他字段只跳过不解析，请求体无需整体读入内存；字段缺失或不是字符串时不产出。
+    每次调用都从 source 开头重新读取。
+    """
+    source.seek(0)
+    stream = _JsonByteStream(source)
+    if stream.next_token() != b"{":
+        raise BusinessRuleError("Invalid JSON body")
+    wanted = field.encode("utf-8")
+    while True:
+        token = stream.next_token()
+        if token == b"}":
+            return
+        if token == b",":
+            continue
+        if token != b'"':
+            raise BusinessRuleError("Invalid JSON body")
+        key = b"".join(stream.iter_string())
+        if stream.next_token() != b":":
+            raise BusinessRuleError("Invalid JSON body")
+        token = stream.next_token()
+        if key == wanted and token == b'"':
+            yield from stream.iter_string()
+            return
+        stream.skip_value(token)
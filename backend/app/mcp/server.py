@@ -24,7 +24,8 @@ from pydantic import BaseModel, Field
 from app.exceptions import DomainError
 from app.extensions import SessionLocal
 from app.infra.datetime_utils import beijing_now
-from app.services import file_service, folder_service, share_service
+from app.infra.storage import storage
+from app.services import file_service, folder_service, share_service, storage_stats_service
 from app.services.auth_service import decode_token
 
 logger = logging.getLogger(__name__)
@@ -183,6 +184,8 @@ async def search_files(
             - "fuzzy"：仅对文件名进行模糊匹配，不搜索文件内容或描述。
             - "vector"：AI 语义搜索，可匹配文件内容和描述。
               如果需要按文件内容查找，请使用 vector 模式。
+            - "fulltext"：对文件名和 AI 描述做关键词全文检索，适合发票号、人名、代码标识符等精确词。
+            - "hybrid"：fulltext 与 vector 结果融合排序，兼顾精确词与语义。
     """
     user_id = _get_authenticated_user_id()
     # service 内部已 to_thread；session 在 await 完成后再 close
@@ -492,15 +495,19 @@ async def read_file_content(
                     ensure_ascii=False,
                 )
 
-            abs_path = file_obj.get_abs_path()
-            if not os.path.exists(abs_path):
+            stat = storage.stat(file_obj.file_path)
+            if stat is None:
                 return _error_json("File not found on server")
 
-            file_size = os.path.getsize(abs_path)
+            file_size = stat.size
             truncated = file_size > _MAX_READ_BYTES
 
-            with open(abs_path, "r", encoding=encoding, errors="replace") as f:
-                content = f.read(_MAX_READ_BYTES)
+            # 只取前 _MAX_READ_BYTES 字节，对象存储下走 Range 读取
+            raw = b"".join(storage.open_range(file_obj.file_path, 0, _MAX_READ_BYTES))
+            try:
+                content = raw.decode(encoding, errors="replace")
+            except LookupError:
+                return _error_json(f"Unknown encoding: {encoding}")
 
             return json.dumps(
                 {
@@ -600,33 +607,9 @@ async def get_storage_overview() -> str:
     def _work():
         session = SessionLocal()
         try:
-            from sqlalchemy import func
-            from app.models.file import File
-            from app.models.folder import Folder
-
-            file_stats = (
-                session.query(
-                    func.count(File.id).label("total_files"),
-                    func.coalesce(func.sum(File.file_size), 0).label("total_size"),
-                )
-                .filter(File.uploader_id == user_id)
-                .first()
-            )
-            status_rows = (
-                session.query(File.status, func.count(File.id))
-                .filter(File.uploader_id == user_id)
-                .group_by(File.status)
-                .all()
-            )
-            status_counts = dict(status_rows)
-
-            folder_count = (
-                               session.query(func.count(Folder.id))
-                               .filter(Folder.user_id == user_id)
-                               .scalar()
-                           ) or 0
-
-            total_size = int(file_stats.total_size) if file_stats else 0
+            # 计数表由触发器维护，主键读取即可，不再扫描用户全部文件
+            stats = storage_stats_service.get_stats(session, user_id)
+            total_size = stats["total_bytes"]
 
             def _human_size(size_bytes: int) -> str:
                 for unit in ("B", "KB", "MB", "GB", "TB"):
@@ -637,16 +620,12 @@ async def get_storage_overview() -> str:
 
             return json.dumps(
                 {
-                    "total_files": file_stats.total_files if file_stats else 0,
-                    "total_folders": folder_count,
+                    "total_files": stats["file_count"],
+                    "total_folders": stats["folder_count"],
                     "total_size_bytes": total_size,
                     "total_size_human": _human_size(total_size),
-                    "status_breakdown": {
-                        "success": status_counts.get("success", 0),
-                        "pending": status_counts.get("pending", 0),
-                        "processing": status_counts.get("processing", 0),
-                        "fail": status_counts.get("fail", 0),
-                    },
+                    "quota_bytes": stats["quota_bytes"],
+                    "status_breakdown": stats["status_breakdown"],
                 },
                 ensure_ascii=False,
                 default=str,
@@ -719,7 +698,7 @@ async def batch_delete(
 
 @mcp.tool()
 async def get_folder_tree(max_depth: int = 3) -> str:
-    """获取用户的文件夹树形结构，用于了解云盘的整体目录布局。
+    """获取用户的文件夹树形结构（含各目录子树大小与文件数），用于了解云盘的整体目录布局。
 
     Args:
         max_depth: 最大递归深度（默认 3，最大 10）
@@ -730,29 +709,34 @@ async def get_folder_tree(max_depth: int = 3) -> str:
         session = SessionLocal()
         try:
             from app.models.folder import Folder
+            from app.models.folder_stats import FolderStats
 
             depth = max(1, min(max_depth, 10))
+            # 子树大小 / 文件数读触发器维护的汇总表，不做递归统计
             all_folders = (
-                session.query(Folder)
+                session.query(Folder, FolderStats)
+                .outerjoin(FolderStats, FolderStats.folder_id == Folder.id)
                 .filter(Folder.user_id == user_id)
                 .all()
             )
 
             children_map: dict[int | None, list] = {}
-            for f in all_folders:
+            for f, stats in all_folders:
                 pid = f.parent_id
                 if pid not in children_map:
                     children_map[pid] = []
-                children_map[pid].append(f)
+                children_map[pid].append((f, stats))
 
             def _build_tree(parent_id: int | None, current_depth: int) -> list[dict]:
                 if current_depth > depth:
                     return []
                 nodes = []
-                for f in children_map.get(parent_id, []):
+                for f, stats in children_map.get(parent_id, []):
                     node: dict[str, Any] = {
                         "id": f.id,
                         "name": f.name,
+                        "total_bytes": stats.total_bytes if stats else 0,
+                        "file_count": stats.total_file_count if stats else 0,
                     }
                     sub = _build_tree(f.id, current_depth + 1)
                     if sub:
@@ -1,8 +1,10 @@
 """ORM 模型导出：用户、文件树、分享、工作区、MCP Token 等持久化实体。"""
 
+from .blob import Blob
 from .file import File
 from .file_change_event import FileChangeEvent
 from .folder import Folder
+from .folder_stats import FolderStats
 from .inbox import Inbox
 from .mcp_token import McpToken
 from .organize_checkpoint import OrganizeCheckpoint
@@ -10,4 +12,5 @@ from .share import Share
 from .sys_dict import SysDict
 from .token_usage_log import TokenUsageLog
 from .user import User
+from .user_storage_stats import UserStorageStats
 from .workspace import Workspace
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import cast
+
+from sqlalchemy import Column, BigInteger, DateTime, Index, Integer, String
+
+from app.extensions import Base
+from app.infra.datetime_utils import beijing_now, local_isoformat
+
+
+class Blob(Base):
+    """内容寻址物理文件：按 SHA-256 去重，ref_count 为引用它的 files 行数。"""
+
+    __tablename__ = "blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    file_size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=beijing_now)
+
+    __table_args__ = (
+        # 待回收（零引用）的行，供后台 reaper 扫描
+        Index("idx_blobs_unreferenced", "content_hash", postgresql_where=ref_count <= 0),
+    )
+
+    def to_dict(self):
+        created_at = cast(datetime | None, self.created_at)
+        return {
+            "content_hash": cast(str, self.content_hash),
+            "file_size": cast(int, self.file_size),
+            "ref_count": cast(int, self.ref_count),
+            "created_at": local_isoformat(created_at),
+        }
@@ -3,7 +3,7 @@ from datetime import datetime
 from typing import cast
 
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, Index, func, text
 from sqlalchemy.orm import relationship
 
 from app.extensions import Base, UPLOAD_FOLDER
@@ -17,7 +17,8 @@ class File(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
-    file_path = Column(String(512), nullable=False)  # 仅存文件名；绝对路径见 get_abs_path
+    # 相对上传根目录：blobs/ab/cd/<content_hash>，旧数据为扁平文件名；绝对路径见 get_abs_path
+    file_path = Column(String(512), nullable=False)
     file_size = Column(BigInteger)  # 字节数，用于容量统计
     mime_type = Column(String(255))  # 如 image/jpeg、application/pdf
     content_hash = Column(String(64))  # 内容 SHA-256，秒传去重
@@ -45,10 +46,20 @@ class File(Base):
         ),
         Index("idx_files_uploader_parent", "uploader_id", "parent_id"),
         Index("idx_files_uploader_status", "uploader_id", "status"),
+        Index("idx_files_file_path", "file_path"),
+        # 存储巡检按字节序归并 key，需与存储列举顺序一致的排序索引
+        Index("idx_files_file_path_c", file_path.collate("C")),
+        # 目录游标分页：(parent_id, 排序键, id)，表达式与 file_service._file_list_sort_key 一致
+        Index("idx_files_parent_name_id", parent_id, name, id),
+        Index(
+            "idx_files_parent_created_id",
+            parent_id, func.coalesce(created_at, text("'1970-01-01 00:00:00'::timestamp")), id,
+        ),
+        Index("idx_files_parent_size_id", parent_id, func.coalesce(file_size, -1), id),
     )
 
     def get_abs_path(self):
-        """拼接上传根目录，得到磁盘绝对路径。"""
+        """拼接上传根目录，得到磁盘绝对路径；仅本地存储驱动有效，业务读写请走 app.infra.storage。"""
         return os.path.join(UPLOAD_FOLDER, cast(str, self.file_path))
 
     def to_dict(self):
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import cast
 
-from sqlalchemy import Column, DateTime, Integer, String, ForeignKey
+from sqlalchemy import Column, DateTime, FetchedValue, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship, backref
 
 from app.extensions import Base
@@ -17,6 +17,11 @@ class Folder(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     parent_id = Column(Integer, ForeignKey("folder.id"))
     created_at = Column(DateTime, default=beijing_now)
+    # 物化路径，由数据库触发器维护（见 folder_service.PATH_TRIGGER_SQL），应用层只读
+    path = Column(Text, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    path_ids = Column(
+        Text(collation="C"), server_default=FetchedValue(), server_onupdate=FetchedValue()
+    )
 
     # 递归子目录，并级联删除
     sub_folder = relationship(
@@ -28,16 +33,14 @@ class Folder(Base):
     # DB 级联删除下属文件元数据；物理文件清理仍在 service 层
     files = relationship("File", backref="folder", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("idx_folder_path_ids", "path_ids"),
+        # 目录游标分页：子文件夹按 (名称, id) 定位
+        Index("idx_folder_parent_name_id", "parent_id", "name", "id"),
+    )
+
     def to_dict(self):
-        path_parts = []
-        current = self
-        while current:
-            if current.parent_id is None:
-                break
-            path_parts.append(current.name)
-            current = current.parent
-
-        path = "/" + "/".join(reversed(path_parts))
+        path = cast(str | None, self.path) or "/"
 
         return {
             "id": self.id,
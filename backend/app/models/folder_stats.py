@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import cast
+
+from sqlalchemy import Column, BigInteger, DateTime, Integer
+
+from app.extensions import Base
+from app.infra.datetime_utils import local_isoformat
+
+
+class FolderStats(Base):
+    """每文件夹汇总：直属与整棵子树的字节数 / 文件数，由 files / folder 上的触发器增量维护。
+
+    没有行等同全零；last_modified_at 为子树内最近一次文件增删 / 移动的时间。
+    """
+
+    __tablename__ = "folder_stats"
+
+    # 不设外键：删除文件夹的触发器要先读出本行计数再删行
+    folder_id = Column(Integer, primary_key=True)
+    direct_bytes = Column(BigInteger, nullable=False, default=0)
+    direct_file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    total_file_count = Column(Integer, nullable=False, default=0)
+    last_modified_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "direct_bytes": cast(int, self.direct_bytes),
+            "direct_file_count": cast(int, self.direct_file_count),
+            "total_bytes": cast(int, self.total_bytes),
+            "total_file_count": cast(int, self.total_file_count),
+            "last_modified_at": local_isoformat(cast(datetime | None, self.last_modified_at)),
+        }
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import cast
+
+from sqlalchemy import Column, BigInteger, DateTime, Integer
+
+from app.extensions import Base
+from app.infra.datetime_utils import beijing_now, local_isoformat
+
+
+class UserStorageStats(Base):
+    """每用户存储计数：由 files / folder 上的触发器增量维护，定时对账兜底。
+
+    quota_bytes 为空时使用全局默认配额（STORAGE_DEFAULT_QUOTA_BYTES）。
+    """
+
+    __tablename__ = "user_storage_stats"
+
+    # 不设外键：触发器在删用户的同一事务里仍可能写入计数行
+    user_id = Column(Integer, primary_key=True)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    file_count = Column(Integer, nullable=False, default=0)
+    folder_count = Column(Integer, nullable=False, default=0)
+    pending_count = Column(Integer, nullable=False, default=0)
+    processing_count = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    fail_count = Column(Integer, nullable=False, default=0)
+    quota_bytes = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, default=beijing_now)
+
+    def to_dict(self):
+        updated_at = cast(datetime | None, self.updated_at)
+        return {
+            "user_id": cast(int, self.user_id),
+            "total_bytes": cast(int, self.total_bytes),
+            "file_count": cast(int, self.file_count),
+            "folder_count": cast(int, self.folder_count),
+            "status_breakdown": {
+                "pending": cast(int, self.pending_count),
+                "processing": cast(int, self.processing_count),
+                "success": cast(int, self.success_count),
+                "fail": cast(int, self.fail_count),
+            },
+            "quota_bytes": cast(int | None, self.quota_bytes),
+            "updated_at": local_isoformat(updated_at),
+        }
@@ -0,0 +1,216 @@
+"""打包下载：文件夹子树或多选文件即时生成 ZIP 流，不落临时文件。
+
+请求阶段先把条目（归档路径 + 存储 key）收集成纯数据，DB session 随请求依赖关闭；
+响应阶段逐条从存储驱动读块、经 zipfile 写入内存缓冲并立即吐出，内存占用与文件
+大小无关。StreamingResponse 在上一块发送完成后才拉取下一块，天然具备背压。
+"""
+
+import os
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, cast
+
+from sqlalchemy.orm import Session
+
+from app.exceptions import BusinessRuleError
+from app.infra.storage import storage
+from app.models.file import File
+from app.models.folder import Folder
+from app.services import file_service, folder_service
+
+MAX_ARCHIVE_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "10000"))
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 已压缩格式直接 STORED，避免 deflate 白耗 CPU
+_STORED_MIME_PREFIXES = ("image/", "video/", "audio/")
+_STORED_MIME_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/x-xz",
+    "application/x-bzip2",
+    "application/pdf",
+}
+_STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".7z", ".rar", ".xz", ".bz2", ".zst",
+    ".docx", ".xlsx", ".pptx", ".jar", ".apk", ".epub",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ArchiveEntry:
+    """一个归档条目；storage_key 为 None 表示空目录。"""
+
+    arcname: str
+    storage_key: str | None = None
+    mime_type: str | None = None
+    modified_at: datetime | None = None
+
+
+def _safe_name(name: str) -> str:
+    """去掉路径分隔符与 ``..``，防止解压时穿越目录。"""
+    cleaned = name.replace("/", "_").replace("\\", "_").strip()
+    if cleaned in ("", ".", ".."):
+        return "_"
+    return cleaned
+
+
+def _unique_name(name: str, used: set[str]) -> str:
+    """同目录重名时追加序号：a.txt → a (1).txt。"""
+    if name not in used:
+        used.add(name)
+        return name
+    base, ext = os.path.splitext(name)
+    index = 1
+    while f"{base} ({index}){ext}" in used:
+        index += 1
+    unique = f"{base} ({index}){ext}"
+    used.add(unique)
+    return unique
+
+
+def _file_entry(arcname: str, file_obj: File) -> ArchiveEntry:
+    return ArchiveEntry(
+        arcname=arcname,
+        storage_key=cast(str, file_obj.file_path),
+        mime_type=cast(str | None, file_obj.mime_type),
+        modified_at=cast(datetime | None, file_obj.created_at),
+    )
+
+
+def collect_folder_entries(
+        session: Session, user_id: int, role: str, folder_id: int
+) -> tuple[str, list[ArchiveEntry]]:
+    """收集文件夹子树，返回 ``(归档文件名, 条目)``；子树按物化路径一次查出后在内存展开。"""
+    root = folder_service.get_authorized_folder(session, user_id, role, folder_id)
+
+    children: dict[int, list[tuple[int, str]]] = {}
+    for folder_id_, parent_id, name in (
+            folder_service.subtree_query(session, root)
+            .with_entities(Folder.id, Folder.parent_id, Folder.name)
+            .all()
+    ):
+        if parent_id is not None:
+            children.setdefault(parent_id, []).append((folder_id_, name))
+
+    # folder_id → 归档内目录前缀（以 / 结尾）
+    prefixes: dict[int, str] = {cast(int, root.id): f"{_safe_name(cast(str, root.name))}/"}
+    used_names: dict[int, set[str]] = {cast(int, root.id): set()}
+    queue = [cast(int, root.id)]
+    while queue:
+        current = queue.pop()
+        for child_id, child_name in sorted(children.get(current, []), key=lambda c: c[1]):
+            if child_id in prefixes:
+                continue  # 脏数据成环
+            name = _unique_name(_safe_name(child_name), used_names[current])
+            prefixes[child_id] = f"{prefixes[current]}{name}/"
+            used_names[child_id] = set()
+            queue.append(child_id)
+
+    files = (
+        session.query(File)
+        .filter(File.parent_id.in_(list(prefixes)))
+        .order_by(File.parent_id, File.name)
+        .limit(MAX_ARCHIVE_FILES + 1)
+        .all()
+    )
+    if len(files) > MAX_ARCHIVE_FILES:
+        raise BusinessRuleError(f"Too many files to archive (limit {MAX_ARCHIVE_FILES})")
+
+    entries: list[ArchiveEntry] = []
+    non_empty: set[int] = set()
+    for file_obj in files:
+        parent_id = cast(int, file_obj.parent_id)
+        non_empty.add(parent_id)
+        name = _unique_name(_safe_name(cast(str, file_obj.name)), used_names[parent_id])
+        entries.append(_file_entry(prefixes[parent_id] + name, file_obj))
+
+    # 空目录也保留结构
+    for folder_id_, prefix in prefixes.items():
+        if folder_id_ not in non_empty and not any(
+                child_id in prefixes for child_id, _ in children.get(folder_id_, [])
+        ):
+            entries.append(ArchiveEntry(arcname=prefix))
+
+    return f"{_safe_name(cast(str, root.name))}.zip", entries
+
+
+def collect_file_entries(
+        session: Session, user_id: int, role: str, file_ids: list[int]
+) -> list[ArchiveEntry]:
+    """多选文件平铺到归档根目录；逐个鉴权，与单文件下载一致。"""
+    unique_ids = list(dict.fromkeys(file_ids))
+    if not unique_ids:
+        raise BusinessRuleError("No files selected")
+    if len(unique_ids) > MAX_ARCHIVE_FILES:
+        raise BusinessRuleError(f"Too many files to archive (limit {MAX_ARCHIVE_FILES})")
+
+    used: set[str] = set()
+    entries = []
+    for file_id in unique_ids:
+        file_obj = file_service.get_authorized_file(session, user_id, role, file_id)
+        name = _unique_name(_safe_name(cast(str, file_obj.name)), used)
+        entries.append(_file_entry(name, file_obj))
+    return entries
+
+
+def _compress_type(entry: ArchiveEntry) -> int:
+    mime_type = entry.mime_type or ""
+    if mime_type.startswith(_STORED_MIME_PREFIXES) or mime_type in _STORED_MIME_TYPES:
+        return zipfile.ZIP_STORED
+    if os.path.splitext(entry.arcname)[1].lower() in _STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：只攒字节，由生成器及时取走；不可 seek，zipfile 自动改用数据描述符。"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self.pending = 0
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.pending += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def stream_zip(entries: list[ArchiveEntry]) -> Iterator[bytes]:
+    """逐条读取存储并产出 ZIP 字节流；单个文件缺失时跳过，不中断整个下载。"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for entry in entries:
+            modified = entry.modified_at or datetime.now()
+            info = zipfile.ZipInfo(entry.arcname, date_time=modified.timetuple()[:6])
+            if entry.storage_key is None:
+                archive.writestr(info, b"")
+                continue
+            if not storage.exists(entry.storage_key):
+                continue
+
+            info.compress_type = _compress_type(entry)
+            info.external_attr = 0o644 << 16
+            with archive.open(info, mode="w", force_zip64=True) as target:
+                for chunk in storage.open_range(entry.storage_key):
+                    target.write(chunk)
+                    if sink.pending >= STREAM_CHUNK_SIZE:
+                        yield sink.drain()
+            yield sink.drain()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
@@ -0,0 +1,244 @@
+"""内容寻址存储：同一内容只落盘一份，files.file_path 指向 ``blobs/ab/cd/<sha256>``。
+
+引用计数在 blobs 表维护，秒传 / 删除只改计数，不再按 file_path 全表查引用。
+所有函数只在调用方事务内加行锁、改计数，由调用方统一 commit。
+
+删除（``release`` / ``release_many``）从不在事务内删物理文件：归零的行保留为待回收
+（ref_count=0），由后台 ``reap`` 在另一事务中持行锁删除，调用方回滚时文件仍在；
+回收前被秒传 / 重新上传的内容直接复活，无需重传。
+
+旧数据（扁平 uuid 文件名）不迁移，``is_blob_file`` 为 False 时按原逻辑处理。
+"""
+
+import logging
+import os
+import uuid
+from typing import cast
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.extensions import UPLOAD_FOLDER, redis_client
+from app.infra.storage import storage
+from app.models.blob import Blob
+from app.models.file import File
+from app.services import derivative_cache
+
+logger = logging.getLogger(__name__)
+
+BLOB_ROOT = "blobs"
+INCOMING_ROOT = os.path.join(UPLOAD_FOLDER, ".incoming")
+# 批量删除后待删的旧数据路径（Redis SET）
+LEGACY_REAP_KEY = "blob:reap:legacy"
+REAP_BATCH_SIZE = 200
+
+
+def blob_path(content_hash: str) -> str:
+    """存储 key（相对存储根）；两级 256 路目录，单目录文件数可控。"""
+    return "/".join((BLOB_ROOT, content_hash[:2], content_hash[2:4], content_hash))
+
+
+def is_blob_file(file_obj: File) -> bool:
+    content_hash = cast(str | None, file_obj.content_hash)
+    return bool(content_hash) and file_obj.file_path == blob_path(content_hash)
+
+
+def incoming_path() -> str:
+    """上传临时文件路径（本地）；本地驱动与 blob 同盘，登记时 rename 即可到位。"""
+    os.makedirs(INCOMING_ROOT, exist_ok=True)
+    return os.path.join(INCOMING_ROOT, uuid.uuid4().hex)
+
+
+def put(session: Session, content_hash: str, file_size: int, source_path: str) -> tuple[str, bool]:
+    """登记已落盘的临时文件并 +1 引用，返回 ``(file_path, 是否新放置了物理文件)``。
+
+    内容已存在时直接丢弃 source_path；新放置的文件在调用方回滚时应交给 ``unplace``。
+    """
+    return put_many(session, [(content_hash, file_size, source_path)])[0]
+
+
+def put_many(
+        session: Session, uploads: list[tuple[str, int, str]]
+) -> list[tuple[str, bool]]:
+    """批量 ``put``：``uploads`` 为 ``(content_hash, file_size, source_path)``，结果与之一一对应。
+
+    一条多行 INSERT ... ON CONFLICT 完成全部计数；批内重复内容先合并（同一语句不能两次
+    更新同一行），并按哈希排序，使并发批次以相同顺序加锁、不互相死锁。
+    """
+    counts: dict[str, tuple[int, int]] = {}
+    for content_hash, file_size, _ in uploads:
+        size, count = counts.get(content_hash, (file_size, 0))
+        counts[content_hash] = (size, count + 1)
+    if not counts:
+        return []
+
+    stmt = insert(Blob).values([
+        {"content_hash": content_hash, "file_size": size, "ref_count": count}
+        for content_hash, (size, count) in sorted(counts.items())
+    ])
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Blob.content_hash],
+            set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count},
+        )
+    )
+
+    results = []
+    seen: set[str] = set()
+    try:
+        for content_hash, _, source_path in uploads:
+            file_path = blob_path(content_hash)
+            if content_hash in seen or storage.exists(file_path):
+                os.remove(source_path)
+                results.append((file_path, False))
+            else:
+                # 计数在但文件缺失（手工清理 / 磁盘故障）时顺带自愈
+                storage.put_file(file_path, source_path)
+                results.append((file_path, True))
+            seen.add(content_hash)
+    except Exception:
+        # 中途失败时调用方拿不到结果，已放置的文件在这里撤销，免得留成孤儿
+        for file_path, placed in results:
+            unplace(file_path, placed)
+        raise
+    return results
+
+
+def unplace(file_path: str, placed: bool) -> None:
+    """``put`` 所在事务回滚后撤销新放置的物理文件。"""
+    if not placed:
+        return
+    try:
+        storage.delete(file_path)
+    except Exception as e:
+        logger.error(f"Error removing unplaced blob {file_path}: {e}")
+
+
+def acquire(session: Session, content_hash: str, file_size: int) -> str | None:
+    """秒传：锁定已有 blob 并 +1 引用；不存在或文件已丢失返回 None。"""
+    blob = (
+        session.query(Blob)
+        .filter_by(content_hash=content_hash)
+        .with_for_update()
+        .first()
+    )
+    if not blob or cast(int, blob.file_size) != file_size:
+        return None
+    file_path = blob_path(content_hash)
+    if not storage.exists(file_path):
+        return None
+    blob.ref_count = Blob.ref_count + 1
+    return file_path
+
+
+def acquire_many(session: Session, wanted: dict[str, tuple[int, int]]) -> set[str]:
+    """批量秒传：``wanted`` 为 ``{content_hash: (file_size, 引用数)}``，返回成功加引用的哈希。
+
+    按哈希顺序一次锁定全部行，再按主键批量回写计数。
+    """
+    if not wanted:
+        return set()
+    blobs = (
+        session.query(Blob)
+        .filter(Blob.content_hash.in_(list(wanted)))
+        .order_by(Blob.content_hash)
+        .with_for_update()
+        .all()
+    )
+    updates = []
+    for blob in blobs:
+        content_hash = cast(str, blob.content_hash)
+        file_size, count = wanted[content_hash]
+        if cast(int, blob.file_size) != file_size or not storage.exists(blob_path(content_hash)):
+            continue
+        updates.append({"content_hash": content_hash, "ref_count": cast(int, blob.ref_count) + count})
+    if updates:
+        session.execute(update(Blob), updates)
+    return {row["content_hash"] for row in updates}
+
+
+def release(session: Session, content_hash: str) -> None:
+    """-1 引用；归零的行留给 ``reap`` 回收。"""
+    release_many(session, {content_hash: 1})
+
+
+def release_many(session: Session, counts: dict[str, int]) -> None:
+    """批量 -n 引用：``counts`` 为 ``{content_hash: 释放的引用数}``。
+
+    按哈希顺序锁行后按主键回写；归零的行不删，留给 ``reap`` 回收物理文件。
+    """
+    if not counts:
+        return
+    blobs = (
+        session.query(Blob)
+        .filter(Blob.content_hash.in_(list(counts)))
+        .order_by(Blob.content_hash)
+        .with_for_update()
+        .all()
+    )
+    updates = [
+        {
+            "content_hash": cast(str, blob.content_hash),
+            "ref_count": max(0, cast(int, blob.ref_count) - counts[cast(str, blob.content_hash)]),
+        }
+        for blob in blobs
+    ]
+    if updates:
+        session.execute(update(Blob), updates)
+
+
+def unreferenced_legacy_paths(session: Session, paths: set[str]) -> set[str]:
+    """旧数据路径中已无任何 files 行引用的那些（调用方须已删除自己的行）。"""
+    if not paths:
+        return set()
+    still_used = set(
+        session.scalars(select(File.file_path).where(File.file_path.in_(list(paths))).distinct())
+    )
+    return paths - still_used
+
+
+def schedule_legacy_reap(paths: set[str]) -> None:
+    """提交后登记待删的旧数据路径；登记前进程退出留下的文件由存储巡检兜底。"""
+    if paths:
+        redis_client.sadd(LEGACY_REAP_KEY, *paths)
+
+
+def reap(session: Session, limit: int = REAP_BATCH_SIZE) -> int:
+    """后台回收一批：删除零引用 blob 的物理文件、衍生物与行，以及已登记的旧数据路径。
+
+    blob 行锁持有到提交，并发的同内容上传会等待，随后按「文件不存在」重新放置。
+    物理文件或衍生物删除失败的行保留，下一轮重试。返回删除的对象数。
+    """
+    hashes = session.scalars(
+        select(Blob.content_hash)
+        .where(Blob.ref_count <= 0)
+        .order_by(Blob.content_hash)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    reaped: list[str] = []
+    for content_hash in hashes:
+        try:
+            storage.delete(blob_path(content_hash))
+        except Exception as e:
+            logger.error(f"Error reaping blob {content_hash}: {e}")
+            continue
+        # 衍生物不在巡检范围内，删除失败时保留行，下一轮连同（已不存在的）blob 一起重试
+        if not derivative_cache.delete_derivatives(content_hash):
+            continue
+        reaped.append(content_hash)
+    if reaped:
+        session.execute(delete(Blob).where(Blob.content_hash.in_(reaped)))
+
+    legacy_paths = set(redis_client.spop(LEGACY_REAP_KEY, limit) or [])
+    legacy_reaped = 0
+    for file_path in unreferenced_legacy_paths(session, legacy_paths):
+        try:
+            storage.delete(file_path)
+            legacy_reaped += 1
+        except Exception as e:
+            logger.error(f"Error reaping file {file_path}: {e}")
+            redis_client.sadd(LEGACY_REAP_KEY, file_path)
+    session.commit()
+    return len(reaped) + legacy_reaped
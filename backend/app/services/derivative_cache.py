@@ -0,0 +1,50 @@
+"""预览衍生物缓存：缩略图 / 首页渲染按 content_hash 存放，同内容的文件共用一份。
+
+key 形如 ``derivatives/thumb/ab/cd/<sha256>.webp``，与 blob 同一存储驱动。
+内容不可变，衍生物生成一次即可长期缓存；blob 被回收（``blob_store.reap``）时随之删除，
+删除失败时 blob 行保留、下轮回收重试。存储巡检不扫 derivatives/，残留只能靠这两处避免。
+渲染（cv2 / PyMuPDF）在 Worker 侧完成，这里只负责存取。
+"""
+
+import io
+import logging
+
+from app.infra.storage import storage
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_ROOT = "derivatives"
+THUMBNAIL_KIND = "thumb"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+
+
+def thumbnail_key(content_hash: str) -> str:
+    return "/".join(
+        (DERIVATIVE_ROOT, THUMBNAIL_KIND, content_hash[:2], content_hash[2:4], f"{content_hash}.webp")
+    )
+
+
+def has_thumbnail(content_hash: str) -> bool:
+    return storage.exists(thumbnail_key(content_hash))
+
+
+def save_thumbnail(content_hash: str, data: bytes, source_key: str | None = None) -> None:
+    """写入缩略图；给出 source_key 时写完复查源对象仍在。
+
+    渲染期间 blob 可能已被回收，回收时删衍生物在先、这里写入在后的缩略图会成为孤儿；
+    写后发现源对象已不在就删掉刚写的。
+    """
+    key = thumbnail_key(content_hash)
+    storage.write(key, io.BytesIO(data))
+    if source_key and not storage.exists(source_key):
+        storage.delete(key)
+
+
+def delete_derivatives(content_hash: str) -> bool:
+    """blob 回收时调用；失败记日志并返回 False，由调用方保留记录下次重试。"""
+    try:
+        storage.delete(thumbnail_key(content_hash))
+    except Exception as e:
+        logger.error(f"Error deleting derivatives for {content_hash}: {e}")
+        return False
+    return True
@@ -149,13 +149,25 @@ def _maybe_contains(user_id: int | None, file_id: int) -> bool:
 
 def add_file(file_id: int, user_id: int | None) -> None:
     """增量写入；同时更新用户 scope 与全局 scope（若 user_id 非空）。"""
+    add_files([file_id], user_id)
+
+
+def add_files(file_ids: list[int], user_id: int | None) -> None:
+    """批量增量写入：先一次取齐各 scope 的 meta，再把全部位置放进同一个 pipeline。"""
+    if not file_ids:
+        return
     scopes = [None]
     if user_id is not None:
         scopes.append(user_id)
 
-    for scope_user_id in scopes:
-        try:
-            meta = redis_client.hgetall(_meta_key(scope_user_id))
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for scope_user_id in scopes:
+            pipe.hgetall(_meta_key(scope_user_id))
+        metas = pipe.execute()
+
+        pipe = redis_client.pipeline()
+        for scope_user_id, meta in zip(scopes, metas):
             if meta.get("ready") != "1":
                 continue
 
@@ -164,17 +176,17 @@ def add_file(file_id: int, user_id: int | None) -> None:
             if bitmap_size <= 0 or hash_count <= 0:
                 continue
 
-            pipe = redis_client.pipeline()
-            for position in _hash_positions(file_id, bitmap_size, hash_count):
-                pipe.setbit(_bits_key(scope_user_id), position, 1)
-            pipe.execute()
-        except Exception as exc:
-            logger.warning(
-                "Failed to add file %s into bloom scope %s: %s",
-                file_id,
-                _scope_name(scope_user_id),
-                exc,
-            )
+            for file_id in file_ids:
+                for position in _hash_positions(file_id, bitmap_size, hash_count):
+                    pipe.setbit(_bits_key(scope_user_id), position, 1)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning(
+            "Failed to add %d files into bloom scope %s: %s",
+            len(file_ids),
+            _scope_name(user_id),
+            exc,
+        )
 
 
 def maybe_user_can_access_file(user_id: int, file_id: int) -> bool:
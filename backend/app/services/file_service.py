@@ -4,6 +4,8 @@
 """
 
 import asyncio
+import base64
+import errno
 import hashlib
 import json
 import logging
@@ -12,11 +14,13 @@ import mimetypes
 import os
 import re
 import shutil
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
 from typing import Any, cast
 
-from sqlalchemy import func
-from werkzeug.utils import secure_filename
+from sqlalchemy import func, insert, literal, or_, text, tuple_, update
 
 from app.exceptions import (
     BusinessRuleError,
@@ -30,28 +34,51 @@ from app.exceptions import (
 from sqlalchemy.orm import Session
 
 from app.extensions import UPLOAD_FOLDER, redis_client
-from app.infra.cache import cacheable, evict_cache_pattern
+from app.infra.cache import bump_generations, cacheable, read_generations
+from app.infra.storage import storage
 from app.infra.task_queue import publish_file_tasks
+from app.infra.upload_adapter import OffsetWriter, SavedUpload, update_digest_from_file
 from app.models.file import File
 from app.models.folder import Folder
+from app.models.folder_stats import FolderStats
+from app.services import blob_store
 from app.services import change_log_service
 from app.services import file_access_bloom
+from app.services import folder_stats_service
+from app.services import fulltext_service
+from app.services import listing_cache
+from app.services import multipart_digest
+from app.services import multipart_session
+from app.services import storage_stats_service
 from app.services.model_config import get_embedding_model_config
 
 logger = logging.getLogger(__name__)
 
 CACHE_EXPIRATION = 3600
 SEARCH_CACHE_PREFIX = "search:fuzzy"
+# 每用户搜索代数：键为 search:fuzzy:{user_id}:{代数}:...，文件变更只需 +1，旧结果由 TTL 过期
+SEARCH_GEN_PREFIX = "search:gen"
+SEARCH_GEN_EXPIRE = 7 * 24 * 3600
+# 短于 3 个字符的查询抽不出完整 trigram，相似度没有意义，只做子串匹配
+FUZZY_SIMILARITY_MIN_LENGTH = 3
 
 COPY_BUFFER_SIZE = 1024 * 1024
+KERNEL_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
 
 DEFAULT_CHUNK_SIZE = 2 * 1024 * 1024
 MAX_CHUNK_SIZE = 64 * 1024 * 1024
 MAX_UPLOAD_SIZE = 0
 MAX_TOTAL_CHUNKS = 10000
+MAX_AVATAR_SIZE = 10 * 1024 * 1024
 UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,128}$")
 MULTIPART_ROOT = os.path.join(UPLOAD_FOLDER, ".multipart")
 
+# chunked：每个分片独立落盘，完成时合并；offset：预分配目标文件，分片按偏移直接写入
+MULTIPART_MODE_CHUNKED = "chunked"
+MULTIPART_MODE_OFFSET = "offset"
+MULTIPART_MODES = (MULTIPART_MODE_CHUNKED, MULTIPART_MODE_OFFSET)
+OFFSET_MODE_SUPPORTED = hasattr(os, "pwrite") and hasattr(os, "posix_fallocate")
+
 
 def _env_int(name: str, default: int) -> int:
     try:
@@ -64,20 +91,23 @@ DEFAULT_CHUNK_SIZE = _env_int("UPLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
 MAX_CHUNK_SIZE = _env_int("UPLOAD_MAX_CHUNK_SIZE", MAX_CHUNK_SIZE)
 MAX_UPLOAD_SIZE = _env_int("UPLOAD_MAX_FILE_SIZE", MAX_UPLOAD_SIZE)
 MAX_TOTAL_CHUNKS = _env_int("UPLOAD_MAX_TOTAL_CHUNKS", MAX_TOTAL_CHUNKS)
+MAX_AVATAR_SIZE = _env_int("UPLOAD_MAX_AVATAR_SIZE", MAX_AVATAR_SIZE)
+# 批量上传并行落盘 / 算哈希的线程数
+UPLOAD_HASH_WORKERS = max(1, _env_int("UPLOAD_HASH_WORKERS", min(8, os.cpu_count() or 1)))
+# 混合检索时全文 / 向量两路各取的候选数（不少于请求页末尾的名次）
+SEARCH_HYBRID_FETCH_K = max(1, _env_int("SEARCH_HYBRID_FETCH_K", 50))
 
 
-def _generate_unique_filename(original_filename: str) -> str:
-    base_name, extension = os.path.splitext(original_filename)
-    safe_base_name = secure_filename(base_name)
-    if safe_base_name:
-        return f"{uuid.uuid4().hex}_{safe_base_name}{extension}"
-    return f"{uuid.uuid4().hex}{extension}"
+GENERIC_MIME_TYPES = {"application/octet-stream", "binary/octet-stream"}
 
 
-def _resolve_mime_type(path: str, provided: str | None = None) -> str | None:
-    if provided:
+def _resolve_mime_type(
+        filename: str, provided: str | None = None, sniffed: str | None = None
+) -> str | None:
+    """客户端声明优先；声明缺失或为泛型 octet-stream 时依次用魔数嗅探、扩展名猜测。"""
+    if provided and provided not in GENERIC_MIME_TYPES:
         return provided
-    return mimetypes.guess_type(path)[0]
+    return sniffed or mimetypes.guess_type(filename)[0] or provided
 
 
 def _escape_like(value: str) -> str:
@@ -94,15 +124,91 @@ def _normalize_content_hash(content_hash: str | None) -> str | None:
     return normalized
 
 
+def _save_upload(file_obj: Any, destination: str, digest: Any = None) -> SavedUpload:
+    """落盘上传对象；适配器写入时已算出摘要，仅兼容旧式 save() 才回读一次。
+
+    ``digest`` 非空时在其上续算（分片按序拼接整文件摘要）。
+    """
+    if digest is None:
+        saved = file_obj.save(destination)
+    else:
+        saved = file_obj.save(destination, digest=digest)
+    if isinstance(saved, SavedUpload):
+        return saved
+    if digest is not None:
+        update_digest_from_file(digest, destination)
+    return SavedUpload(
+        size=os.path.getsize(destination),
+        content_hash=_calculate_file_hash(destination),
+        mime_type=None,
+    )
+
+
 def _calculate_file_hash(path: str) -> str:
     digest = hashlib.sha256()
-    with open(path, "rb") as file_obj:
+    update_digest_from_file(digest, path)
+    return digest.hexdigest()
+
+
+def _copy_file_kernel(source: Any, target: Any) -> None:
+    """整段拷贝 source 到 target 当前位置：优先 copy_file_range / sendfile 在内核完成。
+
+    target 须以无缓冲模式打开，才能与用户态 write 混用同一文件偏移。
+    """
+    in_fd = source.fileno()
+    out_fd = target.fileno()
+    remaining = os.fstat(in_fd).st_size
+    offset = 0
+    use_copy_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile")
+
+    while remaining > 0 and (use_copy_range or use_sendfile):
+        try:
+            if use_copy_range:
+                copied = os.copy_file_range(in_fd, out_fd, remaining, offset_src=offset)
+            else:
+                copied = os.sendfile(out_fd, in_fd, offset, remaining)
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_FALLBACK_ERRNOS:
+                raise
+            # 跨文件系统 / 老内核 / 不支持的 FS：逐级降级
+            if use_copy_range:
+                use_copy_range = False
+            else:
+                use_sendfile = False
+            continue
+        if copied == 0:
+            break
+        offset += copied
+        remaining -= copied
+
+    if remaining > 0:
+        source.seek(offset)
         while True:
-            chunk = file_obj.read(COPY_BUFFER_SIZE)
+            chunk = source.read(COPY_BUFFER_SIZE)
             if not chunk:
                 break
-            digest.update(chunk)
-    return digest.hexdigest()
+            _write_all(target, chunk)
+
+
+def _write_all(target: Any, data: bytes) -> None:
+    """写满整块：target 为无缓冲的 FileIO 时单次 write 可能只写入一部分。"""
+    view = memoryview(data)
+    while view:
+        written = target.write(view)
+        if not written:
+            raise OSError(errno.EIO, "Short write while assembling upload")
+        view = view[written:]
+
+
+def _copy_and_hash(source: Any, target: Any, digest: Any) -> None:
+    """用户态拷贝并续算摘要：用于进程内没有增量摘要的分片。"""
+    while True:
+        chunk = source.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        _write_all(target, chunk)
 
 
 def _get_reusable_source_file(session: Session, content_hash: str, file_size: int) -> File | None:
@@ -113,7 +219,7 @@ def _get_reusable_source_file(session: Session, content_hash: str, file_size: in
     )
     if not source_file:
         return None
-    if not os.path.exists(source_file.get_abs_path()):
+    if not storage.exists(cast(str, source_file.file_path)):
         return None
     return source_file
 
@@ -187,11 +293,19 @@ def _clone_existing_file(
     )
     vector_info = source_file.vector_info if status == "success" else None
 
+    file_size = cast(int | None, source_file.file_size) or 0
     try:
-        new_file = _persist_file_record(session, 
+        if blob_store.is_blob_file(source_file):
+            file_path = blob_store.acquire(session, content_hash, file_size)
+            if file_path is None:
+                raise ResourceNotFoundError("Source blob no longer available")
+        else:
+            # 旧数据未入 blob 表，仍按共享 file_path 处理
+            file_path = cast(str, source_file.file_path)
+        new_file = _persist_file_record(session,
             name=filename,
-            file_path=cast(str, source_file.file_path),
-            file_size=cast(int | None, source_file.file_size) or 0,
+            file_path=file_path,
+            file_size=file_size,
             mime_type=resolved_mime,
             uploader_id=uploader_id,
             parent_id=parent_id,
@@ -206,6 +320,7 @@ def _clone_existing_file(
         raise ServiceOperationError("Failed to save file metadata")
 
     _log_file_created(new_file)
+    listing_cache.bump_folder_chains(session, [parent_id], uploader_id)
     if status != "success":
         _push_processing_queue([cast(int, new_file.id)], uploader_id)
     else:
@@ -230,6 +345,7 @@ def preflight_file_upload(session: Session, uploader_id: int, data: dict[str, An
     source_file = _get_reusable_source_file(session, content_hash, total_size)
     if not source_file:
         return {"instant_upload": False, "exists": False}
+    storage_stats_service.ensure_quota(session, uploader_id, total_size)
 
     new_file = _clone_existing_file(session, 
         source_file,
@@ -242,6 +358,105 @@ def preflight_file_upload(session: Session, uploader_id: int, data: dict[str, An
     return {"instant_upload": True, "exists": True, "file": new_file.to_dict()}
 
 
+def batch_preflight_file_uploads(
+        session: Session, uploader_id: int, items: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """批量预检：一次 ``(content_hash, file_size) IN`` 查询解析全部哈希，命中项在同一事务内
+    批量克隆；结果与 items 一一对应，单项格式同 ``preflight_file_upload``。"""
+    results: list[dict[str, Any]] = [{"instant_upload": False, "exists": False} for _ in items]
+    keys: list[tuple[str, int] | None] = []
+    for index, item in enumerate(items):
+        try:
+            content_hash = _normalize_content_hash(item.get("content_hash"))
+        except BusinessRuleError as e:
+            content_hash = None
+            results[index]["error"] = str(e)
+        total_size = int(item.get("total_size") or 0)
+        keys.append((content_hash, total_size) if content_hash and total_size > 0 else None)
+
+    wanted_keys = {key for key in keys if key}
+    if not wanted_keys:
+        return results
+
+    # 走 idx_files_content_hash_size；同键取最早的记录，与单条预检一致
+    sources: dict[tuple[str, int], File] = {}
+    for source_file in (
+            session.query(File)
+            .filter(tuple_(File.content_hash, File.file_size).in_(list(wanted_keys)))
+            .order_by(File.id.asc())
+            .all()
+    ):
+        key = (cast(str, source_file.content_hash), cast(int, source_file.file_size))
+        sources.setdefault(key, source_file)
+
+    blob_wanted: dict[str, tuple[int, int]] = {}
+    for key in keys:
+        source_file = sources.get(key) if key else None
+        if source_file is not None and blob_store.is_blob_file(source_file):
+            size, count = blob_wanted.get(key[0], (key[1], 0))
+            blob_wanted[key[0]] = (size, count + 1)
+
+    rows, row_indexes = [], []
+    try:
+        acquired = blob_store.acquire_many(session, blob_wanted)
+        legacy_available: dict[tuple[str, int], bool] = {}
+        for index, (item, key) in enumerate(zip(items, keys)):
+            source_file = sources.get(key) if key else None
+            if source_file is None:
+                continue
+            if blob_store.is_blob_file(source_file):
+                if key[0] not in acquired:
+                    continue
+            else:
+                if key not in legacy_available:
+                    legacy_available[key] = storage.exists(cast(str, source_file.file_path))
+                if not legacy_available[key]:
+                    continue
+
+            status = cast(str | None, source_file.status) or "pending"
+            succeeded = status == "success"
+            rows.append({
+                "name": item["filename"],
+                "file_path": cast(str, source_file.file_path),
+                "file_size": key[1],
+                "mime_type": item.get("mime_type") or cast(str | None, source_file.mime_type),
+                "uploader_id": uploader_id,
+                "parent_id": item.get("parent_id"),
+                "content_hash": key[0],
+                "status": status,
+                "description": cast(str | None, source_file.description) if succeeded else None,
+                "vector_info": source_file.vector_info if succeeded else None,
+            })
+            row_indexes.append(index)
+
+        if not rows:
+            session.rollback()
+            return results
+        storage_stats_service.ensure_quota(
+            session, uploader_id, sum(row["file_size"] for row in rows)
+        )
+        file_ids = _insert_file_rows(session, rows)
+        session.commit()
+    except DomainError:
+        session.rollback()
+        raise
+    except Exception as e:
+        session.rollback()
+        logger.exception(f"Failed to create instant upload records: {e}")
+        raise ServiceOperationError("Failed to save file metadata")
+
+    new_files = _load_created_files(session, file_ids, uploader_id)
+    for index, new_file in zip(row_indexes, new_files):
+        results[index] = {"instant_upload": True, "exists": True, "file": new_file.to_dict()}
+
+    pending_ids = [cast(int, f.id) for f in new_files if f.status != "success"]
+    if pending_ids:
+        _push_processing_queue(pending_ids, uploader_id)
+    else:
+        _clear_search_cache(uploader_id)
+    return results
+
+
 def _push_processing_queue(file_ids: list[int], uploader_id: int | None) -> None:
     if not file_ids:
         return
@@ -261,8 +476,13 @@ def _multipart_chunks_dir(upload_dir: str) -> str:
     return os.path.join(upload_dir, "chunks")
 
 
-def _multipart_meta_path(upload_dir: str) -> str:
-    return os.path.join(upload_dir, "meta.json")
+def _multipart_data_path(upload_dir: str) -> str:
+    """offset 模式的预分配目标文件；与 UPLOAD_FOLDER 同盘，完成时可直接 rename。"""
+    return os.path.join(upload_dir, "data.bin")
+
+
+def _multipart_part_path(chunks_dir: str, chunk_index: int) -> str:
+    return os.path.join(chunks_dir, f"{chunk_index}.part")
 
 
 def _safe_upload_id(upload_id: str) -> str:
@@ -272,74 +492,61 @@ def _safe_upload_id(upload_id: str) -> str:
     return candidate
 
 
-def _list_uploaded_chunks(chunks_dir: str) -> list[int]:
-    uploaded = []
-    if not os.path.isdir(chunks_dir):
-        return uploaded
-    for name in os.listdir(chunks_dir):
-        if not name.endswith(".part"):
-            continue
-        idx = name[:-5]
-        if idx.isdigit():
-            uploaded.append(int(idx))
-    uploaded.sort()
-    return uploaded
-
-
 def _load_multipart_meta(uploader_id: int, upload_id: str) -> dict[str, Any]:
     safe_upload_id = _safe_upload_id(upload_id)
-    upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
-    meta_path = _multipart_meta_path(upload_dir)
-    if not os.path.exists(meta_path):
+    meta = multipart_session.load(uploader_id, safe_upload_id)
+    if meta is None:
         raise ResourceNotFoundError("Upload session not found")
-    try:
-        with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-    except Exception as e:
-        logger.exception(f"Failed to read upload metadata: {e}")
-        raise ServiceOperationError("Upload session corrupted")
-
     if int(meta.get("uploader_id", -1)) != uploader_id:
         raise PermissionDeniedError("Permission denied")
     return meta
 
 
-def _write_multipart_meta(meta_path: str, meta: dict[str, Any]) -> None:
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False)
-
-
 def create_file(session: Session, file_obj: Any, data: dict[str, Any]) -> File:
-    upload_folder = UPLOAD_FOLDER
-    os.makedirs(upload_folder, exist_ok=True)
-
     original_filename = file_obj.filename or "unknown"
-    unique_filename = _generate_unique_filename(original_filename)
-    full_path = os.path.join(upload_folder, unique_filename)
+    temp_path = blob_store.incoming_path()
 
-    file_obj.save(full_path)
-    file_size = os.path.getsize(full_path)
-    mime_type = _resolve_mime_type(full_path, getattr(file_obj, "mimetype", None))
+    try:
+        saved = _save_upload(file_obj, temp_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    try:
+        storage_stats_service.ensure_quota(session, data.get("uploader_id"), saved.size)
+    except DomainError:
+        os.remove(temp_path)
+        raise
+    mime_type = _resolve_mime_type(
+        original_filename, getattr(file_obj, "mimetype", None), saved.mime_type
+    )
 
+    file_path, placed = None, False
     try:
-        content_hash = _calculate_file_hash(full_path)
-        new_file = _persist_file_record(session, 
+        file_path, placed = blob_store.put(session, saved.content_hash, saved.size, temp_path)
+        new_file = _persist_file_record(session,
             name=original_filename,
-            file_path=unique_filename,
-            file_size=file_size,
+            file_path=file_path,
+            file_size=saved.size,
             mime_type=mime_type,
             uploader_id=data.get("uploader_id"),
             parent_id=data.get("parent_id"),
-            content_hash=content_hash,
+            content_hash=saved.content_hash,
         )
     except Exception as e:
+        # 先撤销物理文件再回滚，避免释放行锁后与并发的同内容上传交错
+        if file_path:
+            blob_store.unplace(file_path, placed)
         session.rollback()
-        if os.path.exists(full_path):
-            os.remove(full_path)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         logger.exception(f"Failed to save uploaded file metadata: {e}")
         raise ServiceOperationError("Failed to save file metadata")
 
     _log_file_created(new_file)
+    listing_cache.bump_folder_chains(
+        session, [data.get("parent_id")], cast(int | None, new_file.uploader_id)
+    )
     _push_processing_queue(
         [cast(int, new_file.id)], cast(int | None, new_file.uploader_id)
     )
@@ -357,49 +564,33 @@ def create_uploaded_file(session: Session, uploader_id: int, upload: Any, parent
     return create_file(session, upload, {"uploader_id": uploader_id, "parent_id": parent_id})
 
 
-def batch_create_files(
-        session: Session,
-        file_objs: list[Any], data: dict[str, Any]
-) -> list[File]:
-    upload_folder = UPLOAD_FOLDER
-    os.makedirs(upload_folder, exist_ok=True)
-
-    new_files = []
-    uploader_id = data.get("uploader_id")
+def _save_upload_to_incoming(file_obj: Any) -> tuple[str, SavedUpload]:
+    temp_path = blob_store.incoming_path()
+    try:
+        return temp_path, _save_upload(file_obj, temp_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-    for file_obj in file_objs:
-        if not file_obj or not file_obj.filename:
-            continue
 
-        original_filename = file_obj.filename
-        unique_filename = _generate_unique_filename(original_filename)
-        full_path = os.path.join(upload_folder, unique_filename)
+def _insert_file_rows(session: Session, rows: list[dict[str, Any]]) -> list[int]:
+    """一条批量 INSERT ... RETURNING 写入多行 files，返回与 rows 同序的 id（不提交）。"""
+    return list(session.scalars(
+        insert(File).returning(File.id, sort_by_parameter_order=True), rows
+    ))
 
-        file_obj.save(full_path)
-        file_size = os.path.getsize(full_path)
-        mime_type = _resolve_mime_type(full_path, getattr(file_obj, "mimetype", None))
-        content_hash = _calculate_file_hash(full_path)
 
-        new_file = File(
-            name=original_filename,
-            file_path=unique_filename,
-            file_size=file_size,
-            mime_type=mime_type,
-            content_hash=content_hash,
-            uploader_id=uploader_id,
-            parent_id=data.get("parent_id"),
-        )
-        new_files.append(new_file)
-
-    if not new_files:
-        return []
-
-    session.add_all(new_files)
-    session.commit()
-    for file_obj in new_files:
-        file_access_bloom.add_file(
-            cast(int, file_obj.id), cast(int | None, file_obj.uploader_id)
-        )
+def _load_created_files(session: Session, file_ids: list[int], uploader_id: int | None) -> list[File]:
+    """批量建档提交后的收尾：一次 IN 查询取回记录，Bloom、变更日志与列表缓存失效整批完成。"""
+    files_by_id = {
+        cast(int, f.id): f for f in session.query(File).filter(File.id.in_(file_ids)).all()
+    }
+    new_files = [files_by_id[file_id] for file_id in file_ids]
+    file_access_bloom.add_files(file_ids, uploader_id)
+    listing_cache.bump_folder_chains(
+        session, {cast(int | None, f.parent_id) for f in new_files}, uploader_id
+    )
 
     if uploader_id:
         change_log_service.log_events_batch(
@@ -417,8 +608,98 @@ def batch_create_files(
                 for file_obj in new_files
             ],
         )
+    return new_files
+
+
+def _discard_incoming(saved_uploads: list[tuple[str, SavedUpload]]) -> None:
+    for temp_path, _ in saved_uploads:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _save_uploads_parallel(file_objs: list[Any]) -> list[tuple[str, SavedUpload]]:
+    """有界线程池并行落盘 + 算哈希（hashlib / 文件 IO 释放 GIL）；任一失败则清理全部临时文件。"""
+    results: list[tuple[str, SavedUpload]] = []
+    if len(file_objs) <= 1 or UPLOAD_HASH_WORKERS <= 1:
+        try:
+            for file_obj in file_objs:
+                results.append(_save_upload_to_incoming(file_obj))
+        except Exception:
+            _discard_incoming(results)
+            raise
+        return results
+
+    with ThreadPoolExecutor(
+            max_workers=min(UPLOAD_HASH_WORKERS, len(file_objs)),
+            thread_name_prefix="upload-hash",
+    ) as executor:
+        futures = [executor.submit(_save_upload_to_incoming, f) for f in file_objs]
+        wait(futures)
+
+    error = None
+    for future in futures:
+        if future.exception() is not None:
+            error = error or future.exception()
+        else:
+            results.append(future.result())
+    if error is not None:
+        _discard_incoming(results)
+        raise error
+    return results
+
+
+def batch_create_files(
+        session: Session,
+        file_objs: list[Any], data: dict[str, Any]
+) -> list[File]:
+    """批量上传：并行落盘算哈希，blob 计数与 files 行各一条批量语句，
+    Bloom / 变更日志 / 队列投递整批各一次。"""
+    file_objs = [f for f in file_objs if f and f.filename]
+    if not file_objs:
+        return []
+    uploader_id = data.get("uploader_id")
+    parent_id = data.get("parent_id")
+
+    saved_uploads = _save_uploads_parallel(file_objs)
+    try:
+        storage_stats_service.ensure_quota(
+            session, uploader_id, sum(saved.size for _, saved in saved_uploads)
+        )
+    except DomainError:
+        _discard_incoming(saved_uploads)
+        raise
+
+    placements: list[tuple[str, bool]] = []
+    try:
+        placements = blob_store.put_many(
+            session,
+            [(saved.content_hash, saved.size, temp_path) for temp_path, saved in saved_uploads],
+        )
+        rows = [
+            {
+                "name": file_obj.filename,
+                "file_path": file_path,
+                "file_size": saved.size,
+                "mime_type": _resolve_mime_type(
+                    file_obj.filename, getattr(file_obj, "mimetype", None), saved.mime_type
+                ),
+                "content_hash": saved.content_hash,
+                "uploader_id": uploader_id,
+                "parent_id": parent_id,
+            }
+            for file_obj, (_, saved), (file_path, _) in zip(file_objs, saved_uploads, placements)
+        ]
+        file_ids = _insert_file_rows(session, rows)
+        session.commit()
+    except Exception:
+        for file_path, placed in placements:
+            blob_store.unplace(file_path, placed)
+        session.rollback()
+        _discard_incoming(saved_uploads)
+        raise
 
-    _push_processing_queue([cast(int, f.id) for f in new_files], uploader_id)
+    new_files = _load_created_files(session, file_ids, uploader_id)
+    _push_processing_queue(file_ids, uploader_id)
     return new_files
 
 
@@ -448,6 +729,8 @@ def init_multipart_upload(session: Session, uploader_id: int, data: dict[str, An
         raise BusinessRuleError("total_size must be positive")
     if 0 < MAX_UPLOAD_SIZE < total_size:
         raise PayloadTooLargeError("File too large")
+    # 秒传同样占用配额，在分流前检查
+    storage_stats_service.ensure_quota(session, uploader_id, total_size)
 
     chunk_size = int(data.get("chunk_size") or DEFAULT_CHUNK_SIZE)
     if chunk_size <= 0:
@@ -478,7 +761,8 @@ def init_multipart_upload(session: Session, uploader_id: int, data: dict[str, An
                 "upload_id": None,
                 "chunk_size": chunk_size,
                 "total_chunks": total_chunks,
-                "uploaded_chunks": [],
+                "uploaded_ranges": [],
+                "uploaded_count": 0,
                 "instant_upload": True,
                 "file": new_file.to_dict(),
             }
@@ -486,58 +770,189 @@ def init_multipart_upload(session: Session, uploader_id: int, data: dict[str, An
     upload_id = data.get("upload_id") or uuid.uuid4().hex
     upload_id = _safe_upload_id(upload_id)
 
-    upload_dir = _multipart_upload_dir(uploader_id, upload_id)
-    chunks_dir = _multipart_chunks_dir(upload_dir)
-    meta_path = _multipart_meta_path(upload_dir)
+    mode = data.get("mode") or MULTIPART_MODE_CHUNKED
+    if mode not in MULTIPART_MODES:
+        raise BusinessRuleError("Invalid upload mode")
+    if mode == MULTIPART_MODE_OFFSET and not OFFSET_MODE_SUPPORTED:
+        # 平台不支持 pwrite（如 Windows 本机开发）时退回逐分片文件模式
+        mode = MULTIPART_MODE_CHUNKED
 
-    os.makedirs(chunks_dir, exist_ok=True)
+    upload_dir = _multipart_upload_dir(uploader_id, upload_id)
+    os.makedirs(_multipart_chunks_dir(upload_dir), exist_ok=True)
 
-    if os.path.exists(meta_path):
-        meta = _load_multipart_meta(uploader_id, upload_id)
+    meta, created = multipart_session.create(uploader_id, upload_id, {
+        "upload_id": upload_id,
+        "uploader_id": uploader_id,
+        "filename": filename,
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "total_chunks": total_chunks,
+        "parent_id": parent_id,
+        "mime_type": mime_type,
+        "content_hash": content_hash,
+        "mode": mode,
+    })
+    if created:
+        if mode == MULTIPART_MODE_OFFSET:
+            try:
+                _prepare_offset_upload(upload_dir, total_size)
+            except Exception:
+                multipart_session.delete(uploader_id, upload_id)
+                raise
+    else:
         expected = (
             meta.get("filename"),
             int(meta.get("total_size", 0)),
             int(meta.get("chunk_size", 0)),
             meta.get("parent_id"),
+            _multipart_mode(meta),
         )
-        current = (filename, total_size, chunk_size, parent_id)
+        current = (filename, total_size, chunk_size, parent_id, mode)
         if expected != current:
             raise ConflictError("upload_id already exists with different file metadata")
-    else:
-        meta = {
-            "upload_id": upload_id,
-            "uploader_id": uploader_id,
-            "filename": filename,
-            "total_size": total_size,
-            "chunk_size": chunk_size,
-            "total_chunks": total_chunks,
-            "parent_id": parent_id,
-            "mime_type": mime_type,
-            "content_hash": content_hash,
-        }
-        _write_multipart_meta(meta_path, meta)
 
     return {
         "upload_id": upload_id,
+        "mode": mode,
         "chunk_size": int(meta["chunk_size"]),
         "total_chunks": int(meta["total_chunks"]),
-        "uploaded_chunks": _list_uploaded_chunks(chunks_dir),
+        **_uploaded_progress(uploader_id, upload_id, meta),
         "instant_upload": False,
     }
 
 
-def get_multipart_upload_status(uploader_id: int, upload_id: str) -> dict[str, Any]:
-    meta = _load_multipart_meta(uploader_id, upload_id)
-    upload_dir = _multipart_upload_dir(uploader_id, _safe_upload_id(upload_id))
+def _multipart_mode(meta: dict[str, Any]) -> str:
+    return meta.get("mode") or MULTIPART_MODE_CHUNKED
+
+
+def _expected_chunk_size(meta: dict[str, Any], idx: int) -> int:
+    chunk_size = int(meta["chunk_size"])
+    if idx == int(meta["total_chunks"]) - 1:
+        last_size = int(meta["total_size"]) - (idx * chunk_size)
+        if last_size > 0:
+            return last_size
+    return chunk_size
+
+
+def _uploaded_progress(uploader_id: int, upload_id: str, meta: dict[str, Any]) -> dict[str, Any]:
+    """已收分片以闭区间返回，万级分片的会话响应也只有寥寥几段。"""
+    ranges = multipart_session.received_ranges(uploader_id, upload_id, int(meta["total_chunks"]))
+    return {
+        "uploaded_ranges": ranges,
+        "uploaded_count": sum(end - start + 1 for start, end in ranges),
+    }
+
+
+def _prepare_offset_upload(upload_dir: str, total_size: int) -> None:
+    """预分配最终文件；ENOSPC 时立即失败，避免传到一半才发现磁盘不足。"""
+    data_path = _multipart_data_path(upload_dir)
+    fd = os.open(data_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, total_size)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                os.close(fd)
+                fd = -1
+                os.remove(data_path)
+                raise ServiceOperationError("Insufficient storage space")
+            # 不支持 fallocate 的文件系统退化为稀疏文件
+            os.ftruncate(fd, total_size)
+    finally:
+        if fd >= 0:
+            os.close(fd)
+
+
+def _chunk_feeder(uploader_id: int, upload_id: str, upload_dir: str, meta: dict[str, Any]):
+    """返回 ``feed(digest, idx)``：分片已收到时把其内容续算进 digest。"""
+    if _multipart_mode(meta) == MULTIPART_MODE_OFFSET:
+        data_path = _multipart_data_path(upload_dir)
+        chunk_size = int(meta["chunk_size"])
+
+        def feed_region(digest: Any, idx: int) -> bool:
+            if not multipart_session.is_received(uploader_id, upload_id, idx):
+                return False
+            update_digest_from_file(
+                digest, data_path, idx * chunk_size, _expected_chunk_size(meta, idx)
+            )
+            return True
+
+        return feed_region
+
     chunks_dir = _multipart_chunks_dir(upload_dir)
+
+    def feed_part(digest: Any, idx: int) -> bool:
+        if not multipart_session.is_received(uploader_id, upload_id, idx):
+            return False
+        update_digest_from_file(digest, _multipart_part_path(chunks_dir, idx))
+        return True
+
+    return feed_part
+
+
+def get_multipart_upload_status(uploader_id: int, upload_id: str) -> dict[str, Any]:
+    safe_upload_id = _safe_upload_id(upload_id)
+    meta = _load_multipart_meta(uploader_id, safe_upload_id)
     return {
         "upload_id": meta["upload_id"],
+        "mode": _multipart_mode(meta),
         "chunk_size": int(meta["chunk_size"]),
         "total_chunks": int(meta["total_chunks"]),
-        "uploaded_chunks": _list_uploaded_chunks(chunks_dir),
+        **_uploaded_progress(uploader_id, safe_upload_id, meta),
     }
 
 
+def _store_chunk_file(
+        chunks_dir: str, idx: int, expected_size: int, chunk_obj: Any, digest: Any
+) -> None:
+    """chunked 模式：分片先写 .tmp，校验大小后原子改名为 N.part。"""
+    os.makedirs(chunks_dir, exist_ok=True)
+    part_path = _multipart_part_path(chunks_dir, idx)
+    tmp_part_path = f"{part_path}.tmp"
+
+    if os.path.exists(tmp_part_path):
+        os.remove(tmp_part_path)
+
+    actual_size = _save_upload(chunk_obj, tmp_part_path, digest).size
+    if actual_size != expected_size:
+        os.remove(tmp_part_path)
+        raise BusinessRuleError(
+            f"Invalid chunk size for index {idx}: expected {expected_size}, got {actual_size}"
+        )
+
+    os.replace(tmp_part_path, part_path)
+
+
+def _store_chunk_at_offset(
+        upload_dir: str,
+        meta: dict[str, Any],
+        idx: int,
+        expected_size: int,
+        chunk_obj: Any,
+        digest: Any,
+) -> None:
+    """offset 模式：pwrite 到预分配文件的 idx * chunk_size 处。
+
+    写入上限为本分片长度，超长分片在越界前即被拒绝，不会覆盖相邻分片。
+    """
+    fd = os.open(_multipart_data_path(upload_dir), os.O_WRONLY)
+    try:
+        writer = OffsetWriter(fd, idx * int(meta["chunk_size"]))
+        try:
+            actual_size = chunk_obj.write_to(writer, digest=digest, max_bytes=expected_size).size
+        except PayloadTooLargeError:
+            raise BusinessRuleError(
+                f"Invalid chunk size for index {idx}: expected {expected_size}, got more"
+            )
+    finally:
+        os.close(fd)
+
+    if actual_size != expected_size:
+        raise BusinessRuleError(
+            f"Invalid chunk size for index {idx}: expected {expected_size}, got {actual_size}"
+        )
+
+
 def save_multipart_chunk(
         uploader_id: int,
         upload_id: str,
@@ -553,104 +968,179 @@ def save_multipart_chunk(
         raise BusinessRuleError("Invalid chunk_index")
 
     total_chunks = int(meta["total_chunks"])
-    chunk_size = int(meta["chunk_size"])
-    total_size = int(meta["total_size"])
 
     if idx < 0 or idx >= total_chunks:
         raise BusinessRuleError("chunk_index out of range")
 
-    upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
-    chunks_dir = _multipart_chunks_dir(upload_dir)
-    os.makedirs(chunks_dir, exist_ok=True)
-
-    part_path = os.path.join(chunks_dir, f"{idx}.part")
-    tmp_part_path = f"{part_path}.tmp"
-
-    if os.path.exists(tmp_part_path):
-        os.remove(tmp_part_path)
+    # 已收到的分片不再落盘：offset 模式会覆盖已校验的区域，写到一半失败时位图仍标记已收，
+    # 合并出的内容便与首次到达时计入的摘要不符。重传按幂等成功返回
+    if multipart_session.is_received(uploader_id, safe_upload_id, idx):
+        return {
+            "upload_id": safe_upload_id,
+            "chunk_index": idx,
+            "uploaded_count": multipart_session.received_count(uploader_id, safe_upload_id),
+        }
 
-    chunk_obj.save(tmp_part_path)
-    actual_size = os.path.getsize(tmp_part_path)
+    upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
+    expected_size = _expected_chunk_size(meta, idx)
 
-    expected_size = chunk_size
-    if idx == total_chunks - 1:
-        expected_size = total_size - (idx * chunk_size)
-        if expected_size <= 0:
-            expected_size = chunk_size
+    # 恰为下一个待算分片时，写盘同时把字节续算进会话摘要
+    digest = multipart_digest.claim(uploader_id, safe_upload_id, idx)
+    try:
+        if _multipart_mode(meta) == MULTIPART_MODE_OFFSET:
+            _store_chunk_at_offset(upload_dir, meta, idx, expected_size, chunk_obj, digest)
+        else:
+            _store_chunk_file(
+                _multipart_chunks_dir(upload_dir), idx, expected_size, chunk_obj, digest
+            )
+    except Exception:
+        if digest is not None:
+            multipart_digest.release(uploader_id, safe_upload_id, idx, None)
+        raise
 
-    if actual_size != expected_size:
-        os.remove(tmp_part_path)
-        raise BusinessRuleError(
-            f"Invalid chunk size for index {idx}: expected {expected_size}, got {actual_size}"
-        )
+    uploaded_count = multipart_session.mark_received(uploader_id, safe_upload_id, idx)
+    if uploaded_count < 0:
+        multipart_digest.discard(uploader_id, safe_upload_id)
+        raise ResourceNotFoundError("Upload session not found")
 
-    os.replace(tmp_part_path, part_path)
+    if digest is not None:
+        multipart_digest.release(uploader_id, safe_upload_id, idx, digest)
+    # 先到的乱序分片在缺口补齐后从页缓存续算
+    multipart_digest.advance(
+        uploader_id,
+        safe_upload_id,
+        total_chunks,
+        _chunk_feeder(uploader_id, safe_upload_id, upload_dir, meta),
+    )
 
     return {
         "upload_id": safe_upload_id,
         "chunk_index": idx,
-        "uploaded_chunks": _list_uploaded_chunks(chunks_dir),
+        "uploaded_count": uploaded_count,
     }
 
 
-def complete_multipart_upload(session: Session, uploader_id: int, upload_id: str) -> File:
-    safe_upload_id = _safe_upload_id(upload_id)
-    meta = _load_multipart_meta(uploader_id, safe_upload_id)
-
+def _assemble_chunk_files(
+        uploader_id: int,
+        upload_id: str,
+        upload_dir: str,
+        meta: dict[str, Any],
+        final_path: str,
+) -> str:
+    """chunked 模式合并：已计摘要的分片走内核拷贝，其余边拷贝边续算。返回内容哈希。"""
     total_chunks = int(meta["total_chunks"])
     total_size = int(meta["total_size"])
-    filename = meta["filename"]
-    parent_id = meta.get("parent_id")
-    mime_type = meta.get("mime_type")
-    content_hash = _normalize_content_hash(meta.get("content_hash"))
-
-    upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
     chunks_dir = _multipart_chunks_dir(upload_dir)
-
-    uploaded_chunks = set(_list_uploaded_chunks(chunks_dir))
-    missing = [idx for idx in range(total_chunks) if idx not in uploaded_chunks]
-    if missing:
-        preview = ",".join(str(i) for i in missing[:10])
-        raise BusinessRuleError(f"Missing chunks: {preview}")
-
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    unique_filename = _generate_unique_filename(filename)
-    final_path = os.path.join(UPLOAD_FOLDER, unique_filename)
     tmp_final_path = f"{final_path}.assembling"
 
     if os.path.exists(tmp_final_path):
         os.remove(tmp_final_path)
 
+    # [0, hashed_chunks) 已在上传时计入摘要，只需内核拷贝
+    digest, hashed_chunks = multipart_digest.take(uploader_id, upload_id)
     try:
-        with open(tmp_final_path, "wb") as target:
+        with open(tmp_final_path, "wb", buffering=0) as target:
             for idx in range(total_chunks):
-                part_path = os.path.join(chunks_dir, f"{idx}.part")
-                with open(part_path, "rb") as source:
-                    shutil.copyfileobj(source, target, length=COPY_BUFFER_SIZE)
+                with open(_multipart_part_path(chunks_dir, idx), "rb") as source:
+                    if idx < hashed_chunks:
+                        _copy_file_kernel(source, target)
+                    else:
+                        _copy_and_hash(source, target, digest)
 
         assembled_size = os.path.getsize(tmp_final_path)
         if assembled_size != total_size:
-            os.remove(tmp_final_path)
             raise BusinessRuleError(
                 f"Assembled file size mismatch: expected {total_size}, got {assembled_size}"
             )
+        computed_hash = _verify_declared_hash(meta, digest)
         os.replace(tmp_final_path, final_path)
+        return computed_hash
+    except Exception:
+        if os.path.exists(tmp_final_path):
+            os.remove(tmp_final_path)
+        raise
+
+
+def _finalize_offset_file(
+        uploader_id: int,
+        upload_id: str,
+        upload_dir: str,
+        meta: dict[str, Any],
+        final_path: str,
+) -> str:
+    """offset 模式无需合并：补算缺失摘要后把预分配文件原子改名到位。返回内容哈希。"""
+    digest, hashed_chunks = multipart_digest.take(uploader_id, upload_id)
+    feed = _chunk_feeder(uploader_id, upload_id, upload_dir, meta)
+    for idx in range(hashed_chunks, int(meta["total_chunks"])):
+        feed(digest, idx)
+
+    computed_hash = _verify_declared_hash(meta, digest)
+    os.replace(_multipart_data_path(upload_dir), final_path)
+    return computed_hash
+
+
+def _verify_declared_hash(meta: dict[str, Any], digest: Any) -> str:
+    computed_hash = digest.hexdigest()
+    declared_hash = _normalize_content_hash(meta.get("content_hash"))
+    if declared_hash and declared_hash != computed_hash:
+        raise BusinessRuleError("content_hash does not match uploaded content")
+    return computed_hash
+
+
+def _missing_chunks_preview(ranges: list[list[int]], total_chunks: int, limit: int = 10) -> str:
+    missing = []
+    cursor = 0
+    for start, end in ranges + [[total_chunks, total_chunks]]:
+        missing.extend(range(cursor, min(start, cursor + limit - len(missing))))
+        if len(missing) >= limit:
+            break
+        cursor = end + 1
+    return ",".join(str(i) for i in missing)
+
+
+def complete_multipart_upload(session: Session, uploader_id: int, upload_id: str) -> File:
+    safe_upload_id = _safe_upload_id(upload_id)
+    meta = _load_multipart_meta(uploader_id, safe_upload_id)
+
+    total_chunks = int(meta["total_chunks"])
+    total_size = int(meta["total_size"])
+    filename = meta["filename"]
+    parent_id = meta.get("parent_id")
+    mime_type = meta.get("mime_type")
+
+    upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
+
+    if multipart_session.received_count(uploader_id, safe_upload_id) < total_chunks:
+        ranges = multipart_session.received_ranges(uploader_id, safe_upload_id, total_chunks)
+        raise BusinessRuleError(f"Missing chunks: {_missing_chunks_preview(ranges, total_chunks)}")
+
+    final_path = blob_store.incoming_path()
+
+    try:
+        if _multipart_mode(meta) == MULTIPART_MODE_OFFSET:
+            computed_hash = _finalize_offset_file(
+                uploader_id, safe_upload_id, upload_dir, meta, final_path
+            )
+        else:
+            computed_hash = _assemble_chunk_files(
+                uploader_id, safe_upload_id, upload_dir, meta, final_path
+            )
     except DomainError:
         raise
     except Exception as e:
-        if os.path.exists(tmp_final_path):
-            os.remove(tmp_final_path)
         logger.exception(f"Failed to merge chunks: {e}")
         raise ServiceOperationError("Failed to merge chunks")
 
+    file_path, placed = None, False
     try:
-        resolved_mime = _resolve_mime_type(final_path, mime_type)
+        resolved_mime = _resolve_mime_type(filename, mime_type)
+        file_path, placed = blob_store.put(session, computed_hash, total_size, final_path)
         new_file = File(
             name=filename,
-            file_path=unique_filename,
+            file_path=file_path,
             file_size=total_size,
             mime_type=resolved_mime,
-            content_hash=content_hash or _calculate_file_hash(final_path),
+            content_hash=computed_hash,
             uploader_id=uploader_id,
             parent_id=parent_id,
         )
@@ -660,6 +1150,8 @@ def complete_multipart_upload(session: Session, uploader_id: int, upload_id: str
             cast(int, new_file.id), cast(int | None, new_file.uploader_id)
         )
     except Exception as e:
+        if file_path:
+            blob_store.unplace(file_path, placed)
         session.rollback()
         logger.exception(f"Failed to persist merged file: {e}")
         if os.path.exists(final_path):
@@ -667,8 +1159,10 @@ def complete_multipart_upload(session: Session, uploader_id: int, upload_id: str
         raise ServiceOperationError("Failed to save file metadata")
     finally:
         shutil.rmtree(upload_dir, ignore_errors=True)
+        multipart_session.delete(uploader_id, safe_upload_id)
 
     _log_file_created(new_file)
+    listing_cache.bump_folder_chains(session, [parent_id], uploader_id)
 
     _push_processing_queue([cast(int, new_file.id)], uploader_id)
     return new_file
@@ -677,6 +1171,8 @@ def complete_multipart_upload(session: Session, uploader_id: int, upload_id: str
 def abort_multipart_upload(uploader_id: int, upload_id: str) -> None:
     safe_upload_id = _safe_upload_id(upload_id)
     upload_dir = _multipart_upload_dir(uploader_id, safe_upload_id)
+    multipart_digest.discard(uploader_id, safe_upload_id)
+    multipart_session.delete(uploader_id, safe_upload_id)
     shutil.rmtree(upload_dir, ignore_errors=True)
 
 
@@ -701,11 +1197,24 @@ def get_authorized_file(session: Session, user_id: int, role: str, file_id: int)
 
 def get_downloadable_file(session: Session, user_id: int, role: str, file_id: int) -> File:
     file_obj = get_authorized_file(session, user_id, role, file_id)
-    if not os.path.exists(file_obj.get_abs_path()):
+    if not storage.exists(cast(str, file_obj.file_path)):
         raise ResourceNotFoundError("File not found on server")
     return file_obj
 
 
+def _listing_cache_key(mode: str):
+    """列表页缓存键：父目录与用户的当前代数 + 其余参数摘要，见 listing_cache。"""
+    def build(session, user_id, parent_id, *args, **kwargs):
+        return listing_cache.page_key(user_id, parent_id, [mode, args, kwargs])
+
+    return build
+
+
+@cacheable(
+    prefix=listing_cache.LISTING_CACHE_PREFIX,
+    expire=listing_cache.LISTING_CACHE_EXPIRE,
+    key=_listing_cache_key("page"),
+)
 def get_files_and_folders(
         session: Session,
         user_id: int,
@@ -719,13 +1228,14 @@ def get_files_and_folders(
     if page < 1:
         page = 1
 
-    folder_query = session.query(Folder).filter_by(user_id=user_id, parent_id=parent_id)
+    folder_query = _folder_list_query(session, user_id, parent_id)
     if name:
         folder_query = folder_query.filter(Folder.name.ilike(f"%{_escape_like(name)}%", escape="\\"))
+    folder_sort_key = _folder_list_sort_key(sort_by)
     if order == "asc":
-        folder_query = folder_query.order_by(Folder.name.asc())
+        folder_query = folder_query.order_by(folder_sort_key.asc(), Folder.id.asc())
     else:
-        folder_query = folder_query.order_by(Folder.name.desc())
+        folder_query = folder_query.order_by(folder_sort_key.desc(), Folder.id.desc())
 
     file_query = session.query(File).filter_by(uploader_id=user_id, parent_id=parent_id)
     if name:
@@ -763,7 +1273,7 @@ def get_files_and_folders(
         files_result = file_query.offset(file_offset).limit(page_size).all()
 
     return {
-        "folders": [folder.to_dict() for folder in folders_result],
+        "folders": [_folder_list_item(folder, stats) for folder, stats in folders_result],
         "files": {
             "items": [file_obj.to_dict() for file_obj in files_result],
             "total": total_items,
@@ -774,6 +1284,187 @@ def get_files_and_folders(
     }
 
 
+# 目录列表的文件夹项附带汇总（子树大小 / 文件数）；按大小排序时文件夹按子树字节数排。
+def _folder_list_query(session: Session, user_id: int, parent_id: int | None):
+    return (
+        session.query(Folder, FolderStats)
+        .outerjoin(FolderStats, FolderStats.folder_id == Folder.id)
+        .filter(Folder.user_id == user_id, Folder.parent_id == parent_id)
+    )
+
+
+def _folder_list_sort_key(sort_by: str):
+    if sort_by == "size":
+        return func.coalesce(FolderStats.total_bytes, 0)
+    return Folder.name
+
+
+def _folder_list_item(folder: Folder, stats: FolderStats | None) -> dict[str, Any]:
+    data = folder.to_dict()
+    data["stats"] = folder_stats_service.rollup_dict(stats)
+    return data
+
+
+# 游标分页：先文件夹（按名称，按大小排序时按子树字节数）后文件（按 sort_by），
+# 每段按 (排序键, id) 取下一页。
+# 可空列用 COALESCE 兜底，表达式与 File / Folder 上的列表索引保持一致。
+LIST_CURSOR_FOLDERS = "d"
+LIST_CURSOR_FILES = "f"
+LIST_SORT_EPOCH = datetime(1970, 1, 1)
+_LIST_SORT_EPOCH_SQL = "'1970-01-01 00:00:00'::timestamp"
+
+
+def _file_list_sort_key(sort_by: str):
+    if sort_by == "name":
+        return File.name
+    if sort_by == "size":
+        return func.coalesce(File.file_size, -1)
+    return func.coalesce(File.created_at, text(_LIST_SORT_EPOCH_SQL))
+
+
+def _file_sort_value(file_obj: File, sort_by: str) -> Any:
+    if sort_by == "name":
+        return file_obj.name
+    if sort_by == "size":
+        return file_obj.file_size if file_obj.file_size is not None else -1
+    return file_obj.created_at or LIST_SORT_EPOCH
+
+
+def _encode_list_cursor(phase: str, sort_by: str, order: str, value: Any = None, row_id: int | None = None) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([phase, sort_by, order, value, row_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_list_cursor(cursor: str, sort_by: str, order: str) -> tuple[str, Any, int | None]:
+    """返回 ``(阶段, 上一条排序键, 上一条 id)``；id 为空表示从该阶段开头取。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        phase, cursor_sort_by, cursor_order, value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise BusinessRuleError("Invalid cursor")
+    if (
+            phase not in (LIST_CURSOR_FOLDERS, LIST_CURSOR_FILES)
+            or (cursor_sort_by, cursor_order) != (sort_by, order)
+            or not (row_id is None or isinstance(row_id, int))
+    ):
+        raise BusinessRuleError("Invalid cursor")
+    if row_id is not None and sort_by == "size" and not isinstance(value, int):
+        raise BusinessRuleError("Invalid cursor")
+    if row_id is not None and phase == LIST_CURSOR_FILES and sort_by not in ("name", "size"):
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise BusinessRuleError("Invalid cursor")
+    return phase, value, row_id
+
+
+def _after_keyset(query, sort_key, id_column, order: str, value: Any, row_id: int | None):
+    """接在 (value, row_id) 之后继续，并按 (排序键, id) 排序。"""
+    if order == "asc":
+        if row_id is not None:
+            query = query.filter(tuple_(sort_key, id_column) > tuple_(value, row_id))
+        return query.order_by(sort_key.asc(), id_column.asc())
+    if row_id is not None:
+        query = query.filter(tuple_(sort_key, id_column) < tuple_(value, row_id))
+    return query.order_by(sort_key.desc(), id_column.desc())
+
+
+@cacheable(
+    prefix=listing_cache.LISTING_CACHE_PREFIX,
+    expire=listing_cache.LISTING_CACHE_EXPIRE,
+    key=_listing_cache_key("cursor"),
+)
+def get_files_and_folders_by_cursor(
+        session: Session,
+        user_id: int,
+        parent_id: int | None,
+        cursor: str | None = None,
+        page_size: int = 10,
+        name: str | None = None,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        with_total: bool = False,
+) -> dict[str, Any]:
+    """目录浏览的游标分页：每页只按索引定位到上一页末尾，深页与首页代价相同。
+
+    ``cursor`` 为空时取第一页；返回的 ``next_cursor`` 为空表示已到末尾。
+    ``with_total`` 才额外计数，默认不做两次 COUNT。
+    """
+    if sort_by not in ("name", "size"):
+        sort_by = "created_at"
+    order = "asc" if order == "asc" else "desc"
+
+    folder_query = _folder_list_query(session, user_id, parent_id)
+    file_query = session.query(File).filter_by(uploader_id=user_id, parent_id=parent_id)
+    if name:
+        pattern = f"%{_escape_like(name)}%"
+        folder_query = folder_query.filter(Folder.name.ilike(pattern, escape="\\"))
+        file_query = file_query.filter(File.name.ilike(pattern, escape="\\"))
+
+    phase, after_value, after_id = (
+        _decode_list_cursor(cursor, sort_by, order) if cursor else (LIST_CURSOR_FOLDERS, None, None)
+    )
+
+    folders: list[tuple[Folder, FolderStats | None]] = []
+    next_cursor = None
+    if phase == LIST_CURSOR_FOLDERS:
+        folders = (
+            _after_keyset(
+                folder_query, _folder_list_sort_key(sort_by), Folder.id, order, after_value, after_id
+            )
+            .limit(page_size + 1)
+            .all()
+        )
+        if len(folders) > page_size:
+            folders = folders[:page_size]
+            last_folder, last_stats = folders[-1]
+            last_value = (
+                cast(int, last_stats.total_bytes) if last_stats is not None else 0
+            ) if sort_by == "size" else last_folder.name
+            next_cursor = _encode_list_cursor(
+                LIST_CURSOR_FOLDERS, sort_by, order, last_value, cast(int, last_folder.id)
+            )
+        after_value, after_id = None, None
+
+    files: list[File] = []
+    if next_cursor is None:
+        remaining = page_size - len(folders)
+        files = (
+            _after_keyset(
+                file_query, _file_list_sort_key(sort_by), File.id, order, after_value, after_id
+            )
+            .limit(remaining + 1)
+            .all()
+        )
+        if len(files) > remaining:
+            files = files[:remaining]
+            if files:
+                last = files[-1]
+                next_cursor = _encode_list_cursor(
+                    LIST_CURSOR_FILES, sort_by, order,
+                    _file_sort_value(last, sort_by), cast(int, last.id),
+                )
+            else:
+                # 本页被文件夹填满，文件从头开始
+                next_cursor = _encode_list_cursor(LIST_CURSOR_FILES, sort_by, order)
+
+    result: dict[str, Any] = {
+        "folders": [_folder_list_item(folder, stats) for folder, stats in folders],
+        "files": {
+            "items": [file_obj.to_dict() for file_obj in files],
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        },
+    }
+    if with_total:
+        total_folders = folder_query.with_entities(func.count()).scalar() or 0
+        total_files = file_query.with_entities(func.count()).scalar() or 0
+        result["files"]["total"] = total_folders + total_files
+    return result
+
+
 def update_file(session: Session, id: int, data: dict[str, Any]) -> File:
     file_obj = session.get(File, id)
     if not file_obj:
@@ -789,6 +1480,12 @@ def update_file(session: Session, id: int, data: dict[str, Any]) -> File:
 
     name_changed = file_obj.name != old_name
     parent_changed = file_obj.parent_id != old_parent_id
+    if parent_changed:
+        listing_cache.bump_folder_chains(
+            session, [old_parent_id, file_obj.parent_id], file_obj.uploader_id
+        )
+    else:
+        listing_cache.bump_folders([file_obj.parent_id], file_obj.uploader_id)
     if name_changed or parent_changed:
         action = "update_meta"
         if name_changed and not parent_changed:
@@ -811,10 +1508,10 @@ def update_file(session: Session, id: int, data: dict[str, Any]) -> File:
     return file_obj
 
 
-def delete_file(session: Session, id: int, commit: bool = True, log_event: bool = True) -> None:
-    """删除文件记录；物理文件仅在无其它记录引用同一 path 时才删盘。
+def delete_file(session: Session, id: int) -> None:
+    """删除文件记录；物理文件在引用归零（旧数据：无其它记录引用同一 path）后由后台回收。
 
-    commit/log_event=False 供递归批量删除时由外层统一提交。
+    事务内只改计数、提交后才登记旧数据路径，回滚时文件仍在。
     """
     file_obj = session.get(File, id)
     if not file_obj:
@@ -824,33 +1521,41 @@ def delete_file(session: Session, id: int, commit: bool = True, log_event: bool
     old_parent_id = file_obj.parent_id
     old_name = file_obj.name
     entity_id = file_obj.id
-    abs_path = file_obj.get_abs_path()
-    if os.path.exists(abs_path):
-        try:
-            # 秒传共享同一 file_path，有引用则不能删物理文件
-            remaining_ref = session.query(File).filter(
-                File.file_path == file_obj.file_path, File.id != file_obj.id
-            ).first()
-            if not remaining_ref:
-                os.remove(abs_path)
-        except OSError as e:
-            logger.error(f"Error deleting file {abs_path}: {e}")
+    deleted_row = (cast(str, file_obj.file_path), cast(str | None, file_obj.content_hash))
 
     session.delete(file_obj)
-    if commit:
-        session.commit()
-        if log_event:
-            change_log_service.log_event(
-                user_id=uploader_id,
-                entity_type="file",
-                entity_id=entity_id,
-                action="delete",
-                old_parent_id=old_parent_id,
-                new_parent_id=None,
-                old_name=old_name,
-                new_name=None,
-            )
-        _clear_search_cache(uploader_id)
+    session.flush()
+    legacy_paths = release_deleted_files(session, [deleted_row])
+    session.commit()
+    blob_store.schedule_legacy_reap(legacy_paths)
+    listing_cache.bump_folder_chains(session, [old_parent_id], uploader_id)
+    change_log_service.log_event(
+        user_id=uploader_id,
+        entity_type="file",
+        entity_id=entity_id,
+        action="delete",
+        old_parent_id=old_parent_id,
+        new_parent_id=None,
+        old_name=old_name,
+        new_name=None,
+    )
+    _clear_search_cache(uploader_id)
+
+
+def release_deleted_files(session: Session, rows: list[tuple[str, str | None]]) -> set[str]:
+    """批量删除 files 行之后释放物理文件引用：``rows`` 为被删行的 ``(file_path, content_hash)``。
+
+    blob 归零后交给后台回收；返回已无引用、提交后需登记回收的旧数据路径。
+    """
+    blob_counts: dict[str, int] = {}
+    legacy_paths: set[str] = set()
+    for file_path, content_hash in rows:
+        if content_hash and file_path == blob_store.blob_path(content_hash):
+            blob_counts[content_hash] = blob_counts.get(content_hash, 0) + 1
+        else:
+            legacy_paths.add(file_path)
+    blob_store.release_many(session, blob_counts)
+    return blob_store.unreferenced_legacy_paths(session, legacy_paths)
 
 
 async def search_files(
@@ -864,7 +1569,12 @@ async def search_files(
     if not query:
         return {"items": [], "total": 0, "page": page, "page_size": page_size}
 
-    target = _search_files_vector if search_type == "vector" else _search_files_fuzzy
+    target = {
+        "vector": _search_files_vector,
+        "semantic": _search_files_vector,
+        "fulltext": _search_files_fulltext,
+        "hybrid": _search_files_hybrid,
+    }.get(search_type, _search_files_fuzzy)
 
     def _work():
         return target(session, user_id, query, page, page_size)
@@ -875,18 +1585,63 @@ async def search_files(
 @cacheable(
     prefix=SEARCH_CACHE_PREFIX,
     expire=CACHE_EXPIRATION,
-    key=lambda session, user_id, query, page, page_size, **_: f"{user_id}:{query}:{page}:{page_size}:fuzzy",
+    key=lambda session, user_id, query, page, page_size, **_: _search_cache_key(
+        user_id, query, page, page_size, "fuzzy"
+    ),
 )
 def _search_files_fuzzy(
         session: Session,
         user_id: int, query: str, page: int, page_size: int
 ) -> dict[str, Any]:
-    base_query = session.query(File).filter(
-        File.uploader_id == user_id, File.name.ilike(f"%{_escape_like(query)}%", escape="\\")
+    """文件名模糊搜索：子串命中或词相似度达到 pg_trgm.word_similarity_threshold（容忍错别字）。
+
+    两个条件都走 files.name 上的 trigram GIN 索引；子串命中排在前，其余按相似度降序。
+    """
+    substring = File.name.ilike(f"%{_escape_like(query)}%", escape="\\")
+    similarity = func.word_similarity(query, File.name)
+    match = substring
+    if len(query) >= FUZZY_SIMILARITY_MIN_LENGTH:
+        match = or_(substring, literal(query).op("<%")(File.name))
+    base_query = session.query(File).filter(File.uploader_id == user_id, match)
+    total = base_query.count()
+    offset = (page - 1) * page_size
+    items = (
+        base_query.order_by(substring.desc(), similarity.desc(), File.id.desc())
+        .offset(offset)
+        .limit(page_size)
+        .all()
     )
+
+    return {
+        "items": [file_obj.to_dict() for file_obj in items],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+    }
+
+
+@cacheable(
+    prefix=SEARCH_CACHE_PREFIX,
+    expire=CACHE_EXPIRATION,
+    key=lambda session, user_id, query, page, page_size, **_: _search_cache_key(
+        user_id, query, page, page_size, "fulltext"
+    ),
+)
+def _search_files_fulltext(
+        session: Session,
+        user_id: int, query: str, page: int, page_size: int
+) -> dict[str, Any]:
+    """文件名与 AI 描述的全文检索：按词项精确命中（发票号、人名、代码标识符等），见 fulltext_service。"""
+    match, rank = fulltext_service.match_and_rank(query)
+    base_query = session.query(File).filter(File.uploader_id == user_id, match)
     total = base_query.count()
     offset = (page - 1) * page_size
-    items = base_query.offset(offset).limit(page_size).all()
+    items = (
+        base_query.order_by(rank.desc(), File.id.desc())
+        .offset(offset)
+        .limit(page_size)
+        .all()
+    )
 
     return {
         "items": [file_obj.to_dict() for file_obj in items],
@@ -896,6 +1651,67 @@ def _search_files_fuzzy(
     }
 
 
+def _search_files_hybrid(
+        session: Session,
+        user_id: int, query: str, page: int, page_size: int
+) -> dict[str, Any]:
+    """全文与向量两路各取前 K 名，用对话检索的同一套 RRF 融合后分页；向量一路不可用时只剩全文。
+
+    total 为两路候选的并集大小（融合截断前计算）；每路最多取 K 个，故 total 不超过 2K。
+    """
+    from langchain_core.documents import Document
+
+    from app.services.chat_service import RAG_RRF_K, _fuse_docs_with_rrf
+
+    fetch_k = max(SEARCH_HYBRID_FETCH_K, page * page_size)
+    result_sets: list[list[Document]] = []
+
+    try:
+        embeddings = embedding_desc(query, get_embedding_model_config(), user_id=user_id)
+        if embeddings:
+            distance = File.vector_info.cosine_distance(embeddings)
+            semantic = (
+                session.query(File.id, distance.label("distance"))
+                .filter(File.uploader_id == user_id, File.vector_info.isnot(None))
+                .order_by(distance)
+                .limit(fetch_k)
+                .all()
+            )
+            # 向量一路在前：两路都命中的文档保留 distance，供 RRF 同分时打破平局
+            result_sets.append([
+                Document(page_content="", metadata={"id": row.id, "distance": float(row.distance)})
+                for row in semantic
+            ])
+    except Exception as e:
+        session.rollback()
+        logger.exception(f"Hybrid search vector recall failed: {e}")
+
+    match, rank = fulltext_service.match_and_rank(query)
+    lexical = (
+        session.query(File.id)
+        .filter(File.uploader_id == user_id, match)
+        .order_by(rank.desc(), File.id.desc())
+        .limit(fetch_k)
+        .all()
+    )
+    result_sets.append([Document(page_content="", metadata={"id": row.id}) for row in lexical])
+
+    total = len({int(doc.metadata["id"]) for docs in result_sets for doc in docs})
+    fused = _fuse_docs_with_rrf(result_sets, rrf_k=RAG_RRF_K, top_k=total)
+    offset = (page - 1) * page_size
+    page_ids = [int(doc.metadata["id"]) for doc in fused[offset:offset + page_size]]
+    files_by_id = {
+        cast(int, f.id): f for f in session.query(File).filter(File.id.in_(page_ids)).all()
+    } if page_ids else {}
+
+    return {
+        "items": [files_by_id[file_id].to_dict() for file_id in page_ids if file_id in files_by_id],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+    }
+
+
 def _search_files_vector(
         session: Session,
         user_id: int, query: str, page: int, page_size: int
@@ -942,8 +1758,17 @@ def _search_files_vector(
         }
 
 
-def _clear_search_cache(user_id: int) -> None:
-    evict_cache_pattern(SEARCH_CACHE_PREFIX)
+def _search_cache_key(user_id: int, query: str, page: int, page_size: int, kind: str) -> str:
+    gens = read_generations(f"{SEARCH_GEN_PREFIX}:{user_id}")
+    # 代数读不到时换一次性键，等同不走缓存
+    generation = gens[0] if gens is not None else f"nocache-{uuid.uuid4().hex}"
+    return f"{user_id}:{generation}:{query}:{page}:{page_size}:{kind}"
+
+
+def _clear_search_cache(user_id: int | None) -> None:
+    """该用户的搜索缓存整体失效：代数 +1，O(1)，不 SCAN、不影响其他用户。"""
+    if user_id:
+        bump_generations([f"{SEARCH_GEN_PREFIX}:{user_id}"], SEARCH_GEN_EXPIRE)
 
 
 def get_root_file_id(session: Session, user_id: int) -> int | None:
@@ -1009,6 +1834,159 @@ def batch_delete_items(session: Session, user_id: int, role: str, items: list[di
             delete_file(session, item_id)
 
 
+def _change_action(name_changed: bool, parent_changed: bool) -> str:
+    if name_changed and not parent_changed:
+        return "rename"
+    if parent_changed and not name_changed:
+        return "move"
+    return "update_meta"
+
+
+def _folder_move_batches(folders: list[Folder]) -> list[list[int]]:
+    """同批移动的文件夹互为祖孙时，按深度由深到浅分条执行。
+
+    路径触发器按旧前缀平移子树：祖先先动会把已移走的子孙下级挂回祖先的新路径。
+    """
+    paths = [cast(str, folder.path_ids or "") for folder in folders]
+    # 排序后子孙紧跟在祖先之后，只需比较相邻项
+    ordered = sorted(paths)
+    nested = any(b.startswith(a) for a, b in zip(ordered, ordered[1:]))
+    if not nested:
+        return [[cast(int, folder.id) for folder in folders]] if folders else []
+    by_depth: dict[int, list[int]] = {}
+    for folder, path in zip(folders, paths):
+        by_depth.setdefault(path.count("/"), []).append(cast(int, folder.id))
+    return [by_depth[depth] for depth in sorted(by_depth, reverse=True)]
+
+
+def batch_move_items(
+        session: Session, user_id: int, role: str, items: list[dict[str, Any]],
+        parent_id: int | None = None,
+) -> int:
+    """批量移动 / 重命名文件与文件夹，返回实际变更的项数。
+
+    文件、文件夹各一次加锁查询完成存在性、归属与成环校验；移动按表各一条
+    ``UPDATE ... WHERE id IN``，重命名按主键批量回写；提交后变更事件按用户整批写入，
+    缓存按用户各失效一次。任一项校验失败则整批不生效。
+    """
+    from app.services import folder_service
+
+    file_names: dict[int, str | None] = {}
+    folder_names: dict[int, str | None] = {}
+    for item in items:
+        names = folder_names if item.get("is_folder") else file_names
+        names[int(item["id"])] = item.get("name")
+    if parent_id is None and not any(file_names.values()) and not any(folder_names.values()):
+        raise BusinessRuleError("Nothing to move or rename")
+
+    try:
+        folder_ids = set(folder_names) | ({parent_id} if parent_id is not None else set())
+        folders = {
+            cast(int, folder.id): folder
+            for folder in session.query(Folder)
+            .filter(Folder.id.in_(list(folder_ids)))
+            .order_by(Folder.id)
+            .with_for_update()
+        } if folder_ids else {}
+        files = {
+            cast(int, file_obj.id): file_obj
+            for file_obj in session.query(File)
+            .filter(File.id.in_(list(file_names)))
+            .order_by(File.id)
+            .with_for_update()
+        } if file_names else {}
+
+        target = folders.get(parent_id) if parent_id is not None else None
+        if parent_id is not None and target is None:
+            raise ResourceNotFoundError("Target folder not found")
+        if target is not None and role != "admin" and target.user_id != user_id:
+            raise PermissionDeniedError("Permission denied")
+
+        # (实体类型, 归属用户, 行, 新名称)
+        entries: list[tuple[str, int | None, Any, str | None]] = []
+        for file_id, name in file_names.items():
+            file_obj = files.get(file_id)
+            if file_obj is None:
+                raise ResourceNotFoundError("File not found")
+            entries.append(("file", cast(int | None, file_obj.uploader_id), file_obj, name))
+        for folder_id, name in folder_names.items():
+            folder = folders.get(folder_id)
+            if folder is None:
+                raise ResourceNotFoundError("Folder not found")
+            if target is not None and folder.parent_id != parent_id:
+                if folder.parent_id is None:
+                    raise BusinessRuleError("Cannot move the root folder")
+                if cast(str, target.path_ids or "").startswith(cast(str, folder.path_ids)):
+                    raise BusinessRuleError("Cannot move a folder into itself or its subfolder")
+            entries.append(("folder", cast(int | None, folder.user_id), folder, name))
+
+        for _, owner_id, _, _ in entries:
+            if role != "admin" and owner_id != user_id:
+                raise PermissionDeniedError("Permission denied")
+            if target is not None and owner_id != target.user_id:
+                raise PermissionDeniedError("Cannot move items to another user's folder")
+
+        moved: dict[str, list[int]] = {"file": [], "folder": []}
+        renamed: dict[str, list[dict[str, Any]]] = {"file": [], "folder": []}
+        events: dict[int | None, list[dict[str, Any]]] = {}
+        # 列表缓存失效范围：移动涉及新旧父目录的整条祖先链，仅改名只涉及所在目录
+        moved_parents: dict[int | None, set[int | None]] = {}
+        renamed_parents: dict[int | None, set[int | None]] = {}
+        for entity_type, owner_id, row, name in entries:
+            old_parent_id, old_name = row.parent_id, row.name
+            new_parent_id = parent_id if target is not None else old_parent_id
+            new_name = name or old_name
+            parent_changed = new_parent_id != old_parent_id
+            name_changed = new_name != old_name
+            if parent_changed:
+                moved[entity_type].append(cast(int, row.id))
+                moved_parents.setdefault(owner_id, set()).update((old_parent_id, new_parent_id))
+            if name_changed:
+                renamed[entity_type].append({"id": row.id, "name": new_name})
+                renamed_parents.setdefault(owner_id, set()).add(new_parent_id)
+            if parent_changed or name_changed:
+                events.setdefault(owner_id, []).append(
+                    {
+                        "entity_type": entity_type,
+                        "entity_id": row.id,
+                        "action": _change_action(name_changed, parent_changed),
+                        "old_parent_id": old_parent_id,
+                        "new_parent_id": new_parent_id,
+                        "old_name": old_name,
+                        "new_name": new_name,
+                    }
+                )
+
+        move_batches = {
+            "file": [moved["file"]] if moved["file"] else [],
+            "folder": _folder_move_batches([folders[folder_id] for folder_id in moved["folder"]]),
+        }
+        for model, entity_type in ((File, "file"), (Folder, "folder")):
+            for ids in move_batches[entity_type]:
+                session.execute(
+                    update(model)
+                    .where(model.id.in_(ids))
+                    .values(parent_id=parent_id)
+                    .execution_options(synchronize_session=False)
+                )
+            if renamed[entity_type]:
+                session.execute(update(model), renamed[entity_type])
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e
+
+    for owner_id, owner_events in events.items():
+        if not owner_id:
+            continue
+        change_log_service.log_events_batch(owner_id, owner_events)
+        listing_cache.bump_folder_chains(session, moved_parents.get(owner_id, ()), owner_id)
+        listing_cache.bump_folders(renamed_parents.get(owner_id, ()), owner_id)
+        folder_service._invalidate_folder_caches(owner_id)
+        _clear_search_cache(owner_id)
+    return sum(len(owner_events) for owner_events in events.values())
+
+
 def embedding_desc(desc: str, config: dict[str, str], user_id: int = 0) -> list[float]:
     """单条文本 embedding；失败返回空列表，避免索引任务硬失败。"""
     try:
@@ -1059,6 +2037,9 @@ def rebuild_failed_indexes(session: Session, user_id: int | None = None) -> int:
         return 0
 
     file_ids = [f.id for f in failed_files]
+    parents: dict[int | None, set[int | None]] = {}
+    for f in failed_files:
+        parents.setdefault(f.uploader_id, set()).add(f.parent_id)
     try:
         session.query(File).filter(File.id.in_(file_ids)).update(
             {File.status: "pending"}, synchronize_session=False
@@ -1068,6 +2049,8 @@ def rebuild_failed_indexes(session: Session, user_id: int | None = None) -> int:
         session.rollback()
         logger.exception("Failed to update file status to pending")
         return 0
+    for uploader_id, parent_ids in parents.items():
+        listing_cache.bump_folders(parent_ids, uploader_id)
 
     try:
         publish_file_tasks([int(file_id) for file_id in file_ids])
@@ -1097,44 +2080,133 @@ async def process_status(session: Session, user_id: int) -> dict[str, int]:
     }
 
 
-def cleanup_expired_uploads(max_age_hours: int = 24) -> int:
-    """清理超时未完成的分片上传临时目录，回收磁盘。"""
-    import time
-
-    if not os.path.exists(MULTIPART_ROOT):
-        return 0
+def _dir_allocated_bytes(path: str) -> int:
+    """目录下文件实际占用的磁盘字节（offset 模式预分配的空洞也算在内）。"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+    return total
 
-    count = 0
-    now = time.time()
-    expiration = max_age_hours * 3600
 
+def _remove_upload_dir(upload_dir: str) -> int | None:
+    """删除会话目录，返回回收的字节数；删除失败返回 None（会话留在索引里下轮重试）。"""
+    reclaimed = _dir_allocated_bytes(upload_dir)
+    try:
+        shutil.rmtree(upload_dir)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to remove upload dir {upload_dir}: {e}")
+        return None
     try:
-        for uploader_id_str in os.listdir(MULTIPART_ROOT):
-            user_dir = os.path.join(MULTIPART_ROOT, uploader_id_str)
-            if not os.path.isdir(user_dir):
+        os.rmdir(os.path.dirname(upload_dir))
+    except OSError:
+        pass
+    return reclaimed
+
+
+def _sweep_unindexed_upload_dirs(token: str, limit: int) -> tuple[int, int, bool]:
+    """兜底遍历 MULTIPART_ROOT：回收没有会话键、且超过会话 TTL 未改动的目录。
+
+    用于会话状态迁到 Redis 之前遗留、从未进过过期索引的目录；按 mtime 判断年龄，
+    不会误删刚建目录、尚未登记会话的上传。返回 ``(目录数, 字节数, 是否遍历完)``。
+    """
+    count = 0
+    reclaimed_bytes = 0
+    cutoff = time.time() - multipart_session.SESSION_TTL_SECONDS
+    if not os.path.isdir(MULTIPART_ROOT):
+        return 0, 0, True
+    for uid_entry in os.scandir(MULTIPART_ROOT):
+        if not (uid_entry.is_dir() and uid_entry.name.isdigit()):
+            continue
+        for entry in os.scandir(uid_entry.path):
+            if not (entry.is_dir() and UPLOAD_ID_PATTERN.fullmatch(entry.name)):
+                continue
+            if entry.stat().st_mtime > cutoff:
                 continue
+            if multipart_session.exists(int(uid_entry.name), entry.name):
+                continue
+            reclaimed = _remove_upload_dir(entry.path)
+            if reclaimed is None:
+                continue
+            count += 1
+            reclaimed_bytes += reclaimed
+            if count % limit == 0 and not multipart_session.extend_cleanup_lock(token):
+                return count, reclaimed_bytes, False
+    return count, reclaimed_bytes, True
 
-            for upload_id in os.listdir(user_dir):
-                upload_dir = os.path.join(user_dir, upload_id)
-                if not os.path.isdir(upload_dir):
-                    continue
 
-                try:
-                    mtime = os.path.getmtime(upload_dir)
-                    if now - mtime > expiration:
-                        logger.info(f"Cleaning up expired upload: {upload_dir}")
-                        shutil.rmtree(upload_dir, ignore_errors=True)
-                        count += 1
-                except OSError as e:
-                    logger.warning(f"Error accessing/deleting {upload_dir}: {e}")
+def cleanup_expired_uploads(limit: int = 500) -> int:
+    """按过期索引清理超时未完成的分片会话，回收磁盘，返回清理的会话数。
 
-            try:
-                if not os.listdir(user_dir):
-                    os.rmdir(user_dir)
-            except OSError:
-                pass
+    分布式锁保证多个 worker 只有一个在清理；每批最多取 limit 个，取到不足一批即停止。
+    每批处理完续期锁，续期失败（锁已过期被他人取得）即停止，避免两个 worker 同时清理。
+    会话在目录删除成功后才移出索引，中途崩溃或删除失败的下一轮重试。
+    首次运行时另做一次 MULTIPART_ROOT 兜底遍历（见 ``_sweep_unindexed_upload_dirs``）。
+    回收字节数累加到 Redis 指标（见 ``multipart_session.record_cleanup``）。
+    """
+    try:
+        token = multipart_session.acquire_cleanup_lock()
+    except Exception as e:
+        logger.exception(f"Error acquiring upload cleanup lock: {e}")
+        return 0
+    if token is None:
+        logger.info("Upload cleanup is running on another worker, skipped")
+        return 0
 
+    count = 0
+    reclaimed_bytes = 0
+    lock_held = True
+    try:
+        # 删除失败、仍留在索引里的会话数：下一批从它们之后取
+        skipped = 0
+        while True:
+            expired = multipart_session.list_expired(limit, skipped)
+            for uploader_id, upload_id in expired:
+                if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+                    # 不对应任何合法目录，直接移出索引
+                    multipart_session.delete(uploader_id, upload_id)
+                    continue
+                if multipart_session.exists(uploader_id, upload_id):
+                    # 取出后又收到分片、已续期的会话
+                    skipped += 1
+                    continue
+                reclaimed = _remove_upload_dir(_multipart_upload_dir(uploader_id, upload_id))
+                if reclaimed is None:
+                    skipped += 1
+                    continue
+                multipart_digest.discard(uploader_id, upload_id)
+                multipart_session.delete(uploader_id, upload_id)
+                reclaimed_bytes += reclaimed
+                count += 1
+            if len(expired) < limit:
+                break
+            if not multipart_session.extend_cleanup_lock(token):
+                logger.warning("Upload cleanup lock lost, stopping early")
+                lock_held = False
+                break
+        if lock_held and not multipart_session.legacy_sweep_done():
+            swept, swept_bytes, completed = _sweep_unindexed_upload_dirs(token, limit)
+            count += swept
+            reclaimed_bytes += swept_bytes
+            if completed:
+                multipart_session.mark_legacy_sweep_done()
+            else:
+                logger.warning("Upload cleanup lock lost during directory sweep, stopping early")
+        multipart_session.record_cleanup(count, reclaimed_bytes)
     except Exception as e:
         logger.exception(f"Error during cleanup_expired_uploads: {e}")
+    finally:
+        try:
+            multipart_session.release_cleanup_lock(token)
+        except Exception:
+            logger.debug("Failed to release upload cleanup lock")
 
+    if count:
+        logger.info(f"Cleaned up {count} expired uploads, reclaimed {reclaimed_bytes} bytes")
     return count
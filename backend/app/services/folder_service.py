@@ -1,18 +1,20 @@
 """文件夹 CRUD、缓存失效，以及整理任务的 Redis 分布式锁与入队。"""
 
 import uuid
-from typing import List
+from typing import List, cast
 
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from app.exceptions import PermissionDeniedError, ResourceNotFoundError
+from app.exceptions import BusinessRuleError, PermissionDeniedError, ResourceNotFoundError
 from app.extensions import redis_client
 from app.infra.cache import cacheable, evict_cache
+from app.infra.datetime_utils import beijing_now
 from app.infra.task_queue import publish_organize_task
 from app.models.file import File
 from app.models.folder import Folder
-from app.services import change_log_service
-from app.services.file_service import delete_file, _clear_search_cache
+from app.services import blob_store, change_log_service, listing_cache
+from app.services.file_service import release_deleted_files, _clear_search_cache
 
 ORGANIZE_TASK_LOCK_PREFIX = "organize:task:lock"
 ORGANIZE_TASK_LOCK_TTL_SECONDS = 6 * 60 * 60
@@ -21,6 +23,86 @@ FOLDER_CACHE_PREFIX = "user:folders"
 ROOT_FOLDER_CACHE_PREFIX = "user:root_folder"
 ROOT_FILES_CACHE_PREFIX = "user:root_files"
 FOLDER_CACHE_EXPIRE = 3600
+# 根目录 id 建号后不变，适合进程内缓存
+ROOT_FOLDER_LOCAL_TTL = 300
+
+# 物化路径：path 为展示路径（根目录为 "/"，不含根名），path_ids 为含自身的 id 链 "/1/5/9/"，
+# 按 COLLATE "C" 存储，前缀查询与区间扫描都能走普通 btree 索引。
+# 由行级触发器维护：BEFORE 按父目录算出本行路径，AFTER 把改名 / 移动整体平移到子树。
+# 先按从根到父的顺序给祖先链加共享锁，与并发的上层改名 / 移动串行，避免继承过期路径。
+PATH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION folder_path_before_write() RETURNS trigger AS $$
+DECLARE
+    parent_path     TEXT;
+    parent_path_ids TEXT;
+BEGIN
+    IF NEW.parent_id IS NULL THEN
+        NEW.path := '/';
+        NEW.path_ids := '/' || NEW.id || '/';
+        RETURN NEW;
+    END IF;
+
+    SELECT path_ids INTO parent_path_ids FROM folder WHERE id = NEW.parent_id;
+    IF parent_path_ids IS NOT NULL THEN
+        PERFORM 1 FROM folder
+        WHERE id = ANY (string_to_array(trim(BOTH '/' FROM parent_path_ids), '/')::INTEGER[])
+        ORDER BY length(path_ids)
+        FOR SHARE;
+    END IF;
+    SELECT path, path_ids INTO parent_path, parent_path_ids FROM folder WHERE id = NEW.parent_id;
+    -- 父目录不存在时留空，交给外键报错
+    IF parent_path_ids IS NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND parent_path_ids LIKE OLD.path_ids || '%' THEN
+        RAISE EXCEPTION 'folder % cannot be moved into its own subtree', NEW.id;
+    END IF;
+
+    NEW.path := rtrim(parent_path, '/') || '/' || NEW.name;
+    NEW.path_ids := parent_path_ids || NEW.id || '/';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION folder_path_after_update() RETURNS trigger AS $$
+BEGIN
+    IF NEW.path IS DISTINCT FROM OLD.path OR NEW.path_ids IS DISTINCT FROM OLD.path_ids THEN
+        UPDATE folder
+        SET path = rtrim(NEW.path, '/') || substr(path, length(rtrim(OLD.path, '/')) + 1),
+            path_ids = NEW.path_ids || substr(path_ids, length(OLD.path_ids) + 1)
+        -- 子孙的 path_ids 以本行为前缀，后接数字与 '/'，都小于 '~'；
+        -- 用区间而非 LIKE，缓存的通用计划也能走索引
+        WHERE path_ids > OLD.path_ids AND path_ids < OLD.path_ids || '~';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_folder_path_before_write ON folder;
+CREATE TRIGGER trg_folder_path_before_write BEFORE INSERT OR UPDATE OF name, parent_id ON folder
+    FOR EACH ROW EXECUTE FUNCTION folder_path_before_write();
+DROP TRIGGER IF EXISTS trg_folder_path_after_update ON folder;
+CREATE TRIGGER trg_folder_path_after_update AFTER UPDATE OF name, parent_id ON folder
+    FOR EACH ROW EXECUTE FUNCTION folder_path_after_update();
+"""
+
+# 升级时一次性回填：从各根目录递归展开（子树平移只改 path 列，不会触发上面的触发器）
+PATH_BACKFILL_SQL = """
+WITH RECURSIVE tree AS (
+    SELECT id, '/'::TEXT AS path, '/' || id || '/' AS path_ids
+    FROM folder
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT f.id, rtrim(t.path, '/') || '/' || f.name, t.path_ids || f.id || '/'
+    FROM folder f
+    JOIN tree t ON f.parent_id = t.id
+)
+UPDATE folder
+SET path = tree.path, path_ids = tree.path_ids
+FROM tree
+WHERE folder.id = tree.id
+  AND (folder.path, folder.path_ids) IS DISTINCT FROM (tree.path, tree.path_ids)
+"""
 
 
 def _organize_task_lock_key(user_id: int) -> str:
@@ -56,6 +138,7 @@ def create_folder(session: Session, data):
                 new_name=new_folder.name,
             )
 
+        listing_cache.bump_folders([new_folder.parent_id], new_folder.user_id)
         if new_folder.user_id:
             _invalidate_folder_caches(new_folder.user_id)
 
@@ -72,6 +155,11 @@ def get_folder(session: Session, id):
     return folder
 
 
+def subtree_query(session: Session, folder: Folder):
+    """folder 及其全部子孙目录：按物化路径前缀一次索引扫描。"""
+    return session.query(Folder).filter(Folder.path_ids.like(f"{folder.path_ids}%"))
+
+
 def get_authorized_folder(session: Session, user_id: int, role: str, folder_id: int) -> Folder:
     """非 admin 仅可访问自己的文件夹。"""
     folder = get_folder(session, folder_id)
@@ -88,6 +176,14 @@ def update_folder(session: Session, id, data):
         old_name = folder.name
         old_parent_id = folder.parent_id
 
+        new_parent_id = data.get("parent_id", old_parent_id)
+        if new_parent_id is not None and new_parent_id != old_parent_id:
+            new_parent = session.get(Folder, new_parent_id)
+            if new_parent and folder.path_ids and cast(str, new_parent.path_ids or "").startswith(
+                    cast(str, folder.path_ids)
+            ):
+                raise BusinessRuleError("Cannot move a folder into itself or its subfolder")
+
         folder.name = data.get("name", folder.name)
         folder.parent_id = data.get("parent_id", folder.parent_id)
         session.commit()
@@ -112,6 +208,10 @@ def update_folder(session: Session, id, data):
                 new_name=folder.name,
             )
 
+        if parent_changed:
+            listing_cache.bump_folder_chains(session, [old_parent_id, folder.parent_id], folder.user_id)
+        elif name_changed:
+            listing_cache.bump_folders([folder.parent_id], folder.user_id)
         if folder.user_id:
             _invalidate_folder_caches(folder.user_id)
 
@@ -122,80 +222,72 @@ def update_folder(session: Session, id, data):
         raise e
 
 
+# 整棵子树一条语句删除：子树按 path_ids 前缀走一次索引区间扫描；
+# 文件、分享、文件夹行批量删除，删除事件在同一事务里一次性写入 file_change_events。
+# 返回被删文件的 (file_path, content_hash)，物理文件由 blob 回收任务在后台删除。
+DELETE_SUBTREE_SQL = text("""
+WITH subtree AS (
+    SELECT id FROM folder WHERE path_ids LIKE :prefix
+),
+deleted_files AS (
+    DELETE FROM files
+    WHERE parent_id IN (SELECT id FROM subtree)
+    RETURNING id, parent_id, name, file_path, content_hash
+),
+deleted_shares AS (
+    DELETE FROM shares WHERE file_id IN (SELECT id FROM deleted_files)
+),
+deleted_folders AS (
+    DELETE FROM folder
+    WHERE id IN (SELECT id FROM subtree)
+    RETURNING id, parent_id, name
+),
+events AS (
+    INSERT INTO file_change_events
+        (user_id, entity_type, entity_id, action, old_parent_id, old_name, created_at)
+    SELECT CAST(:user_id AS INTEGER), entity_type, id, 'delete', parent_id, name, :now
+    FROM (
+        SELECT 'file' AS entity_type, id, parent_id, name FROM deleted_files
+        UNION ALL
+        SELECT 'folder', id, parent_id, name FROM deleted_folders
+    ) deleted
+    WHERE CAST(:user_id AS INTEGER) IS NOT NULL
+)
+SELECT file_path, content_hash FROM deleted_files
+""")
+
+
 def delete_folder(session: Session, id):
+    """删除文件夹及其整棵子树；物理文件释放引用后交给后台回收，不在请求内删盘。"""
     folder = session.get(Folder, id)
     if not folder:
         raise ResourceNotFoundError("Folder not found")
     user_id = folder.user_id
-    deleted_events: list[dict] = []
+    parent_id = folder.parent_id
 
     try:
-        # 先递归收集子树删除事件，最后统一 commit / 写变更日志
-        _delete_folder_recursive(session, folder, deleted_events)
-        deleted_events.append(
-            {
-                "entity_type": "folder",
-                "entity_id": folder.id,
-                "action": "delete",
-                "old_parent_id": folder.parent_id,
-                "new_parent_id": None,
-                "old_name": folder.name,
-                "new_name": None,
-            }
-        )
-
-        session.delete(folder)
+        rows = session.execute(
+            DELETE_SUBTREE_SQL,
+            {"prefix": f"{folder.path_ids}%", "user_id": user_id, "now": beijing_now()},
+        ).all()
+        legacy_paths = release_deleted_files(session, [(r.file_path, r.content_hash) for r in rows])
         session.commit()
-
-        if user_id and deleted_events:
-            change_log_service.log_events_batch(user_id, deleted_events)
-
-        if user_id:
-            _invalidate_folder_caches(user_id)
-            _clear_search_cache(user_id)
     except Exception as e:
         session.rollback()
         raise e
 
-
-def _delete_folder_recursive(session: Session, folder, deleted_events: list[dict]):
-    files = session.query(File).filter_by(parent_id=folder.id).all()
-    for file in files:
-        deleted_events.append(
-            {
-                "entity_type": "file",
-                "entity_id": file.id,
-                "action": "delete",
-                "old_parent_id": file.parent_id,
-                "new_parent_id": None,
-                "old_name": file.name,
-                "new_name": None,
-            }
-        )
-        # 递归删除时不单独 commit，由最外层 delete_folder 统一 commit
-        delete_file(session, file.id, commit=False, log_event=False)
-
-    subfolders = session.query(Folder).filter_by(parent_id=folder.id).all()
-    for subfolder in subfolders:
-        _delete_folder_recursive(session, subfolder, deleted_events)
-        deleted_events.append(
-            {
-                "entity_type": "folder",
-                "entity_id": subfolder.id,
-                "action": "delete",
-                "old_parent_id": subfolder.parent_id,
-                "new_parent_id": None,
-                "old_name": subfolder.name,
-                "new_name": None,
-            }
-        )
-        session.delete(subfolder)
+    blob_store.schedule_legacy_reap(legacy_paths)
+    listing_cache.bump_folder_chains(session, [parent_id], user_id)
+    if user_id:
+        _invalidate_folder_caches(user_id)
+        _clear_search_cache(user_id)
 
 
 @cacheable(
     prefix=ROOT_FOLDER_CACHE_PREFIX,
     expire=FOLDER_CACHE_EXPIRE,
     key=lambda session, user_id, **_: user_id,
+    local_ttl=ROOT_FOLDER_LOCAL_TTL,
 )
 def get_root_folder_id(session: Session, user_id) -> int | None:
     root_folder = session.query(Folder).filter_by(user_id=user_id, parent_id=None).first()
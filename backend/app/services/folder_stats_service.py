@@ -0,0 +1,338 @@
+"""每文件夹汇总（直属 / 子树字节数与文件数、最近变动时间）：读取是主键查询，不做递归聚合。
+
+计数由 files / folder 上的语句级触发器在写入事务内增量维护，沿物化路径 path_ids
+把增量一次性加到整条祖先链上：
+
+- 文件增删 / 移动 / 改大小：直属计数记到父目录，子树计数记到父目录及其全部祖先
+- 文件夹移动（含路径触发器对子孙的平移）：每个路径变化的文件夹把自己的直属计数
+  从旧祖先链挪到新祖先链；逐层都记直属值，嵌套移动也不会重复计算
+- 文件夹删除：从仍存在的祖先上扣掉被删文件夹的直属计数，再删掉汇总行；同一语句里
+  一并删除的文件因父目录已不存在而不再重复扣减
+
+``reconcile`` 定时逐用户重算，纠正触发器被禁用或手工改库带来的漂移。
+"""
+
+import logging
+from typing import Any
+
+from sqlalchemy import exists, func, text
+from sqlalchemy.orm import Session, aliased
+
+from app.infra import redis_lock
+from app.models.folder import Folder
+from app.models.folder_stats import FolderStats
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH_SIZE = 200
+RECONCILE_LOCK_KEY = "folder:stats:reconcile:lock"
+RECONCILE_LOCK_SECONDS = 600
+
+# path_ids "/1/5/9/" → 祖先链（含自身）
+_ANCESTORS = "unnest(string_to_array(trim(BOTH '/' FROM {path_ids}), '/')::INTEGER[])"
+
+# 增量 upsert；{deltas} 为按 folder_id 聚合的增量子查询，全零增量跳过，按 folder_id 顺序加锁防死锁
+_UPSERT_DELTAS = """
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM ({deltas}) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+"""
+
+# 变更的文件行 → 带符号的逐行增量；UPDATE 只取父目录或大小变了的行
+_FILE_ROWS = {
+    "new": "SELECT parent_id, 1 AS sign, COALESCE(file_size, 0) AS bytes FROM new_rows",
+    "old": "SELECT parent_id, -1 AS sign, COALESCE(file_size, 0) AS bytes FROM old_rows",
+    "moved": """
+        SELECT n.parent_id, 1 AS sign, COALESCE(n.file_size, 0) AS bytes
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+        UNION ALL
+        SELECT o.parent_id, -1, COALESCE(o.file_size, 0)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+    """,
+}
+
+# 父目录行加共享锁：与并发的移动串行，保证按提交后的祖先链记账；
+# 父目录已在同一语句里删除的行找不到路径，由文件夹删除触发器统一扣减
+_FILE_DELTAS = f"""
+    SELECT a.folder_id,
+           COALESCE(SUM(r.sign * r.bytes) FILTER (WHERE a.folder_id = r.parent_id), 0)::BIGINT
+               AS direct_bytes,
+           COALESCE(SUM(r.sign) FILTER (WHERE a.folder_id = r.parent_id), 0)::INTEGER
+               AS direct_file_count,
+           SUM(r.sign * r.bytes)::BIGINT AS total_bytes,
+           SUM(r.sign)::INTEGER AS total_file_count
+    FROM ({{rows}}) r
+    JOIN (
+        SELECT id, path_ids FROM folder
+        WHERE id IN (SELECT parent_id FROM ({{rows}}) pr)
+        ORDER BY id
+        FOR SHARE
+    ) p ON p.id = r.parent_id
+    CROSS JOIN LATERAL {_ANCESTORS.format(path_ids="p.path_ids")} AS a(folder_id)
+    GROUP BY a.folder_id
+"""
+
+# 路径变化的文件夹：直属计数从旧祖先链（不含自身）挪到新祖先链
+_FOLDER_MOVE_DELTAS = f"""
+    SELECT a.folder_id, 0::BIGINT AS direct_bytes, 0 AS direct_file_count,
+           SUM(m.sign * fs.direct_bytes)::BIGINT AS total_bytes,
+           SUM(m.sign * fs.direct_file_count)::INTEGER AS total_file_count
+    FROM (
+        SELECT o.id, o.path_ids, -1 AS sign
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.path_ids IS DISTINCT FROM n.path_ids
+        UNION ALL
+        SELECT n.id, n.path_ids, 1
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE o.path_ids IS DISTINCT FROM n.path_ids
+    ) m
+    JOIN folder_stats fs ON fs.folder_id = m.id
+    CROSS JOIN LATERAL {_ANCESTORS.format(path_ids="m.path_ids")} AS a(folder_id)
+    WHERE a.folder_id <> m.id
+    GROUP BY a.folder_id
+"""
+
+# 被删文件夹：从仍存在的祖先上扣掉直属计数
+_FOLDER_DELETE_DELTAS = f"""
+    SELECT a.folder_id, 0::BIGINT AS direct_bytes, 0 AS direct_file_count,
+           (-SUM(fs.direct_bytes))::BIGINT AS total_bytes,
+           (-SUM(fs.direct_file_count))::INTEGER AS total_file_count
+    FROM old_rows o
+    JOIN folder_stats fs ON fs.folder_id = o.id
+    CROSS JOIN LATERAL {_ANCESTORS.format(path_ids="o.path_ids")} AS a(folder_id)
+    WHERE a.folder_id NOT IN (SELECT id FROM old_rows)
+    GROUP BY a.folder_id
+"""
+
+TRIGGER_FUNCTIONS_SQL = f"""
+CREATE OR REPLACE FUNCTION folder_stats_files() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_UPSERT_DELTAS.format(deltas=_FILE_DELTAS.format(rows=_FILE_ROWS["new"]))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {_UPSERT_DELTAS.format(deltas=_FILE_DELTAS.format(rows=_FILE_ROWS["old"]))}
+    ELSE
+        {_UPSERT_DELTAS.format(deltas=_FILE_DELTAS.format(rows=_FILE_ROWS["moved"]))}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION folder_stats_folders() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        {_UPSERT_DELTAS.format(deltas=_FOLDER_MOVE_DELTAS)}
+    ELSE
+        {_UPSERT_DELTAS.format(deltas=_FOLDER_DELETE_DELTAS)}
+        DELETE FROM folder_stats WHERE folder_id IN (SELECT id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# 新建文件夹没有汇总行（等同全零），无需触发器
+TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS trg_files_folder_stats_insert ON files;
+CREATE TRIGGER trg_files_folder_stats_insert AFTER INSERT ON files
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_files_folder_stats_delete ON files;
+CREATE TRIGGER trg_files_folder_stats_delete AFTER DELETE ON files
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_files_folder_stats_update ON files;
+CREATE TRIGGER trg_files_folder_stats_update AFTER UPDATE ON files
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_folder_folder_stats_update ON folder;
+CREATE TRIGGER trg_folder_folder_stats_update AFTER UPDATE ON folder
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_folders();
+DROP TRIGGER IF EXISTS trg_folder_folder_stats_delete ON folder;
+CREATE TRIGGER trg_folder_folder_stats_delete AFTER DELETE ON folder
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_folders();
+"""
+
+# 对账前补齐该用户全部文件夹的汇总行并按 folder_id 顺序锁住（与触发器 upsert 同序，不互相死锁）
+_ENSURE_ROWS_SQL = text(
+    """
+    INSERT INTO folder_stats (folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count)
+    SELECT id, 0, 0, 0, 0 FROM folder WHERE user_id = :user_id ORDER BY id
+    ON CONFLICT (folder_id) DO NOTHING
+    """
+)
+_LOCK_ROWS_SQL = text(
+    """
+    SELECT s.folder_id
+    FROM folder_stats s
+    JOIN folder f ON f.id = s.folder_id
+    WHERE f.user_id = :user_id
+    ORDER BY s.folder_id
+    FOR UPDATE OF s
+    """
+)
+
+# 重算已锁住的文件夹（须为同一用户的全部文件夹，子树才完整）；只有与现值不同的行才会
+# 被改写并返回，用于统计漂移。last_modified_at 已有值时保留，新行取子树内最新文件的创建时间
+_RECONCILE_SQL = text(
+    f"""
+    WITH f AS (
+        SELECT id, path_ids FROM folder WHERE id = ANY(:folder_ids)
+    ),
+    direct AS (
+        SELECT parent_id AS folder_id,
+               SUM(COALESCE(file_size, 0))::BIGINT AS bytes,
+               COUNT(*)::INTEGER AS file_count,
+               MAX(created_at) AS newest
+        FROM files
+        WHERE parent_id IN (SELECT id FROM f)
+        GROUP BY parent_id
+    ),
+    total AS (
+        SELECT a.folder_id,
+               SUM(d.bytes)::BIGINT AS bytes,
+               SUM(d.file_count)::INTEGER AS file_count,
+               MAX(d.newest) AS newest
+        FROM direct d
+        JOIN f ON f.id = d.folder_id
+        CROSS JOIN LATERAL {_ANCESTORS.format(path_ids="f.path_ids")} AS a(folder_id)
+        GROUP BY a.folder_id
+    )
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT f.id,
+           COALESCE(d.bytes, 0), COALESCE(d.file_count, 0),
+           COALESCE(t.bytes, 0), COALESCE(t.file_count, 0),
+           t.newest
+    FROM f
+    LEFT JOIN direct d ON d.folder_id = f.id
+    LEFT JOIN total t ON t.folder_id = f.id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = EXCLUDED.direct_bytes,
+        direct_file_count = EXCLUDED.direct_file_count,
+        total_bytes = EXCLUDED.total_bytes,
+        total_file_count = EXCLUDED.total_file_count,
+        last_modified_at = COALESCE(s.last_modified_at, EXCLUDED.last_modified_at)
+    WHERE (s.direct_bytes, s.direct_file_count, s.total_bytes, s.total_file_count)
+          IS DISTINCT FROM
+          (EXCLUDED.direct_bytes, EXCLUDED.direct_file_count,
+           EXCLUDED.total_bytes, EXCLUDED.total_file_count)
+    RETURNING s.folder_id
+    """
+)
+
+_PRUNE_SQL = text(
+    "DELETE FROM folder_stats s WHERE NOT EXISTS (SELECT 1 FROM folder WHERE id = s.folder_id)"
+)
+
+
+def rollup_dict(stats: FolderStats | None) -> dict[str, Any]:
+    """汇总行序列化；没有行时返回全零。"""
+    if stats is None:
+        return {
+            "direct_bytes": 0,
+            "direct_file_count": 0,
+            "total_bytes": 0,
+            "total_file_count": 0,
+            "last_modified_at": None,
+        }
+    return stats.to_dict()
+
+
+def _has_subfolder():
+    child = aliased(Folder)
+    return exists().where(child.parent_id == Folder.id)
+
+
+def find_empty_folders(session: Session, user_id: int) -> list[Folder]:
+    """没有直属文件、也没有子文件夹的目录：按汇总行判断，子目录走 parent_id 索引。"""
+    return (
+        session.query(Folder)
+        .outerjoin(FolderStats, FolderStats.folder_id == Folder.id)
+        .filter(Folder.user_id == user_id)
+        .filter(func.coalesce(FolderStats.direct_file_count, 0) == 0)
+        .filter(~_has_subfolder())
+        .order_by(Folder.id)
+        .all()
+    )
+
+
+def find_mixed_folders(session: Session, user_id: int) -> list[Folder]:
+    """既有直属文件又有子文件夹的目录（违反单一内容原则）。"""
+    return (
+        session.query(Folder)
+        .join(FolderStats, FolderStats.folder_id == Folder.id)
+        .filter(Folder.user_id == user_id, FolderStats.direct_file_count > 0)
+        .filter(_has_subfolder())
+        .order_by(Folder.id)
+        .all()
+    )
+
+
+def reconcile(session: Session, batch_size: int = RECONCILE_BATCH_SIZE) -> int | None:
+    """逐用户重算文件夹汇总，返回被纠正的文件夹数；其他 worker 正在对账时返回 None。
+
+    与用户存储计数的对账相同：每个用户一个短事务，先锁住其全部汇总行再重算，
+    该用户的触发器增量排队叠加，其余用户的文件写入不受影响。
+    """
+    token = redis_lock.acquire(RECONCILE_LOCK_KEY, RECONCILE_LOCK_SECONDS)
+    if not token:
+        return None
+    corrected = 0
+    last_id = 0
+    try:
+        while True:
+            user_ids = [
+                user_id
+                for (user_id,) in session.query(User.id)
+                .filter(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+                .all()
+            ]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            for user_id in user_ids:
+                try:
+                    session.execute(_ENSURE_ROWS_SQL, {"user_id": user_id})
+                    folder_ids = list(session.scalars(_LOCK_ROWS_SQL, {"user_id": user_id}))
+                    if folder_ids:
+                        corrected += len(
+                            session.execute(_RECONCILE_SQL, {"folder_ids": folder_ids}).all()
+                        )
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+            if not redis_lock.extend(RECONCILE_LOCK_KEY, token, RECONCILE_LOCK_SECONDS):
+                logger.warning("Folder stats reconcile lock lost, stopping early")
+                break
+        try:
+            session.execute(_PRUNE_SQL)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    finally:
+        redis_lock.release(RECONCILE_LOCK_KEY, token)
+    if corrected:
+        logger.warning(f"Folder stats reconciled, corrected {corrected} folders")
+    return corrected
@@ -0,0 +1,53 @@
+"""文件名 + AI 描述全文检索：files.search_tsv 为生成列（文件名权重 A、描述权重 B），GIN 索引。
+
+PostgreSQL 内置解析器不切分中文：cjk_bigrams() 把连续的中日韩字符展开为重叠二元组，
+其余文本原样交给 simple 配置按空白 / 标点切词（发票号、代码标识符等保持整词）。
+查询串走同一函数，词项按 AND 匹配，结果按 ts_rank_cd 排序；单个汉字的查询只能命中同样孤立出现的字。
+"""
+
+from sqlalchemy import func, literal_column
+
+# 中日韩字符：平假名 / 片假名、统一表意文字（含扩展 A）、兼容表意文字、韩文音节；
+# 由 PostgreSQL 正则按 \uXXXX 转义解析
+_CJK_CLASS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+
+# 生成列依赖的分词函数必须 IMMUTABLE；改写函数体不会重算已存的列值，需要时手动 UPDATE 重建
+SCHEMA_SQL = r"""
+CREATE OR REPLACE FUNCTION cjk_bigrams(input TEXT) RETURNS TEXT AS $$
+DECLARE
+    run    TEXT;
+    result TEXT;
+BEGIN
+    IF input IS NULL THEN
+        RETURN '';
+    END IF;
+    result := regexp_replace(input, '[__CJK__]+', ' ', 'g');
+    FOR run IN SELECT m[1] FROM regexp_matches(input, '([__CJK__]+)', 'g') AS m LOOP
+        IF char_length(run) = 1 THEN
+            result := result || ' ' || run;
+        ELSE
+            FOR i IN 1 .. char_length(run) - 1 LOOP
+                result := result || ' ' || substr(run, i, 2);
+            END LOOP;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', cjk_bigrams(name)), 'A')
+        || setweight(to_tsvector('simple', cjk_bigrams(description)), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_files_search_tsv ON files USING gin (search_tsv);
+""".replace("__CJK__", _CJK_CLASS)
+
+# 生成列不映射到 File 模型：ORM 写入无需感知，普通查询也不必取回 tsvector
+SEARCH_VECTOR = literal_column("files.search_tsv")
+
+
+def match_and_rank(query: str):
+    """返回 ``(匹配条件, 排序分)`` 两个表达式，供 files 查询直接使用。"""
+    tsquery = func.plainto_tsquery("simple", func.cjk_bigrams(query))
+    return SEARCH_VECTOR.op("@@")(tsquery), func.ts_rank_cd(SEARCH_VECTOR, tsquery)
@@ -0,0 +1,97 @@
+"""目录列表页缓存：按 (用户, 父目录, 排序, 游标 / 页码) 缓存整页结果，按目录代数精确失效。
+
+每个目录一个代数计数器，目录内任何变更（文件增删改名、索引状态、子目录增删改名移动）
+提交后 INCR；页缓存键里带着读取时的代数，变更后旧页不再被命中，由 TTL 自然清理，
+其它目录的缓存页不受影响。列表里的子目录带子树汇总，文件增删 / 移动会改动祖先链上
+各级的汇总，因此整条祖先链一起 +1。
+
+键布局：
+- ``listing:gen:{folder_id}``      目录代数
+- ``listing:user_gen:{user_id}``   用户代数：parent_id 为空的列表，以及只知道用户时的整体失效
+- ``listing:page:{user_id}:{parent_id}:{user_gen}.{gen}:{digest}``  页结果 JSON
+
+读写失败只记日志：代数读不到时换一次性键（等同不走缓存），+1 失败时页缓存最多旧到 TTL。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.infra.cache import bump_generations, read_generations
+from app.models.folder import Folder
+
+logger = logging.getLogger(__name__)
+
+LISTING_CACHE_PREFIX = "listing:page"
+LISTING_CACHE_EXPIRE = max(10, int(os.getenv("LISTING_CACHE_EXPIRE_SECONDS", "600")))
+# 代数须比页缓存活得久：代数键过期归零后，旧的零代数页早已过期
+GEN_EXPIRE_SECONDS = max(LISTING_CACHE_EXPIRE * 2, 7 * 24 * 3600)
+
+GEN_PREFIX = "listing:gen"
+USER_GEN_PREFIX = "listing:user_gen"
+
+
+def _gen_key(folder_id: int) -> str:
+    return f"{GEN_PREFIX}:{folder_id}"
+
+
+def _user_gen_key(user_id: int) -> str:
+    return f"{USER_GEN_PREFIX}:{user_id}"
+
+
+def page_key(user_id: int, parent_id: int | None, variant: Any) -> str:
+    """拼当前代数下的页缓存键后缀（不含前缀）；``variant`` 为排序 / 分页等其余参数。"""
+    digest = hashlib.sha1(
+        json.dumps(variant, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    gen_keys = [_user_gen_key(user_id)]
+    if parent_id is not None:
+        gen_keys.append(_gen_key(parent_id))
+    gens = read_generations(*gen_keys)
+    if gens is None:
+        return f"{user_id}:{parent_id}:nocache-{uuid.uuid4().hex}:{digest}"
+    user_gen, folder_gen = gens[0], gens[1] if len(gens) > 1 else 0
+    return f"{user_id}:{parent_id}:{user_gen}.{folder_gen}:{digest}"
+
+
+def bump_folders(folder_ids: Iterable[int | None], user_id: int | None = None) -> None:
+    """目录直属内容变化（提交后调用）：各目录代数 +1；None 表示 parent_id 为空的列表。"""
+    keys = set()
+    for folder_id in folder_ids:
+        if folder_id is not None:
+            keys.add(_gen_key(folder_id))
+        elif user_id:
+            keys.add(_user_gen_key(user_id))
+    bump_generations(keys, GEN_EXPIRE_SECONDS)
+
+
+def bump_folder_chains(
+        session: Session, folder_ids: Iterable[int | None], user_id: int | None = None
+) -> None:
+    """文件增删 / 移动、子目录移动（提交后调用）：目录本身及其全部祖先代数 +1。
+
+    祖先链取自物化路径，一次 IN 查询；查询失败退化为整用户失效。
+    """
+    folder_ids = set(folder_ids)
+    chain_ids: set[int | None] = set(folder_ids)
+    wanted = [folder_id for folder_id in folder_ids if folder_id is not None]
+    if wanted:
+        try:
+            for path_ids in session.scalars(select(Folder.path_ids).where(Folder.id.in_(wanted))):
+                chain_ids.update(int(part) for part in (path_ids or "").strip("/").split("/") if part)
+        except Exception as e:
+            logger.warning(f"[listing] load ancestor chain failed: {e}")
+            if user_id:
+                bump_user(user_id)
+    bump_folders(chain_ids, user_id)
+
+
+def bump_user(user_id: int) -> None:
+    """只知道用户、不知道具体目录时（整理 Agent 的多步改动）整体失效该用户的全部列表页。"""
+    bump_generations([_user_gen_key(user_id)], GEN_EXPIRE_SECONDS)
@@ -0,0 +1,122 @@
+"""分片上传的增量 SHA-256：分片按序到达时边写边算，合并阶段无需回读整文件。
+
+hashlib 状态无法序列化，只能保存在当前进程内。会话落到其它进程、被淘汰或出现
+重传时，``take`` 返回的 ``hashed_chunks`` 会变小，合并阶段从该处续算剩余分片，
+因此最终摘要始终与整文件 SHA-256 一致。
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+MAX_TRACKED_SESSIONS = max(16, int(os.getenv("UPLOAD_MAX_TRACKED_DIGESTS", "1024")))
+
+
+@dataclass(slots=True)
+class _SessionDigest:
+    digest: Any = field(default_factory=hashlib.sha256)
+    hashed_chunks: int = 0  # [0, hashed_chunks) 已计入 digest
+    busy: bool = False  # 有请求正在基于副本续算，防止重复计入
+
+
+_sessions: "OrderedDict[tuple[int, str], _SessionDigest]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _touch(key: tuple[int, str], create: bool) -> _SessionDigest | None:
+    """取会话状态并刷新 LRU 次序；超出上限时淘汰最久未用的会话。"""
+    state = _sessions.get(key)
+    if state is None:
+        if not create:
+            return None
+        state = _SessionDigest()
+        _sessions[key] = state
+        while len(_sessions) > MAX_TRACKED_SESSIONS:
+            _sessions.popitem(last=False)
+    _sessions.move_to_end(key)
+    return state
+
+
+def claim(uploader_id: int, upload_id: str, chunk_index: int) -> Any | None:
+    """chunk_index 恰为下一个待算分片时返回 digest 副本，供写盘时同步更新。
+
+    重传已计入的分片会丢弃会话状态，交由合并阶段重算，避免内容不一致。
+    """
+    key = (uploader_id, upload_id)
+    with _lock:
+        state = _touch(key, create=chunk_index == 0)
+        if state is None:
+            return None
+        if chunk_index < state.hashed_chunks:
+            _sessions.pop(key, None)
+            return None
+        if state.busy or chunk_index != state.hashed_chunks:
+            return None
+        state.busy = True
+        return state.digest.copy()
+
+
+def release(uploader_id: int, upload_id: str, chunk_index: int, digest: Any | None) -> None:
+    """归还 claim：写入成功传入更新后的副本，失败传 None 仅解除占用。"""
+    key = (uploader_id, upload_id)
+    with _lock:
+        state = _sessions.get(key)
+        if state is None:
+            return
+        state.busy = False
+        if digest is not None and state.hashed_chunks == chunk_index:
+            state.digest = digest
+            state.hashed_chunks = chunk_index + 1
+
+
+def advance(
+        uploader_id: int,
+        upload_id: str,
+        total_chunks: int,
+        feed_chunk: Callable[[Any, int], bool],
+) -> None:
+    """把已落盘且紧随 hashed_chunks 的分片补算进摘要（处理乱序到达）。
+
+    ``feed_chunk(digest, idx)`` 在分片已收齐时把其内容写入 digest 并返回 True。
+    """
+    key = (uploader_id, upload_id)
+    with _lock:
+        state = _sessions.get(key)
+        if state is None or state.busy:
+            return
+        state.busy = True
+        digest = state.digest.copy()
+        start = state.hashed_chunks
+
+    idx = start
+    try:
+        while idx < total_chunks and feed_chunk(digest, idx):
+            idx += 1
+    except OSError:
+        digest = None
+    finally:
+        with _lock:
+            state = _sessions.get(key)
+            if state is not None:
+                state.busy = False
+                if digest is not None and state.hashed_chunks == start:
+                    state.digest = digest
+                    state.hashed_chunks = idx
+
+
+def take(uploader_id: int, upload_id: str) -> tuple[Any, int]:
+    """取出并移除会话摘要；无可用状态时返回全新 digest 与 0。"""
+    with _lock:
+        state = _sessions.pop((uploader_id, upload_id), None)
+    if state is None or state.busy:
+        return hashlib.sha256(), 0
+    return state.digest, state.hashed_chunks
+
+
+def discard(uploader_id: int, upload_id: str) -> None:
+    """会话中止或过期清理时释放内存。"""
+    with _lock:
+        _sessions.pop((uploader_id, upload_id), None)
@@ -0,0 +1,218 @@
+"""分片上传会话状态：元数据与已收分片位图存 Redis，替代 meta.json + listdir。
+
+键布局（uid = 上传者 id）：
+- ``upload:session:{uid}:{upload_id}``  会话元数据 JSON
+- ``upload:chunks:{uid}:{upload_id}``   已收分片位图（SETBIT，第 i 位即分片 i）
+- ``upload:sessions:expiry``            ZSET，member 为 ``{uid}:{upload_id}``，score 为过期时间戳
+- ``upload:cleanup:lock``               清理任务分布式锁，多 worker 同时只有一个在清理
+- ``upload:cleanup:stats``              清理指标（累计会话数 / 回收字节 / 上次运行）
+- ``upload:cleanup:legacy_swept``       已做过一次 MULTIPART_ROOT 兜底遍历的标记
+
+每收到一个分片即续期 TTL 并刷新 ZSET 分数；定时清理只按分数取过期会话，
+目录删除成功后才移出索引，清理中途崩溃的会话下一轮仍能取到。
+索引建立前遗留的目录由一次性遍历兜底回收。
+"""
+
+import json
+import os
+import time
+from typing import Any
+
+from app.extensions import redis_client
+from app.infra import redis_lock
+
+SESSION_TTL_SECONDS = max(60, int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600))))
+EXPIRY_INDEX_KEY = "upload:sessions:expiry"
+CLEANUP_LOCK_KEY = "upload:cleanup:lock"
+CLEANUP_STATS_KEY = "upload:cleanup:stats"
+LEGACY_SWEEP_KEY = "upload:cleanup:legacy_swept"
+CLEANUP_LOCK_SECONDS = max(30, int(os.getenv("UPLOAD_CLEANUP_LOCK_SECONDS", "600")))
+
+# 置位并续期，一次往返返回已收分片数；会话已不存在时返回 -1，避免位图脱离元数据残留
+_MARK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+redis.call('SETBIT', KEYS[2], ARGV[1], 1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+return redis.call('BITCOUNT', KEYS[2])
+"""
+
+# 把位图压缩成闭区间列表 [s1, e1, s2, e2, ...]；全 0 / 全 1 字节整体跳过
+_RANGES_SCRIPT = """
+local bitmap = redis.call('GET', KEYS[1]) or ''
+local total = tonumber(ARGV[1])
+local result = {}
+local start = -1
+local idx = 0
+while idx < total do
+    local byte = string.byte(bitmap, math.floor(idx / 8) + 1) or 0
+    if idx % 8 == 0 and idx + 8 <= total and (byte == 0 or byte == 255) then
+        local bit = byte == 255
+        if bit and start < 0 then
+            start = idx
+        elseif not bit and start >= 0 then
+            table.insert(result, start)
+            table.insert(result, idx - 1)
+            start = -1
+        end
+        idx = idx + 8
+    else
+        local bit = math.floor(byte / 2 ^ (7 - idx % 8)) % 2 == 1
+        if bit and start < 0 then
+            start = idx
+        elseif not bit and start >= 0 then
+            table.insert(result, start)
+            table.insert(result, idx - 1)
+            start = -1
+        end
+        idx = idx + 1
+    end
+end
+if start >= 0 then
+    table.insert(result, start)
+    table.insert(result, total - 1)
+end
+return result
+"""
+
+
+def _meta_key(uploader_id: int, upload_id: str) -> str:
+    return f"upload:session:{uploader_id}:{upload_id}"
+
+
+def _chunks_key(uploader_id: int, upload_id: str) -> str:
+    return f"upload:chunks:{uploader_id}:{upload_id}"
+
+
+def _expiry_member(uploader_id: int, upload_id: str) -> str:
+    return f"{uploader_id}:{upload_id}"
+
+
+def create(
+        uploader_id: int, upload_id: str, meta: dict[str, Any]
+) -> tuple[dict[str, Any], bool]:
+    """登记新会话，返回 ``(元数据, 是否新建)``；已存在时返回原元数据供调用方比对冲突。"""
+    created = redis_client.set(
+        _meta_key(uploader_id, upload_id),
+        json.dumps(meta, ensure_ascii=False),
+        nx=True,
+        ex=SESSION_TTL_SECONDS,
+    )
+    if not created:
+        existing = load(uploader_id, upload_id)
+        if existing is not None:
+            return existing, False
+        # 旧键恰好在 NX 与 GET 之间过期
+        redis_client.set(
+            _meta_key(uploader_id, upload_id),
+            json.dumps(meta, ensure_ascii=False),
+            ex=SESSION_TTL_SECONDS,
+        )
+    redis_client.zadd(
+        EXPIRY_INDEX_KEY,
+        {_expiry_member(uploader_id, upload_id): time.time() + SESSION_TTL_SECONDS},
+    )
+    return meta, True
+
+
+def load(uploader_id: int, upload_id: str) -> dict[str, Any] | None:
+    raw = redis_client.get(_meta_key(uploader_id, upload_id))
+    if raw is None:
+        return None
+    return json.loads(raw)
+
+
+def mark_received(uploader_id: int, upload_id: str, chunk_index: int) -> int:
+    """记录分片已落盘并续期会话，返回已收分片总数；会话不存在时返回 -1。"""
+    return int(redis_client.eval(
+        _MARK_SCRIPT,
+        3,
+        _meta_key(uploader_id, upload_id),
+        _chunks_key(uploader_id, upload_id),
+        EXPIRY_INDEX_KEY,
+        chunk_index,
+        SESSION_TTL_SECONDS,
+        time.time() + SESSION_TTL_SECONDS,
+        _expiry_member(uploader_id, upload_id),
+    ))
+
+
+def is_received(uploader_id: int, upload_id: str, chunk_index: int) -> bool:
+    return bool(redis_client.getbit(_chunks_key(uploader_id, upload_id), chunk_index))
+
+
+def received_count(uploader_id: int, upload_id: str) -> int:
+    return int(redis_client.bitcount(_chunks_key(uploader_id, upload_id)))
+
+
+def received_ranges(uploader_id: int, upload_id: str, total_chunks: int) -> list[list[int]]:
+    """已收分片的闭区间列表，如 ``[[0, 99], [120, 130]]``。"""
+    flat = redis_client.eval(
+        _RANGES_SCRIPT, 1, _chunks_key(uploader_id, upload_id), total_chunks
+    )
+    return [[int(flat[i]), int(flat[i + 1])] for i in range(0, len(flat), 2)]
+
+
+def exists(uploader_id: int, upload_id: str) -> bool:
+    return bool(redis_client.exists(_meta_key(uploader_id, upload_id)))
+
+
+def delete(uploader_id: int, upload_id: str) -> None:
+    pipe = redis_client.pipeline()
+    pipe.delete(_meta_key(uploader_id, upload_id), _chunks_key(uploader_id, upload_id))
+    pipe.zrem(EXPIRY_INDEX_KEY, _expiry_member(uploader_id, upload_id))
+    pipe.execute()
+
+
+def list_expired(limit: int = 500, offset: int = 0) -> list[tuple[int, str]]:
+    """按过期时间取一批到期会话，不移出索引：调用方删完目录后以 ``delete`` 移出。
+
+    offset 用于跳过本轮删除失败、仍留在索引里的会话。
+    """
+    members = redis_client.zrangebyscore(
+        EXPIRY_INDEX_KEY, "-inf", time.time(), start=offset, num=limit
+    )
+    expired = []
+    for member in members:
+        uploader_id, _, upload_id = member.partition(":")
+        if uploader_id.isdigit() and upload_id:
+            expired.append((int(uploader_id), upload_id))
+    return expired
+
+
+def legacy_sweep_done() -> bool:
+    return bool(redis_client.exists(LEGACY_SWEEP_KEY))
+
+
+def mark_legacy_sweep_done() -> None:
+    redis_client.set(LEGACY_SWEEP_KEY, int(time.time()))
+
+
+def acquire_cleanup_lock() -> str | None:
+    """抢清理锁，成功返回 token；锁有 TTL，持有者崩溃后自动释放。"""
+    return redis_lock.acquire(CLEANUP_LOCK_KEY, CLEANUP_LOCK_SECONDS)
+
+
+def extend_cleanup_lock(token: str) -> bool:
+    """续期清理锁；锁已过期或易主返回 False，调用方应停止清理。"""
+    return redis_lock.extend(CLEANUP_LOCK_KEY, token, CLEANUP_LOCK_SECONDS)
+
+
+def release_cleanup_lock(token: str) -> None:
+    redis_lock.release(CLEANUP_LOCK_KEY, token)
+
+
+def record_cleanup(sessions: int, reclaimed_bytes: int) -> None:
+    """累加清理指标，供运维面板 / 告警读取：``HGETALL upload:cleanup:stats``。"""
+    pipe = redis_client.pipeline()
+    pipe.hincrby(CLEANUP_STATS_KEY, "sessions_total", sessions)
+    pipe.hincrby(CLEANUP_STATS_KEY, "reclaimed_bytes_total", reclaimed_bytes)
+    pipe.hset(CLEANUP_STATS_KEY, mapping={
+        "last_run_at": int(time.time()),
+        "last_sessions": sessions,
+        "last_reclaimed_bytes": reclaimed_bytes,
+    })
+    pipe.execute()
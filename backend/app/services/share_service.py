@@ -1,12 +1,12 @@
 """文件分享：创建/取消分享链接，按 token 解析可下载文件（含过期校验）。"""
 
-import os
 from datetime import datetime
 
 from sqlalchemy.orm import Session
 
 from app.exceptions import BusinessRuleError, ResourceNotFoundError
 from app.infra.datetime_utils import beijing_now, to_beijing_naive
+from app.infra.storage import storage
 from app.models.file import File
 from app.models.share import Share
 
@@ -86,6 +86,6 @@ def resolve_shared_file(session: Session, token: str) -> File:
     if not share:
         raise ResourceNotFoundError("Link invalid or expired")
     file = share.file
-    if not file or not os.path.exists(file.get_abs_path()):
+    if not file or not storage.exists(file.file_path):
         raise ResourceNotFoundError("File not found")
     return file
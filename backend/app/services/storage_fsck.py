@@ -0,0 +1,287 @@
+"""存储一致性巡检（fsck）：把 files.file_path 与存储中的对象按 key 字节序归并比对。
+
+- 孤儿对象（存储有、库里无）：首次发现只打脏标记；超过宽限期复核仍无引用，才移入隔离区
+  ``.fsck/quarantine/<key>``，保留期满后真正删除，误判可人工移回
+- 缺失对象（库里有、存储无）：记入缺失清单并告警，不自动改库；隔离区里有同 key 时直接移回
+- 游标存 Redis，每轮最多处理 FSCK_BATCH_KEYS 个 key，下一轮接着走，一整遍后回到开头
+- 按 FSCK_KEYS_PER_SECOND 限速，避免与在线读写抢 IO
+
+键布局：
+- ``storage:fsck:lock``        运行锁，多 worker 同时只有一个在巡检
+- ``storage:fsck:cursor``      上一轮处理到的 key
+- ``storage:fsck:candidates``  ZSET，孤儿候选，score 为首次发现时间
+- ``storage:fsck:quarantine``  ZSET，已隔离对象的原 key，score 为隔离时间
+- ``storage:fsck:missing``     HASH，缺失对象 key → 首次发现时间
+- ``storage:fsck:stats``       运行指标
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.extensions import redis_client
+from app.infra import redis_lock
+from app.infra.storage import storage
+from app.models.blob import Blob
+from app.models.file import File
+from app.services import blob_store, derivative_cache
+
+logger = logging.getLogger(__name__)
+
+FSCK_BATCH_KEYS = max(100, int(os.getenv("STORAGE_FSCK_BATCH_KEYS", "20000")))
+FSCK_KEYS_PER_SECOND = max(1, int(os.getenv("STORAGE_FSCK_KEYS_PER_SECOND", "200")))
+ORPHAN_GRACE_SECONDS = int(os.getenv("STORAGE_FSCK_ORPHAN_GRACE_SECONDS", str(24 * 3600)))
+QUARANTINE_RETENTION_SECONDS = int(
+    os.getenv("STORAGE_FSCK_QUARANTINE_RETENTION_SECONDS", str(7 * 24 * 3600))
+)
+
+LOCK_KEY = "storage:fsck:lock"
+CURSOR_KEY = "storage:fsck:cursor"
+CANDIDATES_KEY = "storage:fsck:candidates"
+QUARANTINE_KEY = "storage:fsck:quarantine"
+MISSING_KEY = "storage:fsck:missing"
+STATS_KEY = "storage:fsck:stats"
+
+QUARANTINE_ROOT = ".fsck/quarantine"
+# 分片暂存 / 上传临时区 / 预览衍生物不登记在 files 表，由各自的清理逻辑负责
+SKIP_PREFIXES = (".multipart/", ".incoming/", f"{derivative_cache.DERIVATIVE_ROOT}/", ".fsck/")
+
+LOCK_SECONDS = max(300, 2 * FSCK_BATCH_KEYS // FSCK_KEYS_PER_SECOND)
+_LOCK_EXTEND_EVERY = 1000
+_THROTTLE_EVERY = 100
+_DB_FETCH_SIZE = 1000
+_REDIS_CHUNK = 1000
+
+
+@dataclass(slots=True)
+class FsckReport:
+    scanned: int = 0
+    orphans: int = 0
+    quarantined: int = 0
+    missing: int = 0
+    restored: int = 0
+    purged: int = 0
+    pass_completed: bool = False
+
+
+def _db_keys(session: Session, start_after: str) -> Iterator[str]:
+    """服务端游标按 COLLATE "C"（即字节序）流式读出 file_path，去重后逐个产出。"""
+    stmt = (
+        select(File.file_path)
+        .where(File.file_path.collate("C") > start_after)
+        .order_by(File.file_path.collate("C"))
+        .execution_options(yield_per=_DB_FETCH_SIZE)
+    )
+    previous = None
+    for key in session.scalars(stmt):
+        if key != previous and not key.startswith(SKIP_PREFIXES):
+            yield key
+        previous = key
+
+
+def _file_row_exists(session: Session, key: str) -> bool:
+    return session.scalar(select(File.id).where(File.file_path == key).limit(1)) is not None
+
+
+def _is_referenced(session: Session, key: str) -> bool:
+    if _file_row_exists(session, key):
+        return True
+    # blobs 行在而 files 行不在（计数漂移）时也不动文件，交给计数对账
+    if key.startswith(f"{blob_store.BLOB_ROOT}/"):
+        content_hash = key.rsplit("/", 1)[-1]
+        return session.get(Blob, content_hash) is not None
+    return False
+
+
+def _quarantine_key(key: str) -> str:
+    return f"{QUARANTINE_ROOT}/{key}"
+
+
+class _Throttle:
+    """按 keys/s 限速：每处理一小批就对照已耗时补足睡眠。"""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.count = 0
+        self.started = time.monotonic()
+
+    def tick(self) -> None:
+        self.count += 1
+        if self.count % _THROTTLE_EVERY:
+            return
+        ahead = self.count / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _handle_orphan(session: Session, key: str, now: float, report: FsckReport) -> None:
+    report.orphans += 1
+    first_seen = redis_client.zscore(CANDIDATES_KEY, key)
+    if first_seen is None:
+        # 首次发现只打脏标记：可能是刚放置、事务尚未提交的上传
+        redis_client.zadd(CANDIDATES_KEY, {key: now})
+        return
+    if now - first_seen < ORPHAN_GRACE_SECONDS:
+        return
+    if _is_referenced(session, key):
+        redis_client.zrem(CANDIDATES_KEY, key)
+        return
+
+    storage.move(key, _quarantine_key(key))
+    if _is_referenced(session, key):
+        # 复核与移动之间被秒传 / 重新上传引用：移回
+        storage.move(_quarantine_key(key), key)
+        redis_client.zrem(CANDIDATES_KEY, key)
+        return
+    pipe = redis_client.pipeline()
+    pipe.zrem(CANDIDATES_KEY, key)
+    pipe.zadd(QUARANTINE_KEY, {key: now})
+    pipe.execute()
+    report.quarantined += 1
+    logger.warning(f"fsck quarantined orphan object {key}")
+
+
+def _handle_missing(key: str, now: float, report: FsckReport) -> None:
+    if redis_client.zscore(QUARANTINE_KEY, key) is not None:
+        # 隔离后又被引用（与上传并发的极端情况）：从隔离区移回
+        storage.move(_quarantine_key(key), key)
+        redis_client.zrem(QUARANTINE_KEY, key)
+        report.restored += 1
+        logger.warning(f"fsck restored {key} from quarantine")
+        return
+    report.missing += 1
+    if redis_client.hsetnx(MISSING_KEY, key, int(now)):
+        logger.error(f"fsck found file row without object: {key}")
+
+
+def _clear_marks(keys: list[str]) -> None:
+    """对象与库一致：撤销之前的脏标记 / 缺失记录。"""
+    for i in range(0, len(keys), _REDIS_CHUNK):
+        chunk = keys[i:i + _REDIS_CHUNK]
+        pipe = redis_client.pipeline()
+        pipe.zrem(CANDIDATES_KEY, *chunk)
+        pipe.hdel(MISSING_KEY, *chunk)
+        pipe.execute()
+
+
+def _scan(session: Session, token: str, max_keys: int, report: FsckReport) -> None:
+    cursor = redis_client.get(CURSOR_KEY) or ""
+    now = time.time()
+    # 标记集合为空时（常态）无需为每个一致的 key 清标记
+    track_matched = bool(redis_client.zcard(CANDIDATES_KEY) or redis_client.hlen(MISSING_KEY))
+    matched: list[str] = []
+
+    db_iter = _db_keys(session, cursor)
+    storage_iter = storage.iter_keys(cursor, SKIP_PREFIXES)
+    db_key = next(db_iter, None)
+    storage_key = next(storage_iter, None)
+    throttle = _Throttle(FSCK_KEYS_PER_SECOND)
+    last = cursor
+
+    while db_key is not None or storage_key is not None:
+        if report.scanned >= max_keys:
+            break
+        if report.scanned and report.scanned % _LOCK_EXTEND_EVERY == 0:
+            if not redis_lock.extend(LOCK_KEY, token, LOCK_SECONDS):
+                logger.warning("fsck lock lost, stopping early")
+                break
+
+        if storage_key is None or (db_key is not None and db_key < storage_key):
+            _handle_missing(db_key, now, report)
+            last, db_key = db_key, next(db_iter, None)
+        elif db_key is None or storage_key < db_key:
+            _handle_orphan(session, storage_key, now, report)
+            last, storage_key = storage_key, next(storage_iter, None)
+        else:
+            if track_matched:
+                matched.append(db_key)
+            last = db_key
+            db_key, storage_key = next(db_iter, None), next(storage_iter, None)
+        report.scanned += 1
+        throttle.tick()
+    else:
+        report.pass_completed = True
+
+    _clear_marks(matched)
+    if report.pass_completed:
+        redis_client.delete(CURSOR_KEY)
+    else:
+        redis_client.set(CURSOR_KEY, last)
+
+
+def _prune_stale_marks(session: Session) -> None:
+    """一整遍结束：候选对象已不存在、缺失记录的行已删除或对象已补回的，一并清掉。"""
+    stale = [key for key, _ in redis_client.zscan_iter(CANDIDATES_KEY) if not storage.exists(key)]
+    for i in range(0, len(stale), _REDIS_CHUNK):
+        redis_client.zrem(CANDIDATES_KEY, *stale[i:i + _REDIS_CHUNK])
+
+    resolved = [
+        key for key, _ in redis_client.hscan_iter(MISSING_KEY)
+        if storage.exists(key) or not _file_row_exists(session, key)
+    ]
+    for i in range(0, len(resolved), _REDIS_CHUNK):
+        redis_client.hdel(MISSING_KEY, *resolved[i:i + _REDIS_CHUNK])
+
+
+def _purge_quarantine(now: float) -> int:
+    """删除隔离满保留期的对象。"""
+    purged = 0
+    while True:
+        expired = redis_client.zrangebyscore(
+            QUARANTINE_KEY, "-inf", now - QUARANTINE_RETENTION_SECONDS, start=0, num=_REDIS_CHUNK
+        )
+        if not expired:
+            return purged
+        for key in expired:
+            storage.delete(_quarantine_key(key))
+        redis_client.zrem(QUARANTINE_KEY, *expired)
+        purged += len(expired)
+
+
+def _record(report: FsckReport) -> None:
+    """累加巡检指标：``HGETALL storage:fsck:stats``。"""
+    pipe = redis_client.pipeline()
+    pipe.hincrby(STATS_KEY, "scanned_total", report.scanned)
+    pipe.hincrby(STATS_KEY, "quarantined_total", report.quarantined)
+    pipe.hincrby(STATS_KEY, "restored_total", report.restored)
+    pipe.hincrby(STATS_KEY, "purged_total", report.purged)
+    if report.pass_completed:
+        pipe.hincrby(STATS_KEY, "passes_total", 1)
+        pipe.hset(STATS_KEY, "last_pass_completed_at", int(time.time()))
+    pipe.hset(STATS_KEY, mapping={
+        "last_run_at": int(time.time()),
+        "last_scanned": report.scanned,
+        "last_orphans": report.orphans,
+        "last_missing": report.missing,
+    })
+    pipe.execute()
+
+
+def run_fsck(session: Session, max_keys: int = FSCK_BATCH_KEYS) -> FsckReport | None:
+    """巡检一轮；其他 worker 正在巡检时返回 None。只读数据库，调用方负责关闭 session。"""
+    token = redis_lock.acquire(LOCK_KEY, LOCK_SECONDS)
+    if not token:
+        return None
+    report = FsckReport()
+    try:
+        _scan(session, token, max_keys, report)
+        if report.pass_completed:
+            _prune_stale_marks(session)
+        report.purged = _purge_quarantine(time.time())
+        _record(report)
+    finally:
+        session.rollback()
+        redis_lock.release(LOCK_KEY, token)
+
+    logger.info(
+        f"fsck scanned {report.scanned} keys: {report.orphans} orphans "
+        f"({report.quarantined} quarantined), {report.missing} missing, "
+        f"{report.restored} restored, {report.purged} purged"
+        + (", pass completed" if report.pass_completed else "")
+    )
+    return report
@@ -0,0 +1,304 @@
+"""每用户存储计数与配额：读计数是主键查询，不再对 files 做 SUM / COUNT / GROUP BY。
+
+计数由 files / folder 上的语句级触发器（transition table）在写入事务内增量维护，
+批量 INSERT / DELETE 与 ORM 单行写入走同一套逻辑，调用方无需逐处记账。
+``reconcile`` 定时逐用户重算，纠正触发器被禁用或手工改库带来的漂移。
+
+配额是软限制：检查与写入之间不加锁，并发上传可能略微超出。
+"""
+
+import logging
+import os
+from typing import Any, cast
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.exceptions import PayloadTooLargeError, ResourceNotFoundError
+from app.infra import redis_lock
+from app.models.user import User
+from app.models.user_storage_stats import UserStorageStats
+
+logger = logging.getLogger(__name__)
+
+# 0 表示不限
+DEFAULT_QUOTA_BYTES = max(0, int(os.getenv("STORAGE_DEFAULT_QUOTA_BYTES", "0")))
+RECONCILE_BATCH_SIZE = 500
+# 多 worker 只有一个在对账；每批用户处理完续期
+RECONCILE_LOCK_KEY = "storage:stats:reconcile:lock"
+RECONCILE_LOCK_SECONDS = 600
+
+# 计数增量 upsert；{deltas} 为按 user_id 聚合的增量子查询。
+# 全零增量（重命名、移动、写描述等）直接跳过，不去碰计数行；按 user_id 顺序加锁防死锁
+_UPSERT_DELTAS = """
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM ({deltas}) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+"""
+
+# 变更行 → 带符号的逐行增量（新行 +1，旧行 -1）；状态为空按 pending 计
+_FILE_ROWS = """
+    SELECT uploader_id AS user_id, {sign} AS sign,
+           COALESCE(file_size, 0) AS bytes, COALESCE(status, 'pending') AS status
+    FROM {table}
+"""
+
+_FILE_DELTAS = """
+    SELECT user_id,
+           SUM(sign * bytes)::BIGINT AS total_bytes,
+           SUM(sign)::INTEGER AS file_count,
+           0 AS folder_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0)::INTEGER AS pending_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'processing'), 0)::INTEGER AS processing_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'success'), 0)::INTEGER AS success_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'fail'), 0)::INTEGER AS fail_count
+    FROM ({rows}) r
+    GROUP BY user_id
+"""
+
+_FOLDER_DELTAS = """
+    SELECT user_id, 0::BIGINT AS total_bytes, 0 AS file_count,
+           ({sign} * COUNT(*))::INTEGER AS folder_count,
+           0 AS pending_count, 0 AS processing_count, 0 AS success_count, 0 AS fail_count
+    FROM {table}
+    GROUP BY user_id
+"""
+
+
+def _file_deltas(*sources: tuple[str, int]) -> str:
+    rows = " UNION ALL ".join(_FILE_ROWS.format(table=table, sign=sign) for table, sign in sources)
+    return _FILE_DELTAS.format(rows=rows)
+
+
+# 语句级触发器：一条批量语句只做一次按用户聚合的 upsert。
+# 各分支的 transition table 名不同，必须写成静态 SQL（未声明的表在解析期就会报错）。
+TRIGGER_FUNCTIONS_SQL = f"""
+CREATE OR REPLACE FUNCTION user_storage_stats_files() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_UPSERT_DELTAS.format(deltas=_file_deltas(("new_rows", 1)))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {_UPSERT_DELTAS.format(deltas=_file_deltas(("old_rows", -1)))}
+    ELSE
+        {_UPSERT_DELTAS.format(deltas=_file_deltas(("new_rows", 1), ("old_rows", -1)))}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_storage_stats_folders() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_UPSERT_DELTAS.format(deltas=_FOLDER_DELTAS.format(table="new_rows", sign=1))}
+    ELSE
+        {_UPSERT_DELTAS.format(deltas=_FOLDER_DELTAS.format(table="old_rows", sign=-1))}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# 每种事件一个触发器（声明 transition table 的触发器只能绑定单一事件，
+# 且 UPDATE 不能带列清单；不影响计数的更新在 upsert 里按全零增量过滤）
+TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS trg_files_stats_insert ON files;
+CREATE TRIGGER trg_files_stats_insert AFTER INSERT ON files
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_files_stats_delete ON files;
+CREATE TRIGGER trg_files_stats_delete AFTER DELETE ON files
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_files_stats_update ON files;
+CREATE TRIGGER trg_files_stats_update AFTER UPDATE ON files
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_folder_stats_insert ON folder;
+CREATE TRIGGER trg_folder_stats_insert AFTER INSERT ON folder
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_folders();
+DROP TRIGGER IF EXISTS trg_folder_stats_delete ON folder;
+CREATE TRIGGER trg_folder_stats_delete AFTER DELETE ON folder
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_folders();
+"""
+
+# 对账前先补齐计数行再锁住：之后该用户的触发器增量都排在对账事务之后
+_ENSURE_ROW_SQL = text(
+    """
+    INSERT INTO user_storage_stats (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    VALUES (:user_id, 0, 0, 0, 0, 0, 0, 0, timezone('Asia/Shanghai', now()))
+    ON CONFLICT (user_id) DO NOTHING
+    """
+)
+_LOCK_ROW_SQL = text("SELECT 1 FROM user_storage_stats WHERE user_id = :user_id FOR UPDATE")
+
+# 按用户重算；只有与现值不同的行才会被改写并返回，用于统计漂移
+_RECONCILE_SQL = text(
+    """
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT u.id,
+           COALESCE(f.total_bytes, 0), COALESCE(f.file_count, 0), COALESCE(d.folder_count, 0),
+           COALESCE(f.pending_count, 0), COALESCE(f.processing_count, 0),
+           COALESCE(f.success_count, 0), COALESCE(f.fail_count, 0),
+           timezone('Asia/Shanghai', now())
+    FROM users u
+    LEFT JOIN (
+        SELECT uploader_id,
+               SUM(COALESCE(file_size, 0))::BIGINT AS total_bytes,
+               COUNT(*)::INTEGER AS file_count,
+               COUNT(*) FILTER (WHERE COALESCE(status, 'pending') = 'pending')::INTEGER AS pending_count,
+               COUNT(*) FILTER (WHERE status = 'processing')::INTEGER AS processing_count,
+               COUNT(*) FILTER (WHERE status = 'success')::INTEGER AS success_count,
+               COUNT(*) FILTER (WHERE status = 'fail')::INTEGER AS fail_count
+        FROM files
+        WHERE uploader_id = ANY(:user_ids)
+        GROUP BY uploader_id
+    ) f ON f.uploader_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*)::INTEGER AS folder_count
+        FROM folder
+        WHERE user_id = ANY(:user_ids)
+        GROUP BY user_id
+    ) d ON d.user_id = u.id
+    WHERE u.id = ANY(:user_ids)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = EXCLUDED.total_bytes,
+        file_count = EXCLUDED.file_count,
+        folder_count = EXCLUDED.folder_count,
+        pending_count = EXCLUDED.pending_count,
+        processing_count = EXCLUDED.processing_count,
+        success_count = EXCLUDED.success_count,
+        fail_count = EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at
+    WHERE (s.total_bytes, s.file_count, s.folder_count, s.pending_count,
+           s.processing_count, s.success_count, s.fail_count)
+          IS DISTINCT FROM
+          (EXCLUDED.total_bytes, EXCLUDED.file_count, EXCLUDED.folder_count, EXCLUDED.pending_count,
+           EXCLUDED.processing_count, EXCLUDED.success_count, EXCLUDED.fail_count)
+    RETURNING s.user_id
+    """
+)
+
+
+def _empty_stats(user_id: int) -> UserStorageStats:
+    return UserStorageStats(
+        user_id=user_id,
+        total_bytes=0,
+        file_count=0,
+        folder_count=0,
+        pending_count=0,
+        processing_count=0,
+        success_count=0,
+        fail_count=0,
+        quota_bytes=None,
+    )
+
+
+def _effective_quota(stats: UserStorageStats) -> int:
+    quota = cast(int | None, stats.quota_bytes)
+    return DEFAULT_QUOTA_BYTES if quota is None else quota
+
+
+def get_stats(session: Session, user_id: int) -> dict[str, Any]:
+    """存储概览；quota_bytes 为生效配额（0 表示不限）。"""
+    stats = session.get(UserStorageStats, user_id) or _empty_stats(user_id)
+    data = stats.to_dict()
+    data["quota_bytes"] = _effective_quota(stats)
+    return data
+
+
+def ensure_quota(session: Session, user_id: int | None, incoming_bytes: int) -> None:
+    """写入前按计数判断配额，超出抛 PayloadTooLargeError；主键查询，不扫 files。"""
+    if not user_id or incoming_bytes <= 0:
+        return
+    stats = session.get(UserStorageStats, user_id) or _empty_stats(user_id)
+    quota = _effective_quota(stats)
+    if quota <= 0:
+        return
+    used = cast(int, stats.total_bytes)
+    if used + incoming_bytes > quota:
+        raise PayloadTooLargeError(
+            f"Storage quota exceeded: {used} of {quota} bytes used, {incoming_bytes} more requested"
+        )
+
+
+def set_quota(session: Session, user_id: int, quota_bytes: int | None) -> dict[str, Any]:
+    """设置用户配额；None 恢复全局默认，0 表示不限。"""
+    if not session.get(User, user_id):
+        raise ResourceNotFoundError("User not found")
+    stats = session.get(UserStorageStats, user_id)
+    if stats is None:
+        stats = _empty_stats(user_id)
+        session.add(stats)
+    stats.quota_bytes = quota_bytes
+    session.commit()
+    return get_stats(session, user_id)
+
+
+def reconcile(session: Session, batch_size: int = RECONCILE_BATCH_SIZE) -> int | None:
+    """逐用户重算计数，返回被纠正的用户数；其他 worker 正在对账时返回 None。
+
+    每个用户一个短事务：先 FOR UPDATE 锁住其计数行，再在新语句的快照里重算。
+    锁住前已写计数的事务已提交、在快照内；之后的写在触发器处排队，释放锁后再叠加，
+    结果不会重复或丢失。其余用户的写入不受影响。
+    """
+    token = redis_lock.acquire(RECONCILE_LOCK_KEY, RECONCILE_LOCK_SECONDS)
+    if not token:
+        return None
+    corrected = 0
+    last_id = 0
+    try:
+        while True:
+            user_ids = [
+                user_id
+                for (user_id,) in session.query(User.id)
+                .filter(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+                .all()
+            ]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            for user_id in user_ids:
+                try:
+                    session.execute(_ENSURE_ROW_SQL, {"user_id": user_id})
+                    session.execute(_LOCK_ROW_SQL, {"user_id": user_id})
+                    corrected += len(session.execute(_RECONCILE_SQL, {"user_ids": [user_id]}).all())
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+            if not redis_lock.extend(RECONCILE_LOCK_KEY, token, RECONCILE_LOCK_SECONDS):
+                logger.warning("Storage stats reconcile lock lost, stopping early")
+                break
+    finally:
+        redis_lock.release(RECONCILE_LOCK_KEY, token)
+    if corrected:
+        logger.warning(f"Storage stats reconciled, corrected {corrected} users")
+    return corrected
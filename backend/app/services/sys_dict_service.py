@@ -21,7 +21,8 @@ def _ensure_non_model_config_key(key: str | None) -> None:
 
 
 def _invalidate_sys_dict_cache() -> None:
-    evict_cache(SYS_DICT_CACHE_PREFIX)
+    # 与 _get_sys_dict_all_cached 的键 "sys_dict:all" + ":all" 对齐
+    evict_cache(SYS_DICT_CACHE_PREFIX, "all")
 
 
 def create_sys_dict(session: Session, data):
@@ -9,6 +9,8 @@ from app.services import folder_service
 
 USER_CACHE_PREFIX = "user:profile"
 USER_CACHE_EXPIRE = 3600
+# get_current_user 每个请求都读，进程内再缓存一层
+USER_CACHE_LOCAL_TTL = 30
 
 
 def create_user(session: Session, data):
@@ -29,6 +31,7 @@ def create_user(session: Session, data):
     prefix=USER_CACHE_PREFIX,
     expire=USER_CACHE_EXPIRE,
     key=lambda session, id, **_: id,
+    local_ttl=USER_CACHE_LOCAL_TTL,
 )
 def _get_user_data(session: Session, id: int) -> dict | None:
     """缓存友好：返回 dict；None 表示不存在（不会被缓存）。"""
@@ -9,6 +9,7 @@ import logging
 import mimetypes
 import tempfile
 from pathlib import Path
+from typing import Callable
 
 import cv2
 from docx import Document
@@ -65,8 +66,12 @@ def image_to_base64(image_path: str) -> str:
     return f"data:{mime_type};base64,{encoded_string}"
 
 
-def _get_visual_urls(local_path: str) -> list:
-    """按类型转成 VL 可读的图片 Data URI 列表；音频直接拒绝。"""
+def _get_visual_urls(local_path: str, on_preview: Callable[[str], None] | None = None) -> list:
+    """按类型转成 VL 可读的图片 Data URI 列表；音频直接拒绝。
+
+    on_preview 在临时目录清理前收到一张代表图（文档首页 / 视频中间帧 / 原图），
+    供生成缩略图，避免为预览再渲染一遍。
+    """
     path = Path(local_path)
     ext = path.suffix.lower()
     image_uris = []
@@ -84,6 +89,8 @@ def _get_visual_urls(local_path: str) -> list:
                 )
                 images = convert_pdf_to_images(
                     target_pdf, tmpdir, max_pages=20)
+                if images and on_preview:
+                    on_preview(images[0])
                 for img_path in images:
                     uri = image_to_base64(img_path)
                     if uri:
@@ -92,11 +99,16 @@ def _get_visual_urls(local_path: str) -> list:
             elif ext in VIDEO_EXTENSIONS:
                 frames = extract_video_frames(
                     local_path, tmpdir, frame_count=20)
+                if frames and on_preview:
+                    # 首帧常为黑场，取中间帧
+                    on_preview(frames[len(frames) // 2])
                 for img_path in frames:
                     uri = image_to_base64(img_path)
                     if uri:
                         image_uris.append(uri)
             elif ext in IMAGE_EXTENSIONS:
+                if on_preview:
+                    on_preview(local_path)
                 image_uris.append(image_to_base64(local_path))
             elif ext in TEXT_EXTENSIONS:
                 return []  # 文本路径不需要视觉帧
@@ -151,7 +163,11 @@ def _generate_text_description(local_path: str, config: dict, user_id: int = 0)
 
 
 def generate_file_description(
-        local_path: str, config: dict, chat_config: dict | None = None, user_id: int = 0
+        local_path: str,
+        config: dict,
+        chat_config: dict | None = None,
+        user_id: int = 0,
+        on_preview: Callable[[str], None] | None = None,
 ) -> str:
     """生成中文文件描述：文本走 Chat，其余走 VL。
 
@@ -159,6 +175,7 @@ def generate_file_description(
     :param config: VL 模型配置（api/key/model）
     :param chat_config: 可选 Chat 配置；缺省回退到 config
     :param user_id: 用于 Token 记账
+    :param on_preview: 可选，收到渲染出的代表图路径（见 ``_get_visual_urls``）
     """
     from app.services.llm_client import chat_completion
 
@@ -169,7 +186,7 @@ def generate_file_description(
         text_config = chat_config or config
         return _generate_text_description(local_path, text_config, user_id=user_id)
 
-    visual_contents = _get_visual_urls(local_path)
+    visual_contents = _get_visual_urls(local_path, on_preview)
     if not visual_contents:
         logger.info(f"No visual content for {local_path}")
 
@@ -1,4 +1,4 @@
-"""格式转换工具：Office→PDF、PDF→图、视频抽帧，供描述生成链路使用。
+"""格式转换工具：Office→PDF、PDF→图、视频抽帧、缩略图编码，供描述生成与预览链路使用。
 
 仅做本地转换，不访问 LLM / DB；LibreOffice 路径可通过 LIBREOFFICE_PATH 覆盖。
 """
@@ -118,3 +118,22 @@ def extract_video_frames(video_path, output_dir, frame_count=5):
     except Exception as e:
         logger.error(f"Error extracting video frames: {e}")
     return image_paths
+
+
+def render_thumbnail(image_path, max_edge=320, quality=80):
+    """等比缩到长边 max_edge 并编码为 WebP 字节；读不了图返回 None。"""
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(1, int(width * scale)), max(1, int(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    ok, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    if not ok:
+        return None
+    return encoded.tobytes()
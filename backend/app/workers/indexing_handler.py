@@ -6,21 +6,57 @@
 
 import datetime
 import logging
+import os
+from typing import cast
 
 from app.exceptions import ResourceNotFoundError
 from app.extensions import SessionLocal
+from app.infra.storage import storage
 from app.models.file import File
-from app.services import file_service, inbox_service
+from app.services import blob_store, derivative_cache, file_service, inbox_service, listing_cache
 from app.services.model_config import (
     get_chat_model_config,
     get_embedding_model_config,
     get_vl_model_config,
 )
 from app.workers.description_generator import generate_file_description
+from app.workers.format_converter import render_thumbnail
 
 logger = logging.getLogger(__name__)
 
 
+def _source_path(file: File):
+    """描述生成按扩展名分流，而 blob key 不带扩展名：按原文件名补扩展名取本地路径。"""
+    ext = os.path.splitext(cast(str, file.name or ""))[1].lower()
+    return storage.local_path(cast(str, file.file_path), suffix=ext)
+
+
+def _thumbnail_saver(file: File):
+    """描述生成途中拿到的代表图顺手存成缩略图；同内容已有缩略图则不再生成。"""
+    file_id = cast(int, file.id)
+    content_hash = cast(str | None, file.content_hash)
+    if not content_hash or derivative_cache.has_thumbnail(content_hash):
+        return None
+    # 只有 blob 会被回收并连带删除衍生物；旧数据文件不做写后复查
+    source_key = cast(str, file.file_path) if blob_store.is_blob_file(file) else None
+
+    def save(image_path: str) -> None:
+        # 缩略图只是预览缓存，失败不影响索引
+        try:
+            data = render_thumbnail(image_path)
+            if data:
+                derivative_cache.save_thumbnail(content_hash, data, source_key)
+        except Exception as e:
+            logger.warning(f"Failed to save thumbnail for file {file_id}: {e}")
+
+    return save
+
+
+def _touch_listing(file: File) -> None:
+    """状态 / 描述已提交：所在目录的列表页缓存失效。"""
+    listing_cache.bump_folders([file.parent_id], file.uploader_id)
+
+
 def handle_file_indexing(file_id: int) -> None:
     """索引单个文件：processing → 描述 → 向量 → success；异常则 fail + 通知。"""
     session = SessionLocal()
@@ -35,18 +71,20 @@ def handle_file_indexing(file_id: int) -> None:
 
         file.status = "processing"
         session.commit()
+        _touch_listing(file)
 
         vl_config = get_vl_model_config()
         chat_config = get_chat_model_config()
         emb_config = get_embedding_model_config()
 
-        abs_path = file.get_abs_path()
-
         # 文本走 Chat，其它走 VL
-        description = generate_file_description(
-            abs_path, vl_config, chat_config, user_id=file.uploader_id or 0)
+        with _source_path(file) as source_path:
+            description = generate_file_description(
+                source_path, vl_config, chat_config, user_id=file.uploader_id or 0,
+                on_preview=_thumbnail_saver(file))
         file.description = description
         session.commit()
+        _touch_listing(file)
 
         # 文件名拼进 embedding 文本，使纯文件名查询也能命中
         embedding_text = f"文件名: {file.name}\n{description}"
@@ -55,6 +93,8 @@ def handle_file_indexing(file_id: int) -> None:
 
         file.status = "success"
         session.commit()
+        _touch_listing(file)
+        file_service._clear_search_cache(file.uploader_id)
         logger.info(f"Finished indexing file ID: {file_id} successfully.")
 
     except Exception as e:
@@ -65,6 +105,7 @@ def handle_file_indexing(file_id: int) -> None:
         if file:
             file.status = "fail"
             session.commit()
+            _touch_listing(file)
 
             inbox_service.create_inbox_message(
                 session,
@@ -92,6 +133,7 @@ def _mark_file_failed(session, file_id: int, error: Exception) -> None:
         if file:
             file.status = "fail"
             session.commit()
+            _touch_listing(file)
 
             inbox_service.create_inbox_message(
                 session,
@@ -133,12 +175,15 @@ def handle_batch_indexing(file_ids: list[int]) -> None:
                     f"[Batch] Starting description for: {file.name} (ID: {file_id})")
                 file.status = "processing"
                 session.commit()
+                _touch_listing(file)
 
-                abs_path = file.get_abs_path()
-                description = generate_file_description(
-                    abs_path, vl_config, chat_config, user_id=file.uploader_id or 0)
+                with _source_path(file) as source_path:
+                    description = generate_file_description(
+                        source_path, vl_config, chat_config, user_id=file.uploader_id or 0,
+                        on_preview=_thumbnail_saver(file))
                 file.description = description
                 session.commit()
+                _touch_listing(file)
 
                 described_files.append((file, description))
                 logger.info(
@@ -170,6 +215,8 @@ def handle_batch_indexing(file_ids: list[int]) -> None:
                 file.vector_info = vector
                 file.status = "success"
                 session.commit()
+                _touch_listing(file)
+                file_service._clear_search_cache(file.uploader_id)
                 logger.info(
                     f"[Batch] Finished indexing file ID: {file.id} successfully.")
             except Exception as e:
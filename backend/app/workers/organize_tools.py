@@ -7,11 +7,12 @@
 import logging
 
 from langchain.tools import tool
-from sqlalchemy import func
 
 from app.extensions import SessionLocal, redis_client
 from app.models.file import File
 from app.models.folder import Folder
+from app.services import folder_stats_service, listing_cache
+from app.services.file_service import _clear_search_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,17 +23,11 @@ def get_session():
 
 
 def clear_user_cache(user_id):
-    """目录变更后清文件夹缓存与搜索缓存；SCAN 代替 KEYS 避免阻塞 Redis。"""
+    """目录变更后清文件夹缓存，并按代数整体失效该用户的搜索与列表页缓存。"""
+    listing_cache.bump_user(user_id)
+    _clear_search_cache(user_id)
     try:
         redis_client.delete(f"user:folders:{user_id}")
-        cursor = 0
-        pattern = f"search:*:{user_id}:*"
-        while True:
-            cursor, keys = redis_client.scan(cursor=cursor, match=pattern, count=100)
-            if keys:
-                redis_client.delete(*keys)
-            if cursor == 0:
-                break
     except Exception as e:
         logger.error(f"Error clearing cache for user {user_id}: {e}")
 
@@ -40,7 +35,7 @@ def clear_user_cache(user_id):
 def _check_mixed_folders(session, user_id: int) -> tuple[bool, list[dict]]:
     """查找「文件+子文件夹共存」的目录（违反单一内容原则）。
 
-    返回 (is_clean, mixed_folders_list)；用聚合计数消除 N+1。
+    返回 (is_clean, mixed_folders_list)；直属文件数读文件夹汇总，不再对全表聚合。
     """
     mixed_folders: list[dict] = []
 
@@ -50,52 +45,18 @@ def _check_mixed_folders(session, user_id: int) -> tuple[bool, list[dict]]:
     if has_root_subfolders and has_root_files:
         mixed_folders.append({"id": 0, "name": "根目录"})
 
-    subfolder_counts = dict(
-        session.query(Folder.parent_id, func.count(Folder.id))
-        .filter(Folder.parent_id.isnot(None))
-        .group_by(Folder.parent_id)
-        .all()
-    )
-    file_counts = dict(
-        session.query(File.parent_id, func.count(File.id))
-        .filter(File.parent_id.isnot(None))
-        .group_by(File.parent_id)
-        .all()
-    )
-
-    folders = session.query(Folder).filter_by(user_id=user_id).all()
-    for folder in folders:
-        has_subfolders = subfolder_counts.get(folder.id, 0) > 0
-        has_files = file_counts.get(folder.id, 0) > 0
-        if has_subfolders and has_files:
-            mixed_folders.append({"id": folder.id, "name": folder.name})
+    for folder in folder_stats_service.find_mixed_folders(session, user_id):
+        mixed_folders.append({"id": folder.id, "name": folder.name})
 
     return len(mixed_folders) == 0, mixed_folders
 
 
 def _check_empty_folders(session, user_id: int) -> tuple[bool, list[dict]]:
-    """查找空文件夹；聚合计数消除 N+1。"""
-    subfolder_counts = dict(
-        session.query(Folder.parent_id, func.count(Folder.id))
-        .filter(Folder.parent_id.isnot(None))
-        .group_by(Folder.parent_id)
-        .all()
-    )
-    file_counts = dict(
-        session.query(File.parent_id, func.count(File.id))
-        .filter(File.parent_id.isnot(None))
-        .group_by(File.parent_id)
-        .all()
-    )
-
-    folders = session.query(Folder).filter_by(user_id=user_id).all()
-    empty_folders: list[dict] = []
-    for folder in folders:
-        has_subfolders = subfolder_counts.get(folder.id, 0) > 0
-        has_files = file_counts.get(folder.id, 0) > 0
-        if not has_subfolders and not has_files:
-            empty_folders.append({"id": folder.id, "name": folder.name})
-
+    """查找空文件夹；直属文件数读文件夹汇总，不再对全表聚合。"""
+    empty_folders = [
+        {"id": folder.id, "name": folder.name}
+        for folder in folder_stats_service.find_empty_folders(session, user_id)
+    ]
     return len(empty_folders) == 0, empty_folders
 
 
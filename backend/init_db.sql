@@ -2,8 +2,9 @@
 -- 注意：此脚本仅用于初始化空数据库，若表已存在可能会报错或跳过。
 -- 建议在执行前清空数据库或确保无冲突。
 
--- 1. 创建 pgvector 扩展 (如果尚未存在)
+-- 1. 创建 pgvector 扩展 (如果尚未存在)；pg_trgm 供文件名模糊搜索
 CREATE EXTENSION IF NOT EXISTS vector;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- 2. 创建用户表
 CREATE TABLE IF NOT EXISTS users
@@ -27,8 +28,15 @@ CREATE TABLE IF NOT EXISTS folder
     name       VARCHAR(255) NOT NULL,
     parent_id  INTEGER REFERENCES folder (id) ON DELETE CASCADE,
     user_id    INTEGER REFERENCES users (id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT timezone('Asia/Shanghai', now())
+    created_at TIMESTAMP DEFAULT timezone('Asia/Shanghai', now()),
+    -- 物化路径，由下方触发器维护：path 为展示路径，path_ids 为含自身的 id 链 /1/5/9/
+    path       TEXT,
+    path_ids   TEXT COLLATE "C"
 );
+CREATE INDEX IF NOT EXISTS idx_folder_path_ids ON folder (path_ids);
+CREATE INDEX IF NOT EXISTS idx_folder_parent_name_id ON folder (parent_id, name, id);
+-- 名称模糊搜索（ILIKE 子串 / pg_trgm 相似度）
+CREATE INDEX IF NOT EXISTS idx_folder_name_trgm ON folder USING gin (name gin_trgm_ops);
 
 -- 4. 创建文件表
 CREATE TABLE IF NOT EXISTS files
@@ -53,6 +61,546 @@ CREATE INDEX IF NOT EXISTS file_vector_idx ON files USING hnsw (vector_info vect
 CREATE INDEX IF NOT EXISTS idx_files_uploader_parent ON files (uploader_id, parent_id);
 CREATE INDEX IF NOT EXISTS idx_files_uploader_status ON files (uploader_id, status);
 CREATE INDEX IF NOT EXISTS idx_files_content_hash_size ON files (content_hash, file_size);
+CREATE INDEX IF NOT EXISTS idx_files_file_path ON files (file_path);
+-- 存储巡检按字节序（与对象存储列举顺序一致）流式读取 file_path
+CREATE INDEX IF NOT EXISTS idx_files_file_path_c ON files (file_path COLLATE "C");
+-- 目录游标分页：(parent_id, 排序键, id)
+CREATE INDEX IF NOT EXISTS idx_files_parent_name_id ON files (parent_id, name, id);
+CREATE INDEX IF NOT EXISTS idx_files_parent_created_id ON files (parent_id, COALESCE(created_at, '1970-01-01 00:00:00'::timestamp), id);
+CREATE INDEX IF NOT EXISTS idx_files_parent_size_id ON files (parent_id, COALESCE(file_size, -1), id);
+-- 文件名模糊搜索（ILIKE 子串 / pg_trgm 相似度）
+CREATE INDEX IF NOT EXISTS idx_files_name_trgm ON files USING gin (name gin_trgm_ops);
+
+-- 文件名 + AI 描述全文检索：连续中日韩字符展开为重叠二元组后按 simple 配置切词（与 fulltext_service 一致）
+CREATE OR REPLACE FUNCTION cjk_bigrams(input TEXT) RETURNS TEXT AS $$
+DECLARE
+    run    TEXT;
+    result TEXT;
+BEGIN
+    IF input IS NULL THEN
+        RETURN '';
+    END IF;
+    result := regexp_replace(input, '[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+', ' ', 'g');
+    FOR run IN SELECT m[1] FROM regexp_matches(input, '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+)', 'g') AS m LOOP
+        IF char_length(run) = 1 THEN
+            result := result || ' ' || run;
+        ELSE
+            FOR i IN 1 .. char_length(run) - 1 LOOP
+                result := result || ' ' || substr(run, i, 2);
+            END LOOP;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', cjk_bigrams(name)), 'A')
+        || setweight(to_tsvector('simple', cjk_bigrams(description)), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_files_search_tsv ON files USING gin (search_tsv);
+
+-- 内容寻址物理文件：file_path = blobs/ab/cd/<content_hash>，ref_count 为引用行数
+CREATE TABLE IF NOT EXISTS blobs
+(
+    content_hash VARCHAR(64) PRIMARY KEY,
+    file_size    BIGINT  NOT NULL,
+    ref_count    INTEGER NOT NULL DEFAULT 0,
+    created_at   TIMESTAMP DEFAULT timezone('Asia/Shanghai', now())
+);
+-- ref_count 归零的行等待后台回收物理文件
+CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs (content_hash) WHERE ref_count <= 0;
+
+-- 每用户存储计数（触发器增量维护，worker 定时对账）；quota_bytes 为空用全局默认配额
+CREATE TABLE IF NOT EXISTS user_storage_stats
+(
+    user_id          INTEGER PRIMARY KEY,
+    total_bytes      BIGINT  NOT NULL DEFAULT 0,
+    file_count       INTEGER NOT NULL DEFAULT 0,
+    folder_count     INTEGER NOT NULL DEFAULT 0,
+    pending_count    INTEGER NOT NULL DEFAULT 0,
+    processing_count INTEGER NOT NULL DEFAULT 0,
+    success_count    INTEGER NOT NULL DEFAULT 0,
+    fail_count       INTEGER NOT NULL DEFAULT 0,
+    quota_bytes      BIGINT,
+    updated_at       TIMESTAMP DEFAULT timezone('Asia/Shanghai', now())
+);
+
+CREATE OR REPLACE FUNCTION user_storage_stats_files() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT user_id,
+           SUM(sign * bytes)::BIGINT AS total_bytes,
+           SUM(sign)::INTEGER AS file_count,
+           0 AS folder_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0)::INTEGER AS pending_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'processing'), 0)::INTEGER AS processing_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'success'), 0)::INTEGER AS success_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'fail'), 0)::INTEGER AS fail_count
+    FROM (
+    SELECT uploader_id AS user_id, 1 AS sign,
+           COALESCE(file_size, 0) AS bytes, COALESCE(status, 'pending') AS status
+    FROM new_rows
+) r
+    GROUP BY user_id
+) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+    ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT user_id,
+           SUM(sign * bytes)::BIGINT AS total_bytes,
+           SUM(sign)::INTEGER AS file_count,
+           0 AS folder_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0)::INTEGER AS pending_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'processing'), 0)::INTEGER AS processing_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'success'), 0)::INTEGER AS success_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'fail'), 0)::INTEGER AS fail_count
+    FROM (
+    SELECT uploader_id AS user_id, -1 AS sign,
+           COALESCE(file_size, 0) AS bytes, COALESCE(status, 'pending') AS status
+    FROM old_rows
+) r
+    GROUP BY user_id
+) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+    ELSE
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT user_id,
+           SUM(sign * bytes)::BIGINT AS total_bytes,
+           SUM(sign)::INTEGER AS file_count,
+           0 AS folder_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0)::INTEGER AS pending_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'processing'), 0)::INTEGER AS processing_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'success'), 0)::INTEGER AS success_count,
+           COALESCE(SUM(sign) FILTER (WHERE status = 'fail'), 0)::INTEGER AS fail_count
+    FROM (
+    SELECT uploader_id AS user_id, 1 AS sign,
+           COALESCE(file_size, 0) AS bytes, COALESCE(status, 'pending') AS status
+    FROM new_rows
+ UNION ALL
+    SELECT uploader_id AS user_id, -1 AS sign,
+           COALESCE(file_size, 0) AS bytes, COALESCE(status, 'pending') AS status
+    FROM old_rows
+) r
+    GROUP BY user_id
+) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE OR REPLACE FUNCTION user_storage_stats_folders() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT user_id, 0::BIGINT AS total_bytes, 0 AS file_count,
+           (1 * COUNT(*))::INTEGER AS folder_count,
+           0 AS pending_count, 0 AS processing_count, 0 AS success_count, 0 AS fail_count
+    FROM new_rows
+    GROUP BY user_id
+) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+    ELSE
+    INSERT INTO user_storage_stats AS s (
+        user_id, total_bytes, file_count, folder_count,
+        pending_count, processing_count, success_count, fail_count, updated_at
+    )
+    SELECT d.user_id, d.total_bytes, d.file_count, d.folder_count,
+           d.pending_count, d.processing_count, d.success_count, d.fail_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT user_id, 0::BIGINT AS total_bytes, 0 AS file_count,
+           (-1 * COUNT(*))::INTEGER AS folder_count,
+           0 AS pending_count, 0 AS processing_count, 0 AS success_count, 0 AS fail_count
+    FROM old_rows
+    GROUP BY user_id
+) d
+    WHERE d.user_id IS NOT NULL
+      AND (d.total_bytes, d.file_count, d.folder_count, d.pending_count,
+           d.processing_count, d.success_count, d.fail_count) <> (0, 0, 0, 0, 0, 0, 0)
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        file_count = s.file_count + EXCLUDED.file_count,
+        folder_count = s.folder_count + EXCLUDED.folder_count,
+        pending_count = s.pending_count + EXCLUDED.pending_count,
+        processing_count = s.processing_count + EXCLUDED.processing_count,
+        success_count = s.success_count + EXCLUDED.success_count,
+        fail_count = s.fail_count + EXCLUDED.fail_count,
+        updated_at = EXCLUDED.updated_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_files_stats_insert ON files;
+CREATE TRIGGER trg_files_stats_insert AFTER INSERT ON files
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_files_stats_delete ON files;
+CREATE TRIGGER trg_files_stats_delete AFTER DELETE ON files
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_files_stats_update ON files;
+CREATE TRIGGER trg_files_stats_update AFTER UPDATE ON files
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_files();
+DROP TRIGGER IF EXISTS trg_folder_stats_insert ON folder;
+CREATE TRIGGER trg_folder_stats_insert AFTER INSERT ON folder
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_folders();
+DROP TRIGGER IF EXISTS trg_folder_stats_delete ON folder;
+CREATE TRIGGER trg_folder_stats_delete AFTER DELETE ON folder
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_storage_stats_folders();
+
+-- 文件夹物化路径：BEFORE 按父目录计算本行路径，AFTER 把改名 / 移动平移到整个子树
+CREATE OR REPLACE FUNCTION folder_path_before_write() RETURNS trigger AS $$
+DECLARE
+    parent_path     TEXT;
+    parent_path_ids TEXT;
+BEGIN
+    IF NEW.parent_id IS NULL THEN
+        NEW.path := '/';
+        NEW.path_ids := '/' || NEW.id || '/';
+        RETURN NEW;
+    END IF;
+
+    SELECT path_ids INTO parent_path_ids FROM folder WHERE id = NEW.parent_id;
+    IF parent_path_ids IS NOT NULL THEN
+        PERFORM 1 FROM folder
+        WHERE id = ANY (string_to_array(trim(BOTH '/' FROM parent_path_ids), '/')::INTEGER[])
+        ORDER BY length(path_ids)
+        FOR SHARE;
+    END IF;
+    SELECT path, path_ids INTO parent_path, parent_path_ids FROM folder WHERE id = NEW.parent_id;
+    -- 父目录不存在时留空，交给外键报错
+    IF parent_path_ids IS NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND parent_path_ids LIKE OLD.path_ids || '%' THEN
+        RAISE EXCEPTION 'folder % cannot be moved into its own subtree', NEW.id;
+    END IF;
+
+    NEW.path := rtrim(parent_path, '/') || '/' || NEW.name;
+    NEW.path_ids := parent_path_ids || NEW.id || '/';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION folder_path_after_update() RETURNS trigger AS $$
+BEGIN
+    IF NEW.path IS DISTINCT FROM OLD.path OR NEW.path_ids IS DISTINCT FROM OLD.path_ids THEN
+        UPDATE folder
+        SET path = rtrim(NEW.path, '/') || substr(path, length(rtrim(OLD.path, '/')) + 1),
+            path_ids = NEW.path_ids || substr(path_ids, length(OLD.path_ids) + 1)
+        -- 子孙的 path_ids 以本行为前缀，后接数字与 '/'，都小于 '~'；
+        -- 用区间而非 LIKE，缓存的通用计划也能走索引
+        WHERE path_ids > OLD.path_ids AND path_ids < OLD.path_ids || '~';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_folder_path_before_write ON folder;
+CREATE TRIGGER trg_folder_path_before_write BEFORE INSERT OR UPDATE OF name, parent_id ON folder
+    FOR EACH ROW EXECUTE FUNCTION folder_path_before_write();
+DROP TRIGGER IF EXISTS trg_folder_path_after_update ON folder;
+CREATE TRIGGER trg_folder_path_after_update AFTER UPDATE OF name, parent_id ON folder
+    FOR EACH ROW EXECUTE FUNCTION folder_path_after_update();
+
+-- 每文件夹汇总（直属 / 子树字节数与文件数），触发器沿物化路径增量维护，worker 定时对账
+CREATE TABLE IF NOT EXISTS folder_stats
+(
+    folder_id         INTEGER PRIMARY KEY,
+    direct_bytes      BIGINT  NOT NULL DEFAULT 0,
+    direct_file_count INTEGER NOT NULL DEFAULT 0,
+    total_bytes       BIGINT  NOT NULL DEFAULT 0,
+    total_file_count  INTEGER NOT NULL DEFAULT 0,
+    last_modified_at  TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION folder_stats_files() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT a.folder_id,
+           COALESCE(SUM(r.sign * r.bytes) FILTER (WHERE a.folder_id = r.parent_id), 0)::BIGINT
+               AS direct_bytes,
+           COALESCE(SUM(r.sign) FILTER (WHERE a.folder_id = r.parent_id), 0)::INTEGER
+               AS direct_file_count,
+           SUM(r.sign * r.bytes)::BIGINT AS total_bytes,
+           SUM(r.sign)::INTEGER AS total_file_count
+    FROM (SELECT parent_id, 1 AS sign, COALESCE(file_size, 0) AS bytes FROM new_rows) r
+    JOIN (
+        SELECT id, path_ids FROM folder
+        WHERE id IN (SELECT parent_id FROM (SELECT parent_id, 1 AS sign, COALESCE(file_size, 0) AS bytes FROM new_rows) pr)
+        ORDER BY id
+        FOR SHARE
+    ) p ON p.id = r.parent_id
+    CROSS JOIN LATERAL unnest(string_to_array(trim(BOTH '/' FROM p.path_ids), '/')::INTEGER[]) AS a(folder_id)
+    GROUP BY a.folder_id
+) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+    ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT a.folder_id,
+           COALESCE(SUM(r.sign * r.bytes) FILTER (WHERE a.folder_id = r.parent_id), 0)::BIGINT
+               AS direct_bytes,
+           COALESCE(SUM(r.sign) FILTER (WHERE a.folder_id = r.parent_id), 0)::INTEGER
+               AS direct_file_count,
+           SUM(r.sign * r.bytes)::BIGINT AS total_bytes,
+           SUM(r.sign)::INTEGER AS total_file_count
+    FROM (SELECT parent_id, -1 AS sign, COALESCE(file_size, 0) AS bytes FROM old_rows) r
+    JOIN (
+        SELECT id, path_ids FROM folder
+        WHERE id IN (SELECT parent_id FROM (SELECT parent_id, -1 AS sign, COALESCE(file_size, 0) AS bytes FROM old_rows) pr)
+        ORDER BY id
+        FOR SHARE
+    ) p ON p.id = r.parent_id
+    CROSS JOIN LATERAL unnest(string_to_array(trim(BOTH '/' FROM p.path_ids), '/')::INTEGER[]) AS a(folder_id)
+    GROUP BY a.folder_id
+) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+    ELSE
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT a.folder_id,
+           COALESCE(SUM(r.sign * r.bytes) FILTER (WHERE a.folder_id = r.parent_id), 0)::BIGINT
+               AS direct_bytes,
+           COALESCE(SUM(r.sign) FILTER (WHERE a.folder_id = r.parent_id), 0)::INTEGER
+               AS direct_file_count,
+           SUM(r.sign * r.bytes)::BIGINT AS total_bytes,
+           SUM(r.sign)::INTEGER AS total_file_count
+    FROM (
+        SELECT n.parent_id, 1 AS sign, COALESCE(n.file_size, 0) AS bytes
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+        UNION ALL
+        SELECT o.parent_id, -1, COALESCE(o.file_size, 0)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+    ) r
+    JOIN (
+        SELECT id, path_ids FROM folder
+        WHERE id IN (SELECT parent_id FROM (
+        SELECT n.parent_id, 1 AS sign, COALESCE(n.file_size, 0) AS bytes
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+        UNION ALL
+        SELECT o.parent_id, -1, COALESCE(o.file_size, 0)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (n.parent_id, n.file_size) IS DISTINCT FROM (o.parent_id, o.file_size)
+    ) pr)
+        ORDER BY id
+        FOR SHARE
+    ) p ON p.id = r.parent_id
+    CROSS JOIN LATERAL unnest(string_to_array(trim(BOTH '/' FROM p.path_ids), '/')::INTEGER[]) AS a(folder_id)
+    GROUP BY a.folder_id
+) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION folder_stats_folders() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT a.folder_id, 0::BIGINT AS direct_bytes, 0 AS direct_file_count,
+           SUM(m.sign * fs.direct_bytes)::BIGINT AS total_bytes,
+           SUM(m.sign * fs.direct_file_count)::INTEGER AS total_file_count
+    FROM (
+        SELECT o.id, o.path_ids, -1 AS sign
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.path_ids IS DISTINCT FROM n.path_ids
+        UNION ALL
+        SELECT n.id, n.path_ids, 1
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE o.path_ids IS DISTINCT FROM n.path_ids
+    ) m
+    JOIN folder_stats fs ON fs.folder_id = m.id
+    CROSS JOIN LATERAL unnest(string_to_array(trim(BOTH '/' FROM m.path_ids), '/')::INTEGER[]) AS a(folder_id)
+    WHERE a.folder_id <> m.id
+    GROUP BY a.folder_id
+) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+    ELSE
+    INSERT INTO folder_stats AS s (
+        folder_id, direct_bytes, direct_file_count, total_bytes, total_file_count, last_modified_at
+    )
+    SELECT d.folder_id, d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count,
+           timezone('Asia/Shanghai', now())
+    FROM (
+    SELECT a.folder_id, 0::BIGINT AS direct_bytes, 0 AS direct_file_count,
+           (-SUM(fs.direct_bytes))::BIGINT AS total_bytes,
+           (-SUM(fs.direct_file_count))::INTEGER AS total_file_count
+    FROM old_rows o
+    JOIN folder_stats fs ON fs.folder_id = o.id
+    CROSS JOIN LATERAL unnest(string_to_array(trim(BOTH '/' FROM o.path_ids), '/')::INTEGER[]) AS a(folder_id)
+    WHERE a.folder_id NOT IN (SELECT id FROM old_rows)
+    GROUP BY a.folder_id
+) d
+    WHERE (d.direct_bytes, d.direct_file_count, d.total_bytes, d.total_file_count) <> (0, 0, 0, 0)
+    ORDER BY d.folder_id
+    ON CONFLICT (folder_id) DO UPDATE SET
+        direct_bytes = s.direct_bytes + EXCLUDED.direct_bytes,
+        direct_file_count = s.direct_file_count + EXCLUDED.direct_file_count,
+        total_bytes = s.total_bytes + EXCLUDED.total_bytes,
+        total_file_count = s.total_file_count + EXCLUDED.total_file_count,
+        last_modified_at = EXCLUDED.last_modified_at;
+        DELETE FROM folder_stats WHERE folder_id IN (SELECT id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_files_folder_stats_insert ON files;
+CREATE TRIGGER trg_files_folder_stats_insert AFTER INSERT ON files
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_files_folder_stats_delete ON files;
+CREATE TRIGGER trg_files_folder_stats_delete AFTER DELETE ON files
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_files_folder_stats_update ON files;
+CREATE TRIGGER trg_files_folder_stats_update AFTER UPDATE ON files
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_files();
+DROP TRIGGER IF EXISTS trg_folder_folder_stats_update ON folder;
+CREATE TRIGGER trg_folder_folder_stats_update AFTER UPDATE ON folder
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_folders();
+DROP TRIGGER IF EXISTS trg_folder_folder_stats_delete ON folder;
+CREATE TRIGGER trg_folder_folder_stats_delete AFTER DELETE ON folder
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION folder_stats_folders();
 
 -- 5. 创建分享表 (注意表名为 shares，与 SQLAlchemy 模型一致)
 CREATE TABLE IF NOT EXISTS shares
@@ -21,7 +21,14 @@ from app.infra.task_queue import (
     QueueMessage,
     RabbitMQTaskConsumer,
 )
-from app.services import folder_service
+from app.extensions import SessionLocal
+from app.services import (
+    blob_store,
+    folder_service,
+    folder_stats_service,
+    storage_fsck,
+    storage_stats_service,
+)
 from app.services.file_service import cleanup_expired_uploads
 from app.workers.indexing_handler import handle_batch_indexing
 from app.workers.organize_handler import handle_organize_process
@@ -38,6 +45,11 @@ initialize_application()
 BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "10"))
 MAX_WORKERS = int(os.getenv("WORKER_MAX_THREADS", "5"))
 CLEANUP_INTERVAL_SECONDS = int(os.getenv("WORKER_CLEANUP_INTERVAL_SECONDS", "3600"))
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("WORKER_STATS_RECONCILE_INTERVAL_SECONDS", "86400"))
+# 存储巡检每轮间隔；0 表示关闭（每轮处理量与限速见 STORAGE_FSCK_*）
+FSCK_INTERVAL_SECONDS = int(os.getenv("WORKER_FSCK_INTERVAL_SECONDS", "600"))
+# blob 回收（批量删除后删物理文件）间隔；0 表示关闭
+REAP_INTERVAL_SECONDS = int(os.getenv("WORKER_REAP_INTERVAL_SECONDS", "60"))
 SUBMIT_ERROR_BACKOFF_SECONDS = float(os.getenv("WORKER_SUBMIT_ERROR_BACKOFF", "1"))
 
 
@@ -46,17 +58,63 @@ SUBMIT_ERROR_BACKOFF_SECONDS = float(os.getenv("WORKER_SUBMIT_ERROR_BACKOFF", "1
 # ---------------------------------------------------------------------------
 
 
+def _reconcile_storage_stats() -> None:
+    session = SessionLocal()
+    try:
+        storage_stats_service.reconcile(session)
+        folder_stats_service.reconcile(session)
+    finally:
+        session.close()
+
+
 def run_scheduler() -> None:
-    """定时清理过期分片上传，失败不退出进程。"""
+    """定时清理过期分片上传、对账存储计数，失败不退出进程。"""
     logger.info("Scheduler thread started (interval=%ss)", CLEANUP_INTERVAL_SECONDS)
+    next_reconcile_at = time.monotonic() + STATS_RECONCILE_INTERVAL_SECONDS
     while True:
         try:
-            cleanup_expired_uploads(max_age_hours=24)
+            cleanup_expired_uploads()
         except Exception:
             logger.exception("Scheduler cleanup failed")
+        if time.monotonic() >= next_reconcile_at:
+            next_reconcile_at = time.monotonic() + STATS_RECONCILE_INTERVAL_SECONDS
+            try:
+                _reconcile_storage_stats()
+            except Exception:
+                logger.exception("Storage stats reconcile failed")
         time.sleep(CLEANUP_INTERVAL_SECONDS)
 
 
+def run_fsck_scheduler() -> None:
+    """存储巡检独立成线程：单轮受限速可能跑几分钟，不拖慢上传清理。"""
+    logger.info("Fsck thread started (interval=%ss)", FSCK_INTERVAL_SECONDS)
+    while True:
+        session = SessionLocal()
+        try:
+            storage_fsck.run_fsck(session)
+        except Exception:
+            logger.exception("Storage fsck failed")
+        finally:
+            session.close()
+        time.sleep(FSCK_INTERVAL_SECONDS)
+
+
+def run_reaper() -> None:
+    """回收零引用 blob 与已登记的旧数据文件；一批满额就接着回收，直到积压清空。"""
+    logger.info("Reaper thread started (interval=%ss)", REAP_INTERVAL_SECONDS)
+    while True:
+        session = SessionLocal()
+        try:
+            while blob_store.reap(session) >= blob_store.REAP_BATCH_SIZE:
+                pass
+        except Exception:
+            session.rollback()
+            logger.exception("Blob reap failed")
+        finally:
+            session.close()
+        time.sleep(REAP_INTERVAL_SECONDS)
+
+
 # ---------------------------------------------------------------------------
 # 任务执行（线程池内）
 # ---------------------------------------------------------------------------
@@ -189,4 +247,16 @@ if __name__ == "__main__":
         name="upload-cleanup-scheduler",
         daemon=True,
     ).start()
+    if FSCK_INTERVAL_SECONDS > 0:
+        threading.Thread(
+            target=run_fsck_scheduler,
+            name="storage-fsck-scheduler",
+            daemon=True,
+        ).start()
+    if REAP_INTERVAL_SECONDS > 0:
+        threading.Thread(
+            target=run_reaper,
+            name="blob-reaper",
+            daemon=True,
+        ).start()
     run_worker()
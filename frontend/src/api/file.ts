@@ -1,6 +1,15 @@
 import type { AxiosProgressEvent, AxiosRequestConfig } from 'axios'
 import request from './request'
 
+/** 文件夹汇总：直属与整棵子树的字节数 / 文件数 */
+export interface FolderStats {
+  direct_bytes: number
+  direct_file_count: number
+  total_bytes: number
+  total_file_count: number
+  last_modified_at: string | null
+}
+
 /** 后端契约：文件/文件夹实体；部分字段在不同接口中可能缺失，故按可选处理 */
 export interface FileItem {
   id: number
@@ -12,6 +21,8 @@ export interface FileItem {
   created_at?: string
   is_folder: boolean
   parent_id?: number | null
+  /** 仅目录列表中的文件夹项返回 */
+  stats?: FolderStats
 }
 
 /** 列表查询参数；parent_id 为空表示根目录 */
@@ -22,14 +33,18 @@ export interface ListFilesParams {
   name?: string
   sort_by?: string
   order?: 'asc' | 'desc'
+  /** 游标分页：首页传空串，之后传上一页的 next_cursor；传了即忽略 page */
+  cursor?: string
+  /** 游标分页时是否额外返回 total */
+  with_total?: boolean
 }
 
-/** 搜索参数；type 为 fuzzy 模糊或 vector 语义 */
+/** 搜索参数；type 为 fuzzy 模糊、vector 语义、fulltext 描述全文或 hybrid 全文与语义混合 */
 export interface SearchFilesParams {
   q: string
   page?: number
   page_size?: number
-  type?: 'fuzzy' | 'vector'
+  type?: 'fuzzy' | 'vector' | 'fulltext' | 'hybrid'
 }
 
 /** 分片上传初始化请求；content_hash 用于秒传判定 */
@@ -48,7 +63,9 @@ export interface MultipartInitResponse {
   upload_id: string | null
   chunk_size: number
   total_chunks: number
-  uploaded_chunks: number[]
+  /** 已收分片的闭区间列表，如 [[0, 99], [120, 130]] */
+  uploaded_ranges: [number, number][]
+  uploaded_count: number
   instant_upload?: boolean
   file?: FileItem
 }
@@ -65,6 +82,11 @@ export interface FilePreflightResponse {
   instant_upload: boolean
   exists: boolean
   file?: FileItem
+  error?: string
+}
+
+export interface FilePreflightBatchResponse {
+  items: FilePreflightResponse[]
 }
 
 /** 后端契约：/files/search 返回的标准分页结构 */
@@ -73,6 +95,8 @@ export interface FilePageResult {
   total: number
   page?: number
   page_size?: number
+  /** 游标分页下一页游标；null 表示已到末尾 */
+  next_cursor?: string | null
 }
 
 /** 后端契约：/files/list 返回；files 可能为分页对象或数组（历史兼容），folders 为子文件夹 */
@@ -96,6 +120,16 @@ export interface BatchDeleteItem {
   is_folder: boolean
 }
 
+export interface BatchMoveItem {
+  id: number
+  is_folder: boolean
+  name?: string
+}
+
+export interface BatchMoveResult {
+  updated: number
+}
+
 export interface CreateFolderParams {
   name: string
   parent_id?: number
@@ -166,6 +200,12 @@ export const preflightFileUpload = (data: FilePreflightRequest) => {
   })
 }
 
+export const preflightFileUploads = (items: FilePreflightRequest[]) => {
+  return request.post<FilePreflightBatchResponse>('/files/preflight/batch', { items }, {
+    timeout: 0,
+  })
+}
+
 export const uploadMultipartChunk = (
   data: FormData,
   onUploadProgress?: (progressEvent: AxiosProgressEvent) => void,
@@ -203,6 +243,10 @@ export const batchDeleteFiles = (items: BatchDeleteItem[]) => {
   return request.post<void>('/files/batch-delete', { items })
 }
 
+export const batchMoveFiles = (items: BatchMoveItem[], parentId?: number) => {
+  return request.post<BatchMoveResult>('/files/batch-move', { items, parent_id: parentId })
+}
+
 export const createFolder = (data: CreateFolderParams) => {
   return request.post<void>('/folder', data)
 }
@@ -219,6 +263,20 @@ export const downloadFile = (id: number) => {
   return request.get<Blob>(`/files/${id}/download`, { responseType: 'blob' })
 }
 
+export const getFileThumbnail = (id: number) => {
+  return request.get<Blob>(`/files/${id}/thumbnail`, { responseType: 'blob' })
+}
+
+export const downloadFolderArchive = (id: number) => {
+  return request.get<Blob>(`/folder/${id}/archive`, { responseType: 'blob' })
+}
+
+export const downloadFilesArchive = (ids: number[]) => {
+  const query = new URLSearchParams()
+  ids.forEach((id) => query.append('ids', String(id)))
+  return request.get<Blob>(`/files/archive?${query.toString()}`, { responseType: 'blob' })
+}
+
 export const getRootFolderId = () => {
   return request.get<RootFolderIdResult>('/folder/root_id')
 }
@@ -142,7 +142,12 @@ async function uploadLargeFile(
   const uploadId = initRes.upload_id
   const chunkSize = initRes.chunk_size
   const totalChunks = initRes.total_chunks
-  const uploadedChunks = new Set<number>(initRes.uploaded_chunks || [])
+  const uploadedChunks = new Set<number>()
+  for (const [start, end] of initRes.uploaded_ranges || []) {
+    for (let i = start; i <= end; i++) {
+      uploadedChunks.add(i)
+    }
+  }
 
   let uploadedBytes = 0
   for (const idx of uploadedChunks) {